@@ -0,0 +1,161 @@
+"""
+Benchmark the motion main loop against a recorded clip.
+
+Each profile is a set of motion.ini settings. For every profile motion.py is
+run in a scratch directory replaying the clip as fast as possible and the
+frames per second, the latency percentiles of each StageProfiler point and
+the peak resident memory are collected into one json file so that runs can be compared across versions.
+
+Example:
+    python3 benchmark.py --clip ../test/hedgehogs.mp4 --frames 1000 --profiles default,mask,graph
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Add the ffmpeg encoder profiles and the size of the mp4 files.
+v1.2    18/10/2026  Read the stage timings of the StageProfiler, its points and P90.
+"""
+import argparse
+import configparser
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.2"
+
+MOTION_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Settings shared by every profile, low trigger points so that the clip records events.
+BASE = {'CAMERA': {'capture_thread': 'on'},
+        'DATE': {'date_position': 'top'},
+        'MOTION': {'trigger_point': '6',
+                   'trigger_point_base': '2',
+                   'movement_window': '5',
+                   'movement_window_age': '3'},
+        'OUTPUT': {'pre_frames': '10',
+                   'post_frames': '20'}}
+
+PROFILES = {'default': {},
+            'mask': {'ROI': {'mask_path': 'mask.jpg',
+                             'display_roi': 'on',
+                             'display_roi_jpg': 'on'}},
+            'graph': {'GRAPH': {'draw_graph': 'on',
+                                'draw_jpg_graph': 'on'}},
+            'statistics': {'STATISTICS': {'statistics': 'on',
+                                          'statistics_jpg': 'on'}},
+            'zoom': {'CAMERA': {'zoom_factor': '1.3'}},
+            'yolo_output': {'OUTPUT': {'yolo_output': 'on'}},
+            'lores_stream': {'CAMERA': {'lores_stream': 'on'}},
+            'encoder_sync': {'MP4': {'encoder_queue': '0'}},
+            'ffmpeg': {'MP4': {'encoder': 'ffmpeg', 'codec': 'libx264', 'preset': 'veryfast', 'crf': '23'}},
+            'ffmpeg_ultrafast': {'MP4': {'encoder': 'ffmpeg', 'codec': 'libx264', 'preset': 'ultrafast', 'crf': '28'}}}
+
+
+def get_host_name():
+    return socket.gethostname().split('.')[0].capitalize()
+
+
+def write_ini(filename, base_ini, settings):
+    """Write a motion.ini from the base ini file, the shared settings and the profile settings."""
+    config = configparser.ConfigParser(allow_no_value=True)
+    if base_ini:
+        config.read(base_ini)
+    for overrides in (BASE, settings):
+        for section, values in overrides.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            for name, value in values.items():
+                config.set(section, name, value)
+    with open(filename, 'w') as inifile:
+        config.write(inifile)
+
+
+def run_profile(name, settings, args):
+    """Run motion.py for one profile and return its stage timings."""
+    work_dir = tempfile.mkdtemp(prefix=f'motion-{name}-')
+    try:
+        write_ini(os.path.join(work_dir, 'motion.ini'), args.ini, settings)
+        with open(os.path.join(work_dir, 'version.ini'), 'w') as file:
+            file.write('[MP4]\nversion = 0\n')
+        if args.mask and os.path.exists(args.mask):
+            shutil.copy(args.mask, os.path.join(work_dir, 'mask.jpg'))
+        command = [sys.executable, os.path.join(MOTION_DIR, 'motion.py'),
+                   '--replay', os.path.abspath(args.clip), '--fast', '--loop',
+                   '--frames', str(args.frames),
+                   '--stage-timings', 'stage_timings.json']
+        with open(os.path.join(work_dir, 'motion.log'), 'w') as log_file:
+            subprocess.run(command, cwd=work_dir, stdout=log_file, stderr=subprocess.STDOUT,
+                           timeout=args.timeout, check=False)
+        timings_file = os.path.join(work_dir, 'stage_timings.json')
+        if not os.path.exists(timings_file):
+            print(f'{name}: no timings written, see {work_dir}/motion.log')
+            return None
+        with open(timings_file) as file:
+            result = json.load(file)
+        mp4_files = [os.path.join(work_dir, 'Motion', f) for f in os.listdir(os.path.join(work_dir, 'Motion'))
+                     if f.endswith('.mp4')]
+        result['Events'] = len(mp4_files)
+        result['MP4 Bytes'] = sum(os.path.getsize(f) for f in mp4_files)
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return result
+    finally:
+        if os.path.exists(work_dir):
+            print(f'{name}: output kept in {work_dir}')
+
+
+def print_run(run):
+    print(f"{run['Profile']:<14} {run['FPS']:>8.1f} fps  {run['Frames']} frames  "
+          f"{run['Events']} events  {run['MP4 Bytes'] // 1024} KB mp4  peak RSS {run['Peak RSS MB']} MB")
+    for stage, values in run['Stages'].items():
+        print(f"    {stage:<20} p50 {values['P50']:>8.3f}  p90 {values['P90']:>8.3f}  "
+              f"p99 {values['P99']:>8.3f} ms  ({values['Count']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the motion main loop")
+    parser.add_argument('--clip', default=os.path.join(MOTION_DIR, '..', 'test', 'hedgehogs.mp4'),
+                        help="Enter the mp4 file or image directory to replay.")
+    parser.add_argument('--profiles', default=','.join(PROFILES),
+                        help=f"Enter a comma separated list of profiles from {', '.join(PROFILES)}.")
+    parser.add_argument('--frames', type=int, default=1000, help="Enter the number of frames to process.")
+    parser.add_argument('--ini', default=None, help="Enter a motion.ini file to use as the base settings.")
+    parser.add_argument('--mask', default=os.path.join(MOTION_DIR, '..', 'mask', 'masks', 'mask.jpg'),
+                        help="Enter the mask used by the mask profile.")
+    parser.add_argument('--output', default='benchmark.json', help="Enter the json output filename.")
+    parser.add_argument('--timeout', type=int, default=600, help="Enter the maximum seconds for each run.")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directories.")
+    args = parser.parse_args()
+
+    results = {'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+               'Host': get_host_name(),
+               'Clip': args.clip,
+               'Frames': args.frames,
+               'Runs': []}
+    for name in args.profiles.split(','):
+        if name not in PROFILES:
+            print(f'Unknown profile {name}')
+            continue
+        try:
+            run = run_profile(name, PROFILES[name], args)
+        except subprocess.TimeoutExpired:
+            print(f'{name}: timed out after {args.timeout} seconds')
+            continue
+        if run:
+            run['Profile'] = name
+            run['Settings'] = PROFILES[name]
+            results['Runs'].append(run)
+            print_run(run)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,13 @@
 import os
-from os.path import exists
 from datetime import datetime, timedelta
-import csv
+from logStore import get_partition_dir
+from telemetrySink import get_sink
 
 
 class CoreCSV:
-    """Store Core information over time."""
+    """Store Core information over time, a daily file in logs/coredata."""
 
-    def __init__(self):
+    def __init__(self, sink=None):
         self.arm_freq_min = None
         self.sdram_freq = None
         self.over_voltage_avs_boost = None
@@ -28,7 +28,7 @@ class CoreCSV:
         self.core_freq = None
         self.arm_freq = None
         self.TXT_NAME = "coredata.txt"
-        self.CSV_NAME = "coredata.csv"
+        self.CSV_NAME = get_partition_dir("coredata")
         self.columns = ["Timestamp",
                         "arm_freq",
                         "arm_freq_min",
@@ -50,18 +50,13 @@ class CoreCSV:
                         "sdram_p: volt",
                         "temp",
                         "throttled"]
+        self.telemetry = (sink or get_sink()).register(self.CSV_NAME, self.columns, partitioned=True)
 
     def write(self):
-        """Write a core data record."""
-        if not exists(self.CSV_NAME):
-            self.create()
-
-        with open(self.CSV_NAME, 'a', newline='') as file:
-            # creating a csv dict writer object
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            now = datetime.now()
-            timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
-            writer.writerow(({"Timestamp": timestamp,
+        """Write a core data record through the shared sink, which writes it by exit."""
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        self.telemetry.write({"Timestamp": timestamp,
                               "arm_freq": self.arm_freq,
                               "arm_freq_min": self.arm_freq_min,
                               "core_freq": self.core_freq,
@@ -81,16 +76,7 @@ class CoreCSV:
                               "sdram_i: volt": self.sdram_i_volt,
                               "sdram_p: volt": self.sdram_p_volt,
                               "temp": self.temp,
-                              "throttled": self.throttled}))
-
-    def create(self):
-        """Create a core csv file with a header row,"""
-        # writing to csv file
-        with open(self.CSV_NAME, 'w', newline='') as file:
-            # creating a csv dict writer object
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            # writing headers (field names)
-            writer.writeheader()
+                              "throttled": self.throttled})
 
     def import_data(self):
         with open(self.TXT_NAME, 'r', newline='') as file:
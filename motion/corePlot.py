@@ -1,21 +1,13 @@
 import argparse
 import socket
 
-import pandas as pd
 from matplotlib import pyplot as plt
 from matplotlib import dates as mpl_dates
 import os
+from logStore import read_window
 
-df = pd.read_csv('coredata.csv')
-
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-df['Timestamp_idx'] = pd.to_datetime(df['Timestamp'])
-df.set_index("Timestamp_idx", inplace=True)
-
-# Use this if the timestamp is the index of the DataFrame
-last_ts = df.index[-1]
-first_ts = last_ts - pd.Timedelta(24, 'hours')
-df = df[df.index >= first_ts]
+# The last 24 hours, only yesterday's and today's files are read.
+df = read_window('coredata', hours=24)
 
 plt.style.use("seaborn-v0_8-whitegrid")
 
@@ -1,13 +1,13 @@
 import os
 import time
-from os.path import exists
 from datetime import datetime, timedelta
-import csv
 import psutil
+import logStore
+from telemetrySink import get_sink
 
 __author__ = "Peter Goodgame"
 __name__ = "fpsLogCSV"
-__version__ = "v1.2"
+__version__ = "v1.4"
 
 from pathlib import Path
 
@@ -16,7 +16,7 @@ class FPSLogCSV:
     """Store Average Frames Per Second readings over time.
     set the number of seconds between recordings when using the monitor_fps."""
 
-    def __init__(self, expected_fps, monitor_interval=60):
+    def __init__(self, expected_fps, monitor_interval=60, sink=None):
         self.fps = None
         self.expected_fps = expected_fps
         self.actual_fps = None
@@ -26,56 +26,46 @@ class FPSLogCSV:
         self.data = None
         self.columns = ["Timestamp", "Expected Frames Per Second", "Actual Frames Per Second",
                         "Virtual Memory Size", "Resident Memory Size", "Shared Memory Size"]
-        self.filename = "fps.csv"
+        # v1.4 A daily file in logs/fps.
+        self.log_name = "fps"
+        self.filename = logStore.get_partition_dir(self.log_name)
         self.signal_filename = "fps.sig"
+        # v1.3 The signal file is touched once the rows have been written.
+        self.telemetry = (sink or get_sink()).register(self.filename, self.columns,
+                                                       on_flush=Path(self.signal_filename).touch,
+                                                       partitioned=True)
         self.refresh_time = datetime.now()
         self.now = datetime.now()
         self.refresh_seconds = 60 * 15
-        self.exists = os.path.exists(self.filename)
+        self.exists = bool(logStore.list_partitions(self.log_name))
         self.refresh_data(initialise=True)
         self.start_time = time.time()
         self.end_time = None
 
     def write(self, fps):
         """Write a FPS record."""
-        # writing to csv file
-        if not exists(self.filename):
-            self.create()
-
-        with open(self.filename, 'a', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            now = datetime.now()
-            timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
-            if os.name == 'nt':
-                vms = 1000
-                rss = 1000
-                shr = 1000
-            else:
-                vms = round(psutil.Process().memory_info().vms / 1024 / 1024, 2)
-                rss = round(psutil.Process().memory_info().rss / 1024 / 1024, 2)
-                shr = round(psutil.Process().memory_info().shared / 1024 / 1024, 2)
-
-            writer.writerow({"Timestamp": timestamp,
-                             "Expected Frames Per Second": self.expected_fps,
-                             "Actual Frames Per Second": round(fps, 2),
-                             "Virtual Memory Size": vms,
-                             "Resident Memory Size": rss,
-                             "Shared Memory Size": shr})
-        Path(self.signal_filename).touch()
-
-    def create(self):
-        """Create a fps.csv file with a header row,"""
-        # writing to csv file
-        with open(self.filename, 'w', newline='') as file:
-            # creating a csv dict writer object
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            # writing headers (field names)
-            writer.writeheader()
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        if os.name == 'nt':
+            vms = 1000
+            rss = 1000
+            shr = 1000
+        else:
+            vms = round(psutil.Process().memory_info().vms / 1024 / 1024, 2)
+            rss = round(psutil.Process().memory_info().rss / 1024 / 1024, 2)
+            shr = round(psutil.Process().memory_info().shared / 1024 / 1024, 2)
+
+        self.telemetry.write({"Timestamp": timestamp,
+                              "Expected Frames Per Second": self.expected_fps,
+                              "Actual Frames Per Second": round(fps, 2),
+                              "Virtual Memory Size": vms,
+                              "Resident Memory Size": rss,
+                              "Shared Memory Size": shr})
 
     def delete(self):
-        """Remove the file if it exists"""
-        if os.path.exists(self.filename):
-            os.remove(self.filename)
+        """Remove the daily files if they exist"""
+        if os.path.isdir(self.filename):
+            self.telemetry.delete()
             print(f'Removed {self.filename} ')
 
     def refresh_data(self, initialise=False, debug=False):
@@ -84,23 +74,15 @@ class FPSLogCSV:
             # If older than 10 minutes and there is data.
             if age_seconds > self.refresh_seconds or initialise:
                 self.read_last_line()
+                if self.data is None:
+                    return
                 self.fps = f'{round(float(self.data.split(",")[1]),1)} FPS'
                 self.refresh_time = datetime.now()
 
     def read_last_line(self, n=1):
-        """Returns the nth before last line of a file (n=1 gives last line)"""
+        """Returns the nth before last line of the latest daily file (n=1 gives last line)"""
         if self.exists:
-            num_newlines = 0
-            with open(self.filename, 'rb') as f:
-                try:
-                    f.seek(-2, os.SEEK_END)
-                    while num_newlines < n:
-                        f.seek(-2, os.SEEK_CUR)
-                        if f.read(1) == b'\n':
-                            num_newlines += 1
-                except OSError:
-                    f.seek(0)
-                self.data = f.readline().decode()
+            self.data = logStore.read_last_line(self.log_name, n)
 
     def get_fps(self, debug=False):
         """Returns the last recorded frames per second"""
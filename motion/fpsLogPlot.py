@@ -1,18 +1,19 @@
 """
 Plot shows the frames per second recorded.
+v1.3 18/10/2026 Read only the days reported from the daily log files.
 """
 
 import socket
 import argparse
-import pandas as pd
 from datetime import datetime, timedelta
 from matplotlib import pyplot as plt
 from matplotlib import dates as mpl_dates
 import os
+from logStore import read_window
 
 __author__ = "Peter Goodgame"
 __name__ = "fpsLogPlot"
-__version__ = "v1.2"
+__version__ = "v1.3"
 
 # plt.style.use('seaborn-v0_8-whitegrid')
 
@@ -44,16 +45,8 @@ if (DAYS + HOURS) == 0:
 # df = pd.read_csv('./fps.csv')
 # df = df.tail(800)
 
-# Read and prepare the data.
-df = pd.read_csv('fps.csv')
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-df.sort_values('Timestamp', inplace=True)
-
-# Limit days data.
-end_date = df['Timestamp'].max()
-start_date = end_date - pd.Timedelta(days=DAYS, hours=HOURS)
-df = df[(df['Timestamp'] >= start_date) & (df['Timestamp'] <= end_date)]
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+# Read the days and hours reported up to the latest reading.
+df = read_window('fps', days=DAYS, hours=HOURS)
 
 # df['Timestamp'] = pd.to_datetime(df['Timestamp'])
 # df.sort_values('Timestamp', inplace=True)
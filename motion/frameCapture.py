@@ -0,0 +1,171 @@
+"""
+Threaded frame capture.
+
+A dedicated thread reads frames from the camera into a bounded ring of
+preallocated slots so that a slow frame in the main loop, such as a video
+writer flush or a jpg write at the end of an event, does not stall capture.
+When the main loop falls too far behind the oldest unread frame is dropped
+and counted so the real time cadence is kept.
+
+A frame may be a tuple of arrays, such as the main and lores streams of one
+camera request, each is held in its own ring of slots.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Hold a tuple of arrays captured together.
+v1.2    18/10/2026  Count read timeouts.
+"""
+import collections
+import threading
+import time
+import numpy as np
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.2"
+
+
+class FrameCapture:
+    """
+    Capture frames on a background thread into a ring of preallocated slots.
+
+    capture_function is called with no arguments and returns the next frame, or a tuple of arrays
+    captured together, or None when there are no more frames.
+    The frame returned by read() belongs to the caller until the next call to
+    read(), the capture thread never writes into that slot.
+    Set drop to False to make the capture thread wait for the reader instead of
+    dropping frames, this is used when replaying footage as fast as possible.
+    """
+
+    def __init__(self, capture_function, slots=4, name='Capture', drop=True):
+        self.capture_function = capture_function
+        self.drop = drop
+        self.slot_cnt = max(slots, 2)
+        self.name = name
+        self.slots = None  # One array of slots for each part of a frame, allocated when the first frame arrives.
+        self.parts = False  # True when the frames are tuples of arrays.
+        self.timestamps = np.zeros(self.slot_cnt, np.dtype('float64'))
+        self.free = collections.deque(range(self.slot_cnt))  # Slots available for writing.
+        self.ready = collections.deque()  # Captured slots waiting to be read, oldest first.
+        self.leased = None  # Slot currently held by the reader.
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.error = None
+        self.captured_cnt = 0  # Frames captured.
+        self.read_cnt = 0  # Frames handed to the reader.
+        self.dropped_cnt = 0  # Unread frames overwritten because the ring was full.
+        self.overrun_cnt = 0  # Number of times the ring filled up.
+        self.backlog_peak = 0  # Highest number of unread frames.
+        self.timeout_cnt = 0  # Reads that timed out waiting for a frame.
+        self.overrun = False
+
+    def start(self):
+        """Start the capture thread."""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """Stop the capture thread and wait for it to finish."""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def allocate(self, parts):
+        self.slots = [np.zeros((self.slot_cnt,) + part.shape, part.dtype) for part in parts]
+
+    def is_allocated(self, parts):
+        return (self.slots is not None and len(self.slots) == len(parts)
+                and all(slots.shape[1:] == part.shape for slots, part in zip(self.slots, parts)))
+
+    def next_slot(self):
+        """Return a slot to write into, dropping the oldest unread frame if the ring is full."""
+        if self.free:
+            self.overrun = False
+            return self.free.popleft()
+        self.dropped_cnt += 1
+        if not self.overrun:
+            self.overrun = True
+            self.overrun_cnt += 1
+        return self.ready.popleft()
+
+    def run(self):
+        try:
+            while self.running:
+                frame = self.capture_function()
+                if frame is None:
+                    # The frame source has finished.
+                    break
+                timestamp = time.perf_counter()
+                self.parts = isinstance(frame, (tuple, list))
+                parts = frame if self.parts else (frame,)
+                if not self.is_allocated(parts):
+                    self.allocate(parts)
+                with self.condition:
+                    if not self.drop:
+                        self.condition.wait_for(lambda: self.free or not self.running)
+                        if not self.running:
+                            break
+                    slot = self.next_slot()
+                # Copy outside the lock so the reader is never held up by the copy.
+                for slots, part in zip(self.slots, parts):
+                    np.copyto(slots[slot], part)
+                with self.condition:
+                    self.timestamps[slot] = timestamp
+                    self.ready.append(slot)
+                    self.captured_cnt += 1
+                    if len(self.ready) > self.backlog_peak:
+                        self.backlog_peak = len(self.ready)
+                    self.condition.notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+
+    def read(self, timeout=5.0):
+        """
+        Return the oldest unread frame, waiting for one if needed.
+        The previously read slot is handed back to the capture thread.
+        Raises TimeoutError if no frame arrives within timeout seconds, read() can be called again.
+        """
+        with self.condition:
+            if self.leased is not None:
+                self.free.append(self.leased)
+                self.leased = None
+                self.condition.notify_all()
+            if not self.condition.wait_for(lambda: self.ready or not self.running, timeout):
+                self.timeout_cnt += 1
+                raise TimeoutError(f'No frame captured within {timeout} seconds.')
+            if not self.ready:
+                if self.error:
+                    raise self.error
+                return None
+            self.leased = self.ready.popleft()
+            self.read_cnt += 1
+            if self.parts:
+                return tuple(slots[self.leased] for slots in self.slots)
+            return self.slots[0][self.leased]
+
+    def get_timestamp(self):
+        """Return the perf_counter time at which the current frame was captured."""
+        if self.leased is None:
+            return None
+        return self.timestamps[self.leased]
+
+    def get_backlog(self):
+        """Return the number of captured frames waiting to be read."""
+        return len(self.ready)
+
+    def get_stats(self):
+        return {'Captured': self.captured_cnt,
+                'Read': self.read_cnt,
+                'Dropped': self.dropped_cnt,
+                'Overruns': self.overrun_cnt,
+                'Backlog Peak': self.backlog_peak,
+                'Timeouts': self.timeout_cnt}
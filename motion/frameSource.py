@@ -0,0 +1,171 @@
+"""
+Frame sources for motion.
+
+The camera is one source of frames, a replay of recorded footage is another.
+Replaying an mp4 file or a directory of images lets the full detection and
+recording loop run on a machine without a camera so that changes can be
+measured against the same footage.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Only the stream the loop captures advances a replay, other streams are the same frame.
+v1.2    18/10/2026  Add capture_arrays to capture several streams from the same request.
+"""
+import os
+import time
+import cv2
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.2"
+
+
+class FrameSource:
+    """
+    Supplies frames to motion. capture_array returns None once there are no more frames.
+    """
+
+    def __init__(self):
+        self.finished = False
+
+    def start(self):
+        pass
+
+    def capture_array(self, name='main'):
+        raise NotImplementedError
+
+    def capture_arrays(self, names):
+        """Return the arrays of the streams named from the same frame, or None once there are no more frames."""
+        raise NotImplementedError
+
+    def capture_metadata(self):
+        return {'ExposureTime': 0.0, 'AnalogueGain': 0.0, 'ColourGains': (0.0, 0.0)}
+
+    def close(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    """Frames from a configured Picamera2 instance."""
+
+    def __init__(self, camera):
+        super().__init__()
+        self.camera = camera
+
+    def start(self):
+        self.camera.start()
+
+    def capture_array(self, name='main'):
+        return self.camera.capture_array(name)
+
+    def capture_arrays(self, names):
+        arrays, _ = self.camera.capture_arrays(names)
+        return tuple(arrays)
+
+    def capture_metadata(self):
+        return self.camera.capture_metadata()
+
+    def close(self):
+        self.camera.close()
+
+
+class ReplaySource(FrameSource):
+    """
+    Frames from an mp4 file or a directory of jpg/png images.
+    realtime paces the frames at fps, otherwise frames are returned as fast as they are requested.
+    Capturing stream reads the next frame, capturing another stream returns the same frame at that
+    stream's size as a camera request holds both.
+    """
+    image_extensions = ('.jpg', '.jpeg', '.png')
+
+    def __init__(self, path, main_size, lores_size, fps=30, realtime=True, loop=False, stream='main'):
+        super().__init__()
+        self.path = path
+        self.sizes = {'main': main_size, 'lores': lores_size}
+        self.stream = stream
+        self.image = None  # The frame last read, at its recorded size.
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self.capture = None
+        self.images = None
+        self.image_index = 0
+        self.frame_cnt = 0
+        self.start_time = None
+        if os.path.isdir(self.path):
+            self.images = sorted(os.path.join(self.path, f) for f in os.listdir(self.path)
+                                 if f.lower().endswith(self.image_extensions))
+            if not self.images:
+                raise FileNotFoundError(f'No images found in {self.path}')
+        elif not os.path.isfile(self.path):
+            raise FileNotFoundError(f'Replay source {self.path} does not exist')
+
+    def start(self):
+        if self.images is None:
+            self.capture = cv2.VideoCapture(self.path)
+            if not self.capture.isOpened():
+                raise IOError(f'Unable to open {self.path}')
+        self.frame_cnt = 0
+        self.start_time = time.perf_counter()
+
+    def read(self):
+        """Read the next image, returns None at the end of the footage."""
+        if self.images is not None:
+            if self.image_index >= len(self.images):
+                if not self.loop:
+                    return None
+                self.image_index = 0
+            image = cv2.imread(self.images[self.image_index])
+            self.image_index += 1
+            return image
+        ret, image = self.capture.read()
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, image = self.capture.read()
+        return image if ret else None
+
+    def wait(self):
+        """Hold back frames so they are delivered at the recorded frame rate."""
+        due = self.start_time + self.frame_cnt / self.fps
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def advance(self):
+        """Read the next frame, returns False at the end of the footage."""
+        if self.finished:
+            return False
+        if self.realtime:
+            self.wait()
+        image = self.read()
+        if image is None:
+            self.finished = True
+            return False
+        self.frame_cnt += 1
+        self.image = image
+        return True
+
+    def get_array(self, name):
+        """Return the frame last read at the size of the stream, a copy the caller can draw on."""
+        image = self.image
+        size = self.sizes[name]
+        if not (image.shape[1], image.shape[0]) == size:
+            return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image.copy()
+
+    def capture_array(self, name='main'):
+        if name == self.stream or self.image is None:
+            if not self.advance():
+                return None
+        elif self.finished:
+            return None
+        return self.get_array(name)
+
+    def capture_arrays(self, names):
+        if not self.advance():
+            return None
+        return tuple(self.get_array(name) for name in names)
+
+    def close(self):
+        if self.capture:
+            self.capture.release()
+            self.capture = None
@@ -0,0 +1,109 @@
+"""
+Post event job queue.
+
+The work done when a recording closes, such as writing the jpg and csv files,
+updating the version number and running the output command, is queued for a
+pool of worker threads so the main loop can go straight back to capture and a
+second visitor arriving straight after the first is not missed. Each job is
+timed, failed jobs are retried and the queue is drained on shut down.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+"""
+import collections
+import queue
+import threading
+import time
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.0"
+
+
+class JobQueue:
+    """
+    Run jobs on a pool of worker threads.
+    A job that raises an exception is retried up to retries times, retry_delay seconds apart.
+    """
+
+    def __init__(self, workers=2, retries=2, retry_delay=1.0, log=None, name='Job'):
+        self.worker_cnt = max(workers, 1)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.log = log
+        self.name = name
+        self.queue = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.stats = collections.defaultdict(lambda: {'Count': 0, 'Failed': 0, 'Retries': 0,
+                                                      'Total ms': 0.0, 'Max ms': 0.0})
+
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.worker_cnt):
+            thread = threading.Thread(target=self.run, name=f'{self.name}{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def submit(self, name, function, *args, **kwargs):
+        """Queue function(*args, **kwargs) to run on a worker, name is used for the statistics."""
+        if not self.threads:
+            self.execute(name, function, args, kwargs)
+            return
+        self.queue.put((name, function, args, kwargs))
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    break
+                self.execute(*job)
+            finally:
+                self.queue.task_done()
+
+    def execute(self, name, function, args, kwargs):
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                function(*args, **kwargs)
+            except Exception as e:
+                failed = attempt == self.retries
+                if self.log:
+                    self.log.warning(f'Job {name} failed{"" if failed else ", retrying"}: {e}')
+                with self.lock:
+                    self.stats[name]['Failed' if failed else 'Retries'] += 1
+                if failed:
+                    return False
+                time.sleep(self.retry_delay)
+                continue
+            elapsed = (time.perf_counter() - start) * 1000
+            with self.lock:
+                stats = self.stats[name]
+                stats['Count'] += 1
+                stats['Total ms'] += elapsed
+                stats['Max ms'] = max(stats['Max ms'], elapsed)
+            return True
+
+    def drain(self, timeout=60.0):
+        """Finish the queued jobs and stop the workers, returns False if they did not finish in time."""
+        for _ in self.threads:
+            self.queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        finished = not any(thread.is_alive() for thread in self.threads)
+        self.threads = []
+        return finished
+
+    def get_depth(self):
+        """Return the number of jobs waiting."""
+        return self.queue.qsize()
+
+    def get_stats(self):
+        with self.lock:
+            return {name: dict(values, **{'Mean ms': round(values['Total ms'] / values['Count'], 3)
+                                          if values['Count'] else 0.0,
+                                          'Total ms': round(values['Total ms'], 3),
+                                          'Max ms': round(values['Max ms'], 3)})
+                    for name, values in self.stats.items()}
@@ -0,0 +1,191 @@
+"""
+Daily partitioned log store.
+
+The timestamped csv logs, such as visits, fps and temperatures, used to be one
+file each that grew for ever, and every report read and parsed the whole file
+before keeping the last few days. The logs are now written by the telemetry
+sink into one file per day, logs/<name>/<YYYY-MM-DD>.csv, each with its header.
+A report reads only the days overlapping its window, so it costs the same
+however long the history, and the columns are read with fixed types.
+
+pandas is only imported by read_window() so the writers stay light. A csv log
+from before the store can be split into days with
+
+    python3 logStore.py --import visits.csv
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+"""
+import argparse
+import csv
+import io
+import os
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.0"
+
+LOG_STORE = 'logs'
+SECONDS = '%Y-%m-%d %H:%M:%S'
+MINUTES = '%Y-%m-%d %H:%M'
+
+# Timestamp format and column types of each log, other columns are left to pandas.
+SCHEMAS = {
+    'visits': (SECONDS, {'Trigger Point': 'int64',
+                         'Trigger Point Base': 'int64',
+                         'Subtraction History': 'int64',
+                         'Subtraction Threshold': 'int64'}),
+    'fps': (SECONDS, {'Expected Frames Per Second': 'float64',
+                      'Actual Frames Per Second': 'float64',
+                      'Virtual Memory Size': 'float64',
+                      'Resident Memory Size': 'float64',
+                      'Shared Memory Size': 'float64'}),
+    'temperatures': (SECONDS, {'Centigrade': 'float64',
+                               'Fahrenheit': 'float64',
+                               'Humidity': 'float64'}),
+    'recording': (SECONDS, {'Duration': 'str'}),
+    # The rows written on SIGHUP have no variable trigger points so the columns are floats.
+    'peakMovement': (MINUTES, {'Trigger Point': 'float64',
+                               'Trigger Point Base': 'float64',
+                               'Movement History Window': 'float64',
+                               'Movement History Age': 'float64',
+                               'Subtraction Threshold': 'float64',
+                               'Subtraction History': 'float64',
+                               'Average': 'float64',
+                               'Variable Trigger Point': 'float64',
+                               'Variable Trigger Point Base': 'float64',
+                               'Highest Peak': 'float64',
+                               'Trigger Value': 'float64'}),
+    'coredata': (SECONDS, {}),
+}
+
+
+def get_partition_dir(csv_file, store=LOG_STORE):
+    """Return the directory of the daily files of a log, named after its csv file such as visits.csv."""
+    return os.path.join(store, os.path.splitext(os.path.basename(csv_file))[0])
+
+
+def get_partition_date(timestamp):
+    """Return the day of a row from its timestamp text."""
+    return timestamp[:10]
+
+
+def list_partitions(name, store=LOG_STORE):
+    """Return the (day, path) of each daily file of a log, oldest first."""
+    directory = get_partition_dir(name, store)
+    if not os.path.isdir(directory):
+        return []
+    return [(filename[:-4], os.path.join(directory, filename))
+            for filename in sorted(os.listdir(directory))
+            if filename.endswith('.csv')]
+
+
+def read_last_line(name, n=1, store=LOG_STORE):
+    """Returns the nth before last line of the latest daily file of a log (n=1 gives last line) or None."""
+    partitions = list_partitions(name, store)
+    if not partitions:
+        return None
+    num_newlines = 0
+    with open(partitions[-1][1], 'rb') as f:
+        try:
+            f.seek(-2, os.SEEK_END)
+            while num_newlines < n:
+                f.seek(-2, os.SEEK_CUR)
+                if f.read(1) == b'\n':
+                    num_newlines += 1
+        except OSError:
+            f.seek(0)
+        return f.readline().decode()
+
+
+def iter_rows(name, start=None, end=None, store=LOG_STORE):
+    """Yield the rows of a log as dicts, only reading the days from start to end."""
+    first = start.strftime('%Y-%m-%d') if start else ''
+    last = end.strftime('%Y-%m-%d') if end else '9999'
+    for day, path in list_partitions(name, store):
+        if first <= day <= last:
+            with open(path, newline='') as file:
+                yield from csv.DictReader(file)
+
+
+def read_window(name, days=0, hours=0, minutes=0, end=None, store=LOG_STORE):
+    """
+    Return a DataFrame of the rows of a log within days, hours and minutes before end, sorted by time.
+    end defaults to the time of the latest row. Only the daily files overlapping the window are read.
+    """
+    import pandas as pd
+    timestamp_format, dtypes = SCHEMAS.get(name, (SECONDS, {}))
+    partitions = list_partitions(name, store)
+    if not partitions:
+        return pd.DataFrame(columns=['Timestamp'] + list(dtypes))
+    window = pd.Timedelta(days=days, hours=hours, minutes=minutes)
+    # Without an end the latest row is on the latest day, so the window starts no earlier than a window before it.
+    last_day = pd.Timestamp(end).normalize() if end is not None else pd.Timestamp(partitions[-1][0])
+    first_day = (last_day - window).strftime('%Y-%m-%d')
+    last_day = last_day.strftime('%Y-%m-%d')
+    # Join the files, without their headers after the first, and parse them once.
+    chunks = []
+    for day, path in partitions:
+        if first_day <= day <= last_day:
+            with open(path, 'rb') as file:
+                if chunks:
+                    file.readline()
+                chunk = file.read()
+            if chunk and not chunk.endswith(b'\n'):
+                chunk += b'\n'
+            chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame(columns=['Timestamp'] + list(dtypes))
+    data = pd.read_csv(io.BytesIO(b''.join(chunks)), dtype=dtypes)
+    data['Timestamp'] = pd.to_datetime(data['Timestamp'], format=timestamp_format)
+    end = data['Timestamp'].max() if end is None else pd.Timestamp(end)
+    data = data[(data['Timestamp'] >= end - window) & (data['Timestamp'] <= end)]
+    return data.sort_values('Timestamp', kind='stable').reset_index(drop=True)
+
+
+def import_csv(filename, store=LOG_STORE):
+    """Append the rows of a single csv log to its daily files, returns the number of rows."""
+    directory = get_partition_dir(filename, store)
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    row_cnt = 0
+    try:
+        with open(filename, newline='') as source:
+            reader = csv.reader(source)
+            header = next(reader)
+            for row in reader:
+                if not row:
+                    continue
+                day = get_partition_date(row[0])
+                if day not in files:
+                    path = os.path.join(directory, f'{day}.csv')
+                    file = open(path, 'a', newline='')
+                    writer = csv.writer(file)
+                    if file.tell() == 0:
+                        writer.writerow(header)
+                    files[day] = (file, writer)
+                files[day][1].writerow(row)
+                row_cnt += 1
+    finally:
+        for file, _ in files.values():
+            file.close()
+    return row_cnt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily partitioned log store")
+    parser.add_argument('--import', dest='import_files', nargs='+', default=[],
+                        help='Enter the csv logs to split into daily files.')
+    parser.add_argument('--store', default=LOG_STORE, help='Enter the store directory.')
+    parser.add_argument('--name', default=None, help='Enter a log to summarise.')
+    args = parser.parse_args()
+    for filename in args.import_files:
+        print(f'Imported {import_csv(filename, args.store)} rows of {filename} into '
+              f'{get_partition_dir(filename, args.store)}')
+    if args.name:
+        partitions = list_partitions(args.name, args.store)
+        print(f'{args.name}: {len(partitions)} days'
+              + (f' from {partitions[0][0]} to {partitions[-1][0]}' if partitions else ''))
+
+
+if __name__ == "__main__":
+    main()
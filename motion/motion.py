@@ -79,29 +79,60 @@ v3.30   18/04/2024 Include a log of recording times.
 v3.31   22/04/2024 Use recording CSV to check recording status.
 v3.32   25/04/2024 Remove the socket server.
 v3.33   02/06/2024 Mask mask_path causes a crash.
+v3.34   18/10/2026 Capture frames on a separate thread via capture_thread.
+v3.35   18/10/2026 Detect movement on the Y plane of the lores stream via lores_stream.
+v3.36   18/10/2026 Add frame sources and --replay to run motion against recorded footage.
+v3.37   18/10/2026 Add --stage-timings and --frames for the benchmark.
+v3.38   18/10/2026 Replace the movement buffer with the TriggerEngine class.
+v3.39   18/10/2026 Add --movement-series to log the movement level of every frame for triggerBacktest.py.
+v3.40   18/10/2026 Only mask and detect movement within the bounding box of the mask, or of each region via mask_regions.
+v3.41   18/10/2026 Draw the ROI from an overlay rendered once when the mask is loaded.
+v3.42   18/10/2026 Draw the date, temperature, frame count and statistics from cached text sprites.
+v3.43   18/10/2026 Keep the graph in a circular buffer of columns instead of shifting a new image every frame.
+v3.44   18/10/2026 Measure movement with connected components, the level is selected by movement_metric.
+v3.45   18/10/2026 Replace MovementTracker with the vectorised tracker, enabled by tracking.
+v3.46   18/10/2026 Encode and close mp4 files on an encoder thread fed through a queue of encoder_queue frames.
+v3.47   18/10/2026 Select the mp4 encoder backend, opencv or ffmpeg, with encoder, codec, preset and crf.
+v3.48   18/10/2026 Write the jpg and csv files, version and command at the end of a recording on post_workers threads.
+v3.49   18/10/2026 Optionally hold the pre_frames compressed within pre_roll_mb via pre_roll.
+v3.50   18/10/2026 Hold the buffered frames and peak snapshots by reference, copying only when a frame is shared.
+v3.51   18/10/2026 Run yolo_detection on the peak frame of each event in the YoloWorker process.
+v3.52   18/10/2026 Add nms_threshold and draw_objects for yolo_detection.
+v3.53   18/10/2026 Detect objects within the box of movement via crop_to_motion, with the yolo, hog or haar detector.
+v3.54   18/10/2026 Write the csv logs through a shared TelemetrySink every csv_flush_seconds or csv_flush_rows.
+v3.55   18/10/2026 Replace TimingsCSV with the always on StageProfiler, SIGUSR2 dumps percentiles to timings.csv.
+v3.56   18/10/2026 Write the timestamped csv logs as daily files in the logs directory, see logStore.py.
+v3.57   18/10/2026 A replay only advances on the stream the loop captures.
+v3.58   18/10/2026 With lores_stream capture the main frame from the same request for the yolo snapshot.
+v3.59   18/10/2026 Copy the yolo snapshot when it is the buffered frame so it does not pick up the overlays.
+v3.60   18/10/2026 Remove StageTimer, --stage-timings is written by the StageProfiler.
+v3.61   18/10/2026 The video encoder logs a failed mp4 rather than stopping motion.
+v3.62   18/10/2026 A jpg that cv2.imwrite fails to write raises so the job is retried, remove write_version.
+v3.63   18/10/2026 Threshold the mask and drop regions smaller than mask_min_area.
+v3.64   18/10/2026 The frame closing an mp4 is no longer also kept for the next event's pre-roll.
+v3.65   18/10/2026 A capture read timeout is logged and retried rather than skipping the close down.
 """
 __author__ = "Peter Goodgame"
 __name__ = "motion"
-__version__ = "v3.33"
+__version__ = "v3.65"
 
 import gc
 import os
 import argparse
 import collections
 import configparser
-import csv
 import logging
 
 try:
     from systemd.journal import JournalHandler
 except ModuleNotFoundError:
-    pass
+    JournalHandler = None
 
-import math
 import signal
 import subprocess
 import psutil
 import sys
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
@@ -111,9 +142,26 @@ from picamera2 import Picamera2
 from libcamera import controls
 from visitsCSV import VisitsCSV
 from triggerCSV import TriggerCSV
+from triggerEngine import TriggerEngine
+from roiOverlay import RoiOverlay
+from textSprites import TextSprites
+from movementMetrics import MovementMetrics
+from movementTracker import MovementTracker
 from tempLogCSV import TempCSV
 from fpsLogCSV import FPSLogCSV
 from recordingLogCSV import RecordingLogCSV
+from frameCapture import FrameCapture
+from frameSource import CameraSource, ReplaySource
+from jobQueue import JobQueue
+from preRoll import PreRoll
+from yoloWorker import YoloWorker
+from videoEncoder import VideoEncoder, get_writer_factory, is_available
+from telemetrySink import TelemetrySink, get_sink
+from logStore import get_partition_dir
+from stageProfiler import (StageProfiler, START_LOOP, READ_FRAME, ZOOM_FRAME, RESIZE_FRAME, ROTATE_FRAME,
+                           APPLY_MASK, DETECT_MOVEMENT, ADD_DATE, CHECK_MOVEMENT, UPDATE_GRAPH, DRAW_BOX,
+                           WRITE_VIDEO, CLOSE_VIDEO, WRITE_JPEG, WRITE_YOLO, SUBTRACT_BACKGROUND,
+                           MEASURE_MOVEMENT)
 
 
 class TriggerMotion:
@@ -149,56 +197,11 @@ class GracefulKiller:
         self.kill_now = True
 
 
-class MovementTracker:
-    def __init__(self):
-        # Store the center positions of the objects
-        self.center_points = {}
-        # Keep the count of the IDs
-        # each time a new object id detected, the count will increase by one
-        self.id_count = 0
-
-    def update(self, objects_rect):
-        # Objects boxes and ids
-        objects_bbs_ids = []
-
-        # Get center point of new object
-        for rect in objects_rect:
-            mt_x, mt_y, mt_w, mt_h = rect
-            cx = (mt_x + mt_x + mt_w) // 2
-            cy = (mt_y + mt_y + mt_h) // 2
-
-            # Find out if that object was detected already
-            same_object_detected = False
-            for id, pt in self.center_points.items():
-                dist = math.hypot(cx - pt[0], cy - pt[1])
-
-                if dist < 25:
-                    self.center_points[id] = (cx, cy)
-                    objects_bbs_ids.append([mt_x, mt_y, mt_w, mt_h, id])
-                    same_object_detected = True
-                    break
-
-            # New object is detected we assign the ID to that object
-            if same_object_detected is False:
-                self.center_points[self.id_count] = (cx, cy)
-                objects_bbs_ids.append([mt_x, mt_y, mt_w, mt_h, self.id_count])
-                self.id_count += 1
-
-        # Clean the dictionary by center points to remove IDS not used anymore
-        new_center_points = {}
-        for obj_bb_id in objects_bbs_ids:
-            _, _, _, _, object_id = obj_bb_id
-            center = self.center_points[object_id]
-            new_center_points[object_id] = center
-
-        # Update dictionary with IDs not used removed
-        self.center_points = new_center_points.copy()
-        return objects_bbs_ids
-
-
 class Graph:
     """
     Draws a graph plotting movement levels.
+    v3.43 The graph is a circular buffer of columns, each update draws one column in place and
+    the graph is only put together when it is drawn on a frame.
     """
 
     def __init__(self, g_width, g_height, boarder, g_trigger_point_base, g_trigger_point):
@@ -210,9 +213,16 @@ class Graph:
         self.g_trigger_point_base = g_trigger_point_base
         self.scaling_factor = 4
         self.scaling_value = (self.y / self.scaling_factor) / self.g_trigger_point
-        self.graph = np.zeros((self.y, self.x, 3), np.uint8)
-        self.icon_buffer_list = []
+        self.graph = np.zeros((self.y, self.x, 3), np.uint8)  # Circular buffer of columns.
+        self.head = 0  # Column written by the next update, also the oldest column.
         self.icon_size = round(self.y * 0.5)
+        # Queue of icon columns waiting to be drawn.
+        self.icon_capacity = self.icon_size * 4
+        self.icon_top = np.zeros(self.icon_capacity, np.dtype('int32'))
+        self.icon_bottom = np.zeros(self.icon_capacity, np.dtype('int32'))
+        self.icon_color = np.zeros((self.icon_capacity, 3), np.uint8)
+        self.icon_read = 0
+        self.icon_cnt = 0
         # print(f'Graph shape is: {self.graph.shape}')
 
     def update_frame(self, value):
@@ -223,38 +233,53 @@ class Graph:
             scaled_value = 0
         elif scaled_value >= self.y:
             scaled_value = self.y - 1
-        new_graph = np.zeros((self.y, self.x, 3), np.uint8)
-        new_graph[:, :-1, :] = self.graph[:, 1:, :]
+        column = self.graph[:, self.head, :]
+        column[:] = 0
         green = 0, 255, 0
         # yellow = 0, 227, 255
         amber = 0, 183, 245
         white = 255, 255, 255
 
         if scaled_value > scaled_tp:
-            new_graph[self.y - scaled_btp:, -1, :] = white
-            new_graph[self.y - scaled_tp:self.y - scaled_btp, -1, :] = amber
-            new_graph[self.y - scaled_value:self.y - scaled_tp, -1, :] = green
+            column[self.y - scaled_btp:] = white
+            column[self.y - scaled_tp:self.y - scaled_btp] = amber
+            column[self.y - scaled_value:self.y - scaled_tp] = green
         else:
             if scaled_value > scaled_btp:
-                new_graph[self.y - scaled_btp:, -1, :] = white
-                new_graph[self.y - scaled_value:self.y - scaled_btp, -1, :] = amber
+                column[self.y - scaled_btp:] = white
+                column[self.y - scaled_value:self.y - scaled_btp] = amber
             else:
                 if scaled_value > 0:
-                    new_graph[(self.y - scaled_value):, -1, :] = white
-
-        if len(self.icon_buffer_list) > 0:
-            top, bottom, color = self.icon_buffer_list.pop(0)
-            new_graph[top: bottom, -1, :] = color
-        self.graph = new_graph
+                    column[(self.y - scaled_value):] = white
+
+        if self.icon_cnt > 0:
+            column[self.icon_top[self.icon_read]:self.icon_bottom[self.icon_read]] = self.icon_color[self.icon_read]
+            self.icon_read = (self.icon_read + 1) % self.icon_capacity
+            self.icon_cnt -= 1
+        self.head += 1
+        if self.head == self.x:
+            self.head = 0
+
+    def put_icon(self, top, bottom, color):
+        """Queue an icon column, the oldest is dropped if the queue is full."""
+        if self.icon_cnt == self.icon_capacity:
+            self.icon_read = (self.icon_read + 1) % self.icon_capacity
+            self.icon_cnt -= 1
+        i = (self.icon_read + self.icon_cnt) % self.icon_capacity
+        self.icon_top[i] = top
+        self.icon_bottom[i] = bottom
+        self.icon_color[i] = color
+        self.icon_cnt += 1
 
     def put_start_icon(self):
         red = 0, 0, 255
         # black = 255, 255, 255
-        self.graph = np.zeros((self.y, self.x, 3), np.uint8)
+        self.graph[:] = 0
+        self.head = 0
         for i in reversed(range(self.icon_size)):
             top = int((self.y / 2) - (i / 2))
             bottom = int((self.y / 2) + (i / 2))
-            self.icon_buffer_list.append([top, bottom, red])
+            self.put_icon(top, bottom, red)
         return True
 
     def put_pause_icon(self):
@@ -270,7 +295,7 @@ class Graph:
                 color = red
             top = int((self.y / 2) - self.icon_size / 2)
             bottom = int((self.y / 2) + self.icon_size / 2)
-            self.icon_buffer_list.append([top, bottom, color])
+            self.put_icon(top, bottom, color)
         return False
 
     def put_stop_icon(self):
@@ -280,102 +305,38 @@ class Graph:
         top = int((self.y / 2) - (self.icon_size / 2))
         bottom = int((self.y / 2) + (self.icon_size / 2))
         for i in range(self.icon_size):
-            self.icon_buffer_list.append([top, bottom, color])
+            self.put_icon(top, bottom, color)
         return False
 
     def get_icon_size(self):
         return self.icon_size
 
+    def draw(self, g_roi):
+        """Draw the graph oldest column first into the roi with two copies either side of the head."""
+        split = self.x - self.head
+        g_roi[:, :split] = self.graph[:, self.head:]
+        g_roi[:, split:] = self.graph[:, :self.head]
+        return g_roi
+
     def get_graph(self):
-        return self.graph
+        return self.draw(np.empty_like(self.graph))
 
     def get_roi(self, g_frame):
         return g_frame[-abs(self.y + self.b):-abs(self.b), -abs(self.x + self.b):-abs(self.b), :]
 
 
-class TimingsCSV:
-    """
-    This class will output timing data4.
-    maximum is the maximum number of records written default is 1000.
-    """
-
-    def __init__(self, enabled=False, grace=1):
-        self.enabled = enabled
-        self.grace = grace
-        self.record_cnt = 0
-        self.point = None
-        self.index = 0
-        self.started = False
-        self.dict = {}
-        self.milliseconds = None
-        self.last_ms = 0
-        self.current_ms = 0
-        self.time_ms = 0
-        self.csv_file = "timings.csv"
-        self.columns = ['Point', 'Milliseconds']
-        self.delete()
-        self.create()
-
-    def lookup_point(self, point):
-        result = self.dict.get(point)
-        if not result:
-            self.index += 1
-            self.dict[point] = self.index
-        n = str(self.dict[point]).zfill(2)
-        return f'{n}-{point}'
-
-    def log_point(self, point, start=False):
-        if self.enabled and (self.started or start):
-            self.started = True
-            self.point = self.lookup_point(point)
-            self.current_ms = round(time.time() * 2000)
-            if self.last_ms > 0:
-                self.milliseconds = self.current_ms - self.last_ms
-                self.write()
-            self.last_ms = self.current_ms
-
-    def delete(self):
-        if self.enabled:
-            if os.path.exists(self.csv_file):
-                os.remove(self.csv_file)
-
-    def create(self):
-        if self.enabled:
-            self.record_cnt = 0
-            with open(self.csv_file, 'w', newline='') as file:
-                _writer = csv.DictWriter(file, fieldnames=self.columns)
-                _writer.writeheader()
-                _writer = None
-
-    def write(self):
-        if self.enabled:
-            self.record_cnt += 1
-            if self.record_cnt > self.grace:
-                with open(self.csv_file, 'a', newline='') as file:
-                    _writer = csv.DictWriter(file, fieldnames=self.columns)
-                    _writer.writerow({"Point": self.point,
-                                      "Milliseconds": self.milliseconds})
-                    _writer = None
-                # Limit size to 1000 records.
-                if self.record_cnt > 1000 + self.grace:
-                    self.enabled = False
-                    Path('timings.sig').touch()
-                return True
-            else:
-                return False
-
-
 class FramesPerSecondCSV:
     """
     Create a csv file showing how many frames are processed each second.
     """
 
-    def __init__(self, target_fps):
+    def __init__(self, target_fps, sink=None):
         self.maximum = 200  # Maximum number of records to write.
         self.record_cnt = 0  # Number of records written.
         self.frame_cnt = 0  # Frames processed.
         self.csv_file = "frames-per-second.csv"
         self.columns = ['Seconds', 'Target', 'FPS']
+        self.telemetry = (sink or get_sink()).register(self.csv_file, self.columns)
         self.delete()
         self.create()
         self.now = 0
@@ -383,26 +344,18 @@ class FramesPerSecondCSV:
         self.target_fps = target_fps
 
     def delete(self):
-        if os.path.exists(self.csv_file):
-            os.remove(self.csv_file)
+        self.telemetry.delete()
         self.record_cnt = 0
 
     def create(self):
         self.record_cnt = 0
-        with open(self.csv_file, 'w', newline='') as file:
-            _writer = csv.DictWriter(file, fieldnames=self.columns)
-            _writer.writeheader()
-            _writer = None
 
     def write(self):
         if self.record_cnt < self.maximum:
             self.record_cnt += 1
-            with open(self.csv_file, 'a', newline='') as file:
-                _writer = csv.DictWriter(file, fieldnames=self.columns)
-                _writer.writerow({"Seconds": self.record_cnt,
+            self.telemetry.write({"Seconds": self.record_cnt,
                                   'Target': self.target_fps,
                                   'FPS': self.frame_cnt})
-                _writer = None
             self.frame_cnt = 0
             return True
         else:
@@ -419,58 +372,6 @@ class FramesPerSecondCSV:
             return self.write()
 
 
-class Yolo:
-    def __init__(self):
-        self.weights = 'Motion/props/yolov3.weights'
-        self.cfg = 'Motion/props/yolov3.cfg'
-        self.coco_names = 'Motion/props/coco.names'
-        self.net = cv2.dnn.readNet(self.weights, self.cfg)
-        classes = []
-        with open(self.coco_names, "r") as f:
-            self.classes = [line.strip() for line in f.readlines()]
-        self.layer_names = self.net.getLayerNames()
-        self.output_layers = [self.layer_names[i - 1] for i in self.net.getUnconnectedOutLayers()]
-        self.colors = np.random.uniform(0, 255, size=(len(classes), 3))
-        self.blob = None
-        self.image = None
-        self.outs = None
-        self.width = None
-        self.height = None
-        self.channels = None
-
-    def detect_objects(self, image):
-        self.image = image
-        self.height, self.width, self.channels = image.shape
-        # Detecting objects
-        self.blob = cv2.dnn.blobFromImage(image, 0.00392, (416, 416), (0, 0, 0), True, crop=False)
-        self.net.setInput(self.blob)
-        self.outs = self.net.forward(self.output_layers)
-
-    def display_objects(self):
-        # Show information on the screen
-        class_ids = []
-        confidences = []
-        boxes = []
-        for out in self.outs:
-            for detection in out:
-                scores = detection[5:]
-                class_id = np.argmax(scores)
-                confidence = scores[class_id]
-                if confidence > 0.5:
-                    # Object detected
-                    center_x = int(detection[0] * self.width)
-                    center_y = int(detection[1] * self.height)
-                    w = int(detection[2] * self.width)
-                    h = int(detection[3] * self.height)
-                    # Rectangle coordinates
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-                    boxes.append([x, y, w, h])
-                    confidences.append(float(confidence))
-                    class_ids.append(class_id)
-        return self.image
-
-
 class FPS:
     def __init__(self, avarageof=50):
         self.frametimestamps = collections.deque(maxlen=avarageof)
@@ -497,6 +398,8 @@ class Version:
         self.vparse = configparser.ConfigParser()
         self.vparse.read('version.ini')
         self.version = int(self.vparse.get('MP4', 'version'))
+        self.saved = self.version
+        self.lock = threading.Lock()
 
     def get_version(self):
         """
@@ -505,22 +408,24 @@ class Version:
         self.version += 1
         return self.version
 
-    def write_version(self):
+    def save_version(self, sv_version):
         """
-        Updates the version number and returns the next number.
+        v3.48 Write a version number taken by get_version() to the ini file, run as a post event job.
+        An older number never replaces a newer one.
         """
-        # Update ini file.
-        self.vparse = configparser.ConfigParser()
-        self.vparse.read('version.ini')
-        self.vparse.set('MP4', 'version', str(self.get_version()))
-        fp = open('version.ini', 'w')
-        self.vparse.write(fp)
-        fp.close()
-        return self.version
+        with self.lock:
+            if sv_version <= self.saved:
+                return
+            self.vparse = configparser.ConfigParser()
+            self.vparse.read('version.ini')
+            self.vparse.set('MP4', 'version', str(sv_version))
+            with open('version.ini', 'w') as fp:
+                self.vparse.write(fp)
+            self.saved = sv_version
 
 
 class MovementCSV:
-    def __init__(self, debug_movements_csv=False, interval=60):
+    def __init__(self, debug_movements_csv=False, interval=60, sink=None):
         self.debug = debug_movements_csv
         self.interval = interval
         self.trigger_point = 0
@@ -544,7 +449,8 @@ class MovementCSV:
         self.variable_trigger_point = 0  # Variable trigger point = movement_average + trigger point
         self.last_write_time = datetime.now()  # Last write time.
         self.now = datetime.now()
-        self.csv_file = "peakMovement.csv"
+        # v3.56 A daily file in logs/peakMovement.
+        self.csv_file = get_partition_dir("peakMovement")
         self.columns = ['Timestamp',
                         'Trigger Point',
                         'Trigger Point Base',
@@ -557,18 +463,9 @@ class MovementCSV:
                         'Variable Trigger Point Base',
                         'Highest Peak',
                         'Trigger Value']
-
-        if not os.path.isfile(self.csv_file):
-            self.create()
-
-    def create(self):
-        log.info(f'CSV:created file {self.csv_file}')
-        with open(self.csv_file, 'w', newline='') as file:
-            # creating a csv dict writer object
-            _writer = csv.DictWriter(file, fieldnames=self.columns)
-            # writing headers (field names)
-            _writer.writeheader()
-            _writer = None
+        # v3.54 The sink keeps the file open and creates it again if it is deleted, so it is no longer
+        # checked for on every frame.
+        self.telemetry = (sink or get_sink()).register(self.csv_file, self.columns, partitioned=True)
 
     """
     Called after the parameters are read.
@@ -590,8 +487,6 @@ class MovementCSV:
         self.subtraction_history = _subtraction_history
         self.movement_history_window = _movement_history_window
         self.movement_history_age = _movement_history_age
-        if not os.path.isfile(self.csv_file):
-            self.create()
 
     def log_level(self, ll_movement_level):
         """
@@ -599,8 +494,6 @@ class MovementCSV:
         """
         if self.debug:
             print('CSV:log_level')
-        if not os.path.isfile(self.csv_file):
-            self.create()
         if ll_movement_level > 0:
             self.movement_cnt += 1
             self.movement_total += ll_movement_level
@@ -631,8 +524,6 @@ class MovementCSV:
         """
         if self.debug:
             print('CSV:log_motion')
-        if not os.path.isfile(self.csv_file):
-            self.create()
         if self.trigger_highest < _motion_level:
             self.trigger_highest = _motion_level
 
@@ -642,13 +533,9 @@ class MovementCSV:
         """
         if self.debug:
             print('CSV:motion_write')
-        if not os.path.isfile(self.csv_file):
-            self.create()
+        timestamp = self.now.strftime("%Y-%m-%d %H:%M")
         if not sighup:
-            with open(self.csv_file, 'a', newline='') as file:
-                _writer = csv.DictWriter(file, fieldnames=self.columns)
-                timestamp = self.now.strftime("%Y-%m-%d %H:%M")
-                _writer.writerow({"Timestamp": timestamp,
+            self.telemetry.write({"Timestamp": timestamp,
                                   'Trigger Point': self.trigger_point,
                                   'Trigger Point Base': self.trigger_point_base,
                                   'Movement History Window': self.movement_history_window,
@@ -661,12 +548,8 @@ class MovementCSV:
                                   "Variable Trigger Point": self.movement_average + self.trigger_point,
                                   "Variable Trigger Point Base": self.movement_average + self.trigger_point_base})
             self.trigger_highest = 0
-            _writer = None
         else:
-            with open(self.csv_file, 'a', newline='') as file:
-                _writer = csv.DictWriter(file, fieldnames=self.columns)
-                timestamp = self.now.strftime("%Y-%m-%d %H:%M")
-                _writer.writerow({"Timestamp": timestamp,
+            self.telemetry.write({"Timestamp": timestamp,
                                   'Trigger Point': 1,
                                   'Trigger Point Base': 1,
                                   'Movement History Window': self.movement_history_window,
@@ -676,7 +559,6 @@ class MovementCSV:
                                   "Average": 1,
                                   "Highest Peak": 1,
                                   "Trigger Value": 1})
-                _writer = None
 
     def write(self):
         """
@@ -684,12 +566,8 @@ class MovementCSV:
         """
         if self.debug:
             print('CSV:write')
-        if not os.path.isfile(self.csv_file):
-            self.create()
-        with open(self.csv_file, 'a', newline='') as file:
-            _writer = csv.DictWriter(file, fieldnames=self.columns)
-            timestamp = self.now.strftime("%Y-%m-%d %H:%M")
-            _writer.writerow({"Timestamp": timestamp,
+        timestamp = self.now.strftime("%Y-%m-%d %H:%M")
+        self.telemetry.write({"Timestamp": timestamp,
                               'Trigger Point': self.trigger_point,
                               'Trigger Point Base': self.trigger_point_base,
                               'Movement History Window': self.movement_history_window,
@@ -705,7 +583,8 @@ class MovementCSV:
 
 class MP4:
 
-    def __init__(self, path, mp4_size, mp4_frame_rate):
+    def __init__(self, path, mp4_size, mp4_frame_rate, mp4_queue_size=0, mp4_encoder='opencv', mp4_codec=None,
+                 mp4_preset=None, mp4_crf=None):
         self.path = path
         self.size = mp4_size
         self.frame_rate = mp4_frame_rate
@@ -713,8 +592,10 @@ class MP4:
         self.writer = None
         self.filename = None
         self.filepath = None
-        self.avc1 = None
-        self.mp4v = None
+        # v3.47 The encoder backend opens the writer for each file.
+        self.open_writer = get_writer_factory(mp4_encoder, mp4_frame_rate, mp4_size, mp4_codec, mp4_preset, mp4_crf)
+        # v3.46 Frames are encoded on a worker thread.
+        self.encoder = VideoEncoder(self.open_writer, mp4_queue_size, log=log).start()
 
         if not os.path.exists(self.path):
             log.info('Creating output directory {}'.format(self.path))
@@ -728,16 +609,22 @@ class MP4:
         return self.filepath
 
     def open(self):
-        # x264 = cv2.VideoWriter_fourcc(*'X264')
-        self.avc1 = cv2.VideoWriter_fourcc(*'AVC1')
-        self.mp4v = cv2.VideoWriter_fourcc(*'mp4v')
-        self.writer = cv2.VideoWriter(self.new_filename(self.version), self.mp4v, self.frame_rate, self.size)
+        self.encoder.open(self.new_filename(self.version))
+        self.writer = self.encoder
         return self.writer
 
-    def close(self):
-        self.writer.release()
+    def close(self, on_closed=None):
+        """Finalise the file on the encoder thread, on_closed is called once the file is complete."""
+        self.encoder.close(on_closed)
         self.writer = None
 
+    def stop(self):
+        """Wait for the encoder to finish."""
+        self.encoder.stop()
+
+    def get_stats(self):
+        return self.encoder.get_stats()
+
     def is_open(self):
         if self.writer:
             return True
@@ -759,7 +646,7 @@ class MotionINI:
         self.filename = 'motion.ini'
         self.config = configparser.ConfigParser(allow_no_value=True)
         self.sections = ['DISPLAY', 'CAMERA', 'MP4', 'OUTPUT', 'STATISTICS',
-                         'GRAPH', 'MOTION', 'ROI', 'BOX', 'DATE', 'TEMP']
+                         'GRAPH', 'MOTION', 'ROI', 'BOX', 'DATE', 'TEMP', 'YOLO']
         self.read_config()
 
     def write(self):
@@ -771,6 +658,14 @@ class MotionINI:
         self.config.set('MP4', '; image_record_fps', '30')
         self.config.set('MP4', '; image_playback_fps', '30')
         self.config.set('MP4', '; stabilise', '40')
+        self.config.set('MP4', '# Frames queued for the encoder thread, 0 encodes in the main loop.')
+        self.config.set('MP4', '; encoder_queue', '60')
+        self.config.set('MP4', '# The encoder is opencv or ffmpeg. The codec defaults to mp4v for opencv and libx264 for ffmpeg.')
+        self.config.set('MP4', '# The preset and crf are passed to ffmpeg, off leaves them out.')
+        self.config.set('MP4', '; encoder', 'opencv')
+        self.config.set('MP4', '; codec', 'mp4v')
+        self.config.set('MP4', '; preset', 'veryfast')
+        self.config.set('MP4', '; crf', '23')
 
         self.config.set('MOTION', '# Set the level at which motion is started and ends.')
         self.config.set('MOTION', '; trigger_point', '200')
@@ -778,6 +673,10 @@ class MotionINI:
         self.config.set('MOTION', '# Use movement window and age to smooth out motion triggering.')
         self.config.set('MOTION', '; movement_window', '30')
         self.config.set('MOTION', '; movement_window_age', '10')
+        self.config.set('MOTION', '# The movement level is the number of blobs, the area of movement in pixels or the largest blob.')
+        self.config.set('MOTION', '; movement_metric', 'blobs')
+        self.config.set('MOTION', '# Track the blobs of movement and write their ids, velocities and dwell times for each event.')
+        self.config.set('MOTION', '; tracking', 'off')
         self.config.set('MOTION', '# Set trigger_point_csv_window to output analysis of the trigger points')
         self.config.set('MOTION', '; trigger_point_csv_window', '50')
         self.config.set('MOTION', '# MOG2 Settings.')
@@ -796,6 +695,11 @@ class MotionINI:
         self.config.set('CAMERA', '; image_horizontal_flip', 'off')
         self.config.set('CAMERA', '; image_vertical_flip', 'off')
         self.config.set('CAMERA', '; zoom_factor', '1.3')
+        self.config.set('CAMERA', '# Capture frames on a separate thread into a ring of capture_slots frames.')
+        self.config.set('CAMERA', '; capture_thread', 'on')
+        self.config.set('CAMERA', '; capture_slots', '4')
+        self.config.set('CAMERA', '# Detect movement on the lores stream instead of resizing the main stream.')
+        self.config.set('CAMERA', '; lores_stream', 'off')
 
         self.config.set('DISPLAY', '; display', 'off')
         self.config.set('DISPLAY', '; display_image_width', '480')
@@ -808,18 +712,51 @@ class MotionINI:
         self.config.set('OUTPUT', '# Number of extra frames before and after the event.')
         self.config.set('OUTPUT', '; pre_frames', '20')
         self.config.set('OUTPUT', '; post_frames', '80')
+        self.config.set('OUTPUT', '# Hold the pre_frames compressed as jpg or png, off holds them uncompressed. png is lossless but much slower.')
+        self.config.set('OUTPUT', '# pre_roll_mb limits the memory used and pre_roll_quality is the jpg quality.')
+        self.config.set('OUTPUT', '; pre_roll', 'off')
+        self.config.set('OUTPUT', '; pre_roll_mb', '256')
+        self.config.set('OUTPUT', '; pre_roll_quality', '90')
         self.config.set('OUTPUT', '; timelapse_frame_number', '17')
         self.config.set('OUTPUT', '; csv_output', 'off')
         # self.config.set('OUTPUT', '; csv_frames_per_second', 'off')
         self.config.set('OUTPUT', '; display_frame_cnt', 'off')
+        self.config.set('OUTPUT', '# Write the timing percentiles to timings.csv on exit, SIGUSR2 writes them at any time.')
         self.config.set('OUTPUT', '; csv_timings', 'off')
         self.config.set('OUTPUT', '; yolo_output', 'off')
+        self.config.set('OUTPUT', '# Detect the objects in the peak frame of each event, see the YOLO section.')
+        self.config.set('OUTPUT', '; yolo_detection', 'off')
         self.config.set('OUTPUT', '; csv_visits_log', 'off')
         self.config.set('OUTPUT', '; csv_output', 'off')
         self.config.set('OUTPUT', '; csv_timings', 'off')
         self.config.set('OUTPUT', '; csv_fps_monitor', 'off')
         self.config.set('OUTPUT', '; csv_recording_log', 'off')
+        self.config.set('OUTPUT', '# The csv rows are held in memory and written every csv_flush_seconds or once csv_flush_rows are waiting.')
+        self.config.set('OUTPUT', '; csv_flush_seconds', '5')
+        self.config.set('OUTPUT', '; csv_flush_rows', '500')
         self.config.set('OUTPUT', '; garbage_collection_debug', 'off')
+        self.config.set('OUTPUT', '# Threads writing the files at the end of a recording, 0 writes them in the main loop.')
+        self.config.set('OUTPUT', '; post_workers', '2')
+
+        self.config.set('YOLO', '# The detector used by yolo_detection is yolo, hog for the people detector or haar with a cascade file.')
+        self.config.set('YOLO', '; detector', 'yolo')
+        self.config.set('YOLO', '; cascade', 'Motion/props/haarcascade_frontalface_alt2.xml')
+        self.config.set('YOLO', '# Only detect within the box of movement padded by crop_padding times its size and at least crop_min pixels.')
+        self.config.set('YOLO', '; crop_to_motion', 'on')
+        self.config.set('YOLO', '; crop_padding', '0.5')
+        self.config.set('YOLO', '; crop_min', '128')
+        self.config.set('YOLO', '# The network used by the yolo detector, use the yolov3-tiny files for a faster and smaller network.')
+        self.config.set('YOLO', '; weights', 'Motion/props/yolov3.weights')
+        self.config.set('YOLO', '; cfg', 'Motion/props/yolov3.cfg')
+        self.config.set('YOLO', '; names', 'Motion/props/coco.names')
+        self.config.set('YOLO', '; confidence', '0.5')
+        self.config.set('YOLO', '; input_size', '416')
+        self.config.set('YOLO', '# Overlapping boxes of an object are suppressed above nms_threshold.')
+        self.config.set('YOLO', '; nms_threshold', '0.4')
+        self.config.set('YOLO', '# Write a jpg with the objects drawn as well as the json file.')
+        self.config.set('YOLO', '; draw_objects', 'off')
+        self.config.set('YOLO', '# Frames waiting for detection, more are dropped.')
+        self.config.set('YOLO', '; queue_size', '4')
 
         self.config.set('GRAPH', '# Output a graph on MP4 of jpg if set to on and off is the default.')
         self.config.set('GRAPH', '; draw_graph', 'off')
@@ -827,6 +764,10 @@ class MotionINI:
 
         self.config.set('ROI', '# Define the area of interest.')
         self.config.set('ROI', '; mask_path', 'Motion/props/mask.jpg')
+        self.config.set('ROI', '# Detect movement separately in each region of the mask, off uses one box around the whole mask.')
+        self.config.set('ROI', '; mask_regions', 'off')
+        self.config.set('ROI', '# Mask regions smaller than this many pixels, such as jpg noise, are removed.')
+        self.config.set('ROI', '; mask_min_area', '16')
         self.config.set('ROI', '; display_roi', 'off')
         self.config.set('ROI', '; display_roi_jpg', 'off')
         self.config.set('ROI', 'display_roi_thickness', '1')
@@ -911,62 +852,109 @@ global trigger_point_base
 #     print('(SIGHUP) reading configuration')
 #     return
 
-def detect_movement(dm_roi):
-    """Detect movement and return the areas of movement."""
-    mask = object_detector.apply(dm_roi)
-    _, mask = cv2.threshold(mask, 254, 255, cv2.THRESH_BINARY)
-    dm_contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    return dm_contours
+def create_object_detector():
+    return cv2.createBackgroundSubtractorMOG2(history=subtraction_history,
+                                              varThreshold=subtraction_threshold,
+                                              detectShadows=True)
 
 
-def load_mask(lm_path):
-    """Load the mask from the given path"""
+def find_blobs(fb_detector, fb_roi, fb_offset=(0, 0)):
+    """Apply background subtraction to the roi and measure the areas of movement in frame coordinates."""
+    mask = fb_detector.apply(fb_roi)
+    profiler.point(SUBTRACT_BACKGROUND)
+    _, mask = cv2.threshold(mask, 254, 255, cv2.THRESH_BINARY)
+    # v3.44 One pass of connected components rather than the full contour hierarchy.
+    movement_metrics.add(mask, fb_offset)
+    profiler.point(MEASURE_MOVEMENT)
+
+
+def detect_movement(dm_frame):
+    """Detect movement and return the movement metrics of the frame."""
+    movement_metrics.reset()
+    if mask_boxes is None:
+        find_blobs(object_detectors[0], dm_frame)
+        return movement_metrics.finish()
+    # v3.40 Only the masked area is modelled, there is no point modelling pixels that can never move.
+    for (x, y, w, h), detector in zip(mask_boxes, object_detectors):
+        roi = dm_frame[y:y + h, x:x + w]
+        roi = cv2.bitwise_and(roi, roi, mask=mask_img[y:y + h, x:x + w])
+        profiler.point(APPLY_MASK)
+        find_blobs(detector, roi, (x, y))
+    return movement_metrics.finish()
+
+
+def load_mask(lm_path, lm_regions=False, lm_min_area=16):
+    """
+    Load the mask from the given path.
+    Returns the mask and the bounding box of the masked area, or a bounding box for each
+    separate region of the mask if lm_regions is set. Regions smaller than lm_min_area are removed.
+    """
     _ret = cv2.imread(lm_path)
     _h = _ret.shape[0]
     _w = _ret.shape[1]
     if not _w == lores_width:
         _ret = resize_img(_ret, (lores_width, lores_height))
-    return cv2.cvtColor(_ret, cv2.COLOR_BGR2GRAY)
+    _ret = cv2.cvtColor(_ret, cv2.COLOR_BGR2GRAY)
+    # v3.63 Any value above 0 lets a pixel through, threshold away the jpg noise.
+    _, _ret = cv2.threshold(_ret, 127, 255, cv2.THRESH_BINARY)
+    _cnt, _labels, _stats, _ = cv2.connectedComponentsWithStats(_ret)
+    # Label 0 is the unmasked background.
+    _small = [i for i in range(1, _cnt) if _stats[i, cv2.CC_STAT_AREA] < lm_min_area]
+    if _small:
+        _ret[np.isin(_labels, _small)] = 0
+    if lm_regions:
+        _boxes = [tuple(int(v) for v in _stats[i, :4]) for i in range(1, _cnt) if i not in _small]
+    else:
+        _boxes = [cv2.boundingRect(_ret)]
+    return _ret, [_box for _box in _boxes if _box[2] and _box[3]]
 
 
 def put_frame_cnt(pfc_frame, pfc_cnt):
     """Write the frame count number on the frame."""
-    text_size, _ = cv2.getTextSize(str(pfc_cnt), font, date_font_scale, date_font_thickness)
+    text_size = text_sprites.get_text_size(str(pfc_cnt), date_font_scale, date_font_thickness)
     boarder = 5
     line_height = text_size[1]
     wt_pos = 1 + boarder, line_height + boarder
 
-    cv2.putText(pfc_frame,
-                str(pfc_cnt),
-                wt_pos,
-                font,
-                date_font_scale,
-                date_rgb,
-                date_font_thickness,
-                cv2.LINE_AA)
+    # v3.42 The count changes every frame so only the digits are cached.
+    text_sprites.put_chars(pfc_frame,
+                           str(pfc_cnt),
+                           wt_pos,
+                           date_font_scale,
+                           date_rgb,
+                           date_font_thickness)
     return pfc_frame
 
 
 def flip_image(fi_frame, hflip=False, vflip=False):
     if hflip and not vflip:
         fi_frame = cv2.flip(fi_frame, 0)
-        timings_csv.log_point('Rotate Frame')
+        profiler.point(ROTATE_FRAME)
     elif vflip and not hflip:
         fi_frame = cv2.flip(fi_frame, 1)
-        timings_csv.log_point('Rotate Frame')
+        profiler.point(ROTATE_FRAME)
     elif vflip and hflip:
         fi_frame = cv2.flip(fi_frame, -1)
-        timings_csv.log_point('Rotate Frame')
+        profiler.point(ROTATE_FRAME)
     return fi_frame
 
 
+def get_date_text():
+    """v3.42 Return the date and time text, it is only formatted when the second changes."""
+    global date_text, date_second
+    gdt_now = time.time()
+    if not int(gdt_now) == date_second:
+        date_second = int(gdt_now)
+        date_text = datetime.fromtimestamp(gdt_now).strftime("%Y-%m-%d %H:%M:%S")
+    return date_text
+
+
 def put_date(pd_frame):
     """Write data and time on the video"""
     """todo look a font."""
-    pd_now = datetime.now()
-    pd_text = pd_now.strftime("%Y-%m-%d %H:%M:%S")
+    pd_text = get_date_text()
     # wt_font = cv2.FONT_HERSHEY_SIMPLEX
-    pd_size, _ = cv2.getTextSize(pd_text, font, date_font_scale, date_font_thickness)
+    pd_size = text_sprites.get_text_size(pd_text, date_font_scale, date_font_thickness)
     boarder = 5
     line_height = pd_size[1]
     line_length = pd_size[0]
@@ -975,14 +963,12 @@ def put_date(pd_frame):
     else:
         pd_pos = lores_width - line_length - boarder, lores_height - line_height - boarder
 
-    cv2.putText(pd_frame,
-                pd_text,
-                pd_pos,
-                font,
-                date_font_scale,
-                date_rgb,
-                date_font_thickness,
-                cv2.LINE_AA)
+    text_sprites.put_text(pd_frame,
+                          pd_text,
+                          pd_pos,
+                          date_font_scale,
+                          date_rgb,
+                          date_font_thickness)
     return pd_frame
 
 
@@ -990,10 +976,8 @@ def put_temp(pt_frame):
     if not temp_position == 'none':
         boarder = 5
         pt_temp_text = temp_log.get_temp_c()
-        pt_temp_size, _ = cv2.getTextSize(pt_temp_text, font, temp_font_scale, temp_font_thickness)
-        pt_now = datetime.now()
-        pt_date = pt_now.strftime("%Y-%m-%d %H:%M:%S")
-        pt_date_size, _ = cv2.getTextSize(pt_date, font, date_font_scale, date_font_thickness)
+        pt_temp_size = text_sprites.get_text_size(pt_temp_text, temp_font_scale, temp_font_thickness)
+        pt_date_size = text_sprites.get_text_size(get_date_text(), date_font_scale, date_font_thickness)
         date_height = pt_date_size[1]
         temp_height = pt_temp_size[1]
         temp_length = pt_temp_size[0]
@@ -1002,33 +986,28 @@ def put_temp(pt_frame):
         else:
             pt_pos = lores_width - temp_length - boarder, lores_height - temp_height - date_height - boarder
 
-        cv2.putText(pt_frame,
-                    pt_temp_text,
-                    pt_pos,
-                    font,
-                    temp_font_scale,
-                    temp_rgb,
-                    temp_font_thickness,
-                    cv2.LINE_AA)
+        text_sprites.put_text(pt_frame,
+                              pt_temp_text,
+                              pt_pos,
+                              temp_font_scale,
+                              temp_rgb,
+                              temp_font_thickness)
     return pt_frame
 
 
 def put_text(pt_frame, pt_text, pt_color):
     position = (5, 20)  # indent and line
-    pt_font = cv2.FONT_HERSHEY_SIMPLEX
-    line_type = cv2.LINE_AA
-    text_size, _ = cv2.getTextSize(pt_text, pt_font, statistics_font_scale, statistics_font_thickness)
+    text_size = text_sprites.get_text_size(pt_text, statistics_font_scale, statistics_font_thickness)
     line_height = text_size[1] + 5
     pt_x, y0 = position
     for i, line in enumerate(pt_text.split("\n")):
         pt_y = y0 + i * line_height
-        cv2.putText(pt_frame,
-                    line,
-                    (pt_x, pt_y), pt_font,
-                    statistics_font_scale,
-                    pt_color,
-                    statistics_font_thickness,
-                    line_type)
+        text_sprites.put_text(pt_frame,
+                              line,
+                              (pt_x, pt_y),
+                              statistics_font_scale,
+                              pt_color,
+                              statistics_font_thickness)
     return pt_frame
 
 
@@ -1051,23 +1030,34 @@ Pre Movement Frames: {pre_frames} Post: {post_frames}'
     return put_text(ps_frame, ps_stats, statistics_rgb)
 
 
-def write_jpg(wj_frame):
+def write_image(wi_path, wi_frame):
+    """v3.62 cv2.imwrite returns False rather than raising, raise so the job queue retries and counts it."""
+    if not cv2.imwrite(wi_path, wi_frame):
+        raise IOError(f'Unable to write {wi_path}')
+
+
+def write_jpg(wj_frame, wj_box=None):
     jpg_path = mp4.get_pathname().replace('mp4', 'jpg')
+    # v3.50 The frame may still be held by the buffer, draw on a copy.
+    wj_frame = np.copy(wj_frame)
+    # Draw a box around the area of movement of the JPG.
+    if wj_box:
+        wj_frame = add_box(wj_frame, wj_box[0], wj_box[1], box_rgb, box_thickness, box_font_size)
     if statistics_jpg:
         wj_frame = add_statistics(wj_frame)
     if draw_jpg_graph:
         print(f'jpg shape is {np.shape(wj_frame)}')
         _roi = graph.get_roi(wj_frame)
-        print(f'ROI: {np.shape(_roi)} get graph shape {np.shape(graph.get_graph())}')
-        _roi[:] = graph.get_graph()
+        print(f'ROI: {np.shape(_roi)} get graph shape {np.shape(graph.graph)}')
+        graph.draw(_roi)
 
     # Draw roi on mp4 file.
-    if display_roi_jpg and mask_path:
-        wj_frame = draw_roi(mask_img, wj_frame, display_roi_rgb,
-                            display_roi_thickness, display_roi_font_size)
+    if display_roi_jpg and roi_overlay:
+        wj_frame = roi_overlay.draw(wj_frame)
 
     print('JPEG Path: {}'.format(jpg_path))
-    cv2.imwrite(jpg_path, wj_frame)
+    # v3.48 The frame is not changed once it is handed to the job queue.
+    jobs.submit('Write JPEG', write_image, jpg_path, wj_frame)
 
 
 def write_timelapse_jpg(wtl_frame):
@@ -1079,7 +1069,7 @@ def write_timelapse_jpg(wtl_frame):
     print('JPEG Path: {}'.format(timelapse_jpg))
     if temp_position:
         wtl_frame = put_temp(wtl_frame)
-    cv2.imwrite(timelapse_jpg, wtl_frame)
+    jobs.submit('Write Timelapse', write_image, timelapse_jpg, np.copy(wtl_frame))
 
 
 def write_yolo_jpg(wyl_frame):
@@ -1088,29 +1078,41 @@ def write_yolo_jpg(wyl_frame):
         os.mkdir(yolo_path)
     yolo_jpg = os.path.join(yolo_path, mp4.get_filename().replace('mp4', 'jpg'))
     print('JPEG Path: {}'.format(yolo_jpg))
-    cv2.imwrite(yolo_jpg, wyl_frame)
+    jobs.submit('Write YOLO', write_image, yolo_jpg, wyl_frame)
 
 
 def run_cmd(rc_cmd):
     subprocess.call(rc_cmd, shell=True, executable='/bin/bash')
 
 
+def mp4_closed(mc_filename):
+    """v3.46 Return the function run by the encoder thread once the mp4 file is complete."""
+    def on_closed():
+        log.info(f'Closed {mc_filename} Encoder: {mp4.get_stats()}')
+        # Run the command to copy over the mp4 file.
+        if not command == "None":
+            cmd = command.replace('<MP4>', mc_filename)
+            log.info('Command after replace is:{}'.format(cmd))
+            # v3.48 Run on the job queue to keep the encoder free for the next file.
+            jobs.submit('Command', run_cmd, cmd)
+    return on_closed
+
+
 def get_logger():
     logger = logging.getLogger('motion')
-    if not os.name == 'nt':
+    if not os.name == 'nt' and JournalHandler:
         logger.addHandler(JournalHandler())
         logger.setLevel(logging.INFO)
     return logger
 
 
 def add_box(ab_frame, ab_area, ab_label, ab_color, ab_thickness=1, ab_font_size=1.0):
-    # ab_x = ab_area[0]
-    # ab_y = ab_area[1]
-    # ab_w = ab_area[2]
-    # ab_h = ab_area[3]
-    cv2.rectangle(ab_frame, (x, y), (x + w, y + h), ab_color, 1)
-    cv2.putText(ab_frame, ab_label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, ab_font_size, ab_color, ab_thickness)
-    # ab_x = ab_y = ab_w = ab_h = None
+    # v3.50 Use the area passed rather than the x, y, w and h of the current frame as the jpg box is
+    # drawn when the jpg is written.
+    ab_x, ab_y, ab_w, ab_h = (int(ab_v) for ab_v in ab_area)
+    cv2.rectangle(ab_frame, (ab_x, ab_y), (ab_x + ab_w, ab_y + ab_h), ab_color, 1)
+    cv2.putText(ab_frame, ab_label, (ab_x, ab_y - 10), cv2.FONT_HERSHEY_SIMPLEX, ab_font_size, ab_color,
+                ab_thickness)
     return ab_frame
 
 
@@ -1126,26 +1128,6 @@ def next_index(_index, _buffer_size):
     return _index
 
 
-def get_centre(gc_contours):
-    cx = cy = None
-    for i in gc_contours:
-        gc_moment = cv2.moments(i)
-        if gc_moment['m00'] != 0:
-            # cx = int(gc_moment['m10'] / gc_moment['m00'])
-            cx = int(gc_moment['m10'] / gc_moment['m00'])
-            cy = int(gc_moment['m01'] / gc_moment['m00'])
-    return cx, cy
-
-
-def draw_roi(draw_roi_mask, image, rgb, thickness, draw_roi_size):
-    mask_edges = cv2.Canny(draw_roi_mask, 10, 100)
-    draw_roi_contours, hierarchy = cv2.findContours(mask_edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
-    cx, cy = get_centre(draw_roi_contours)
-    cv2.putText(image, 'ROI', (cx, cy), cv2.FONT_HERSHEY_SIMPLEX, draw_roi_size, rgb, thickness, cv2.LINE_AA)
-    cv2.drawContours(image, draw_roi_contours, -1, rgb, thickness)
-    return image
-
-
 def next_movement_index(nmi_index, nmi_buffer_size):
     nmi_index += 1
     if nmi_index >= nmi_buffer_size:
@@ -1170,16 +1152,76 @@ def zoom_img(img, zoom_img_factor=1.5):
     return cv2.resize(img_cropped, None, fx=zoom_img_factor, fy=zoom_img_factor, interpolation=cv2.INTER_CUBIC)
 
 
+def split_lores(sl_array):
+    """Split a lores capture into a BGR frame for recording and a grey frame for detection.
+    A YUV420 array holds the Y plane followed by the U and V planes so the Y plane is the grey image."""
+    if sl_array.ndim == 2:
+        sl_grey = sl_array[:lores_height, :lores_width]
+        sl_frame = cv2.cvtColor(sl_array, cv2.COLOR_YUV2BGR_I420)[:, :lores_width]
+    else:
+        sl_frame = sl_array
+        sl_grey = cv2.cvtColor(sl_array, cv2.COLOR_BGR2GRAY)
+    return sl_frame, sl_grey
+
+
+def set_scaler_crop(ssc_zoom_factor):
+    """Zoom by cropping in the ISP so both the main and lores streams are zoomed.
+    Returns False if the camera does not report its crop limits."""
+    try:
+        ssc_x, ssc_y, ssc_w, ssc_h = picam2.camera_properties['ScalerCropMaximum']
+    except (AttributeError, KeyError, TypeError):
+        return False
+    ssc_crop_w = int(ssc_w / ssc_zoom_factor)
+    ssc_crop_h = int(ssc_h / ssc_zoom_factor)
+    picam2.set_controls({"ScalerCrop": (ssc_x + (ssc_w - ssc_crop_w) // 2, ssc_y + (ssc_h - ssc_crop_h) // 2,
+                                        ssc_crop_w, ssc_crop_h)})
+    return True
+
+
+def keep_frame(kf_frame, kf_drawn=None):
+    """
+    v3.50 Return a frame that can be held on to, it is only copied when it is part of the captured
+    frame as the capture thread writes the next frames into the same slots.
+    v3.59 Also copied when it is part of kf_drawn, such as the buffered frame which is drawn on.
+    """
+    if kf_drawn is not None and np.may_share_memory(kf_frame, kf_drawn):
+        return np.copy(kf_frame)
+    if frame_capture and (np.may_share_memory(kf_frame, captured_frame) or
+                          (captured_main is not None and np.may_share_memory(kf_frame, captured_main))):
+        return np.copy(kf_frame)
+    return kf_frame
+
+
+def capture_frame():
+    """
+    v3.58 Capture the next frame of the stream used by the loop. With lores_stream and a yolo snapshot
+    the main frame is captured from the same request, returns (lores, main).
+    """
+    if capture_main:
+        return source.capture_arrays(['lores', 'main'])
+    return source.capture_array(capture_stream)
+
+
+def get_main_frame():
+    """Return the main frame, when using the lores stream it is the main array of the same request."""
+    global main_frame
+    if main_frame is None:
+        main_frame = captured_main
+        if software_zoom:
+            main_frame = zoom_img(main_frame, zoom_factor)
+    return main_frame
+
+
 def resize_img(rs_image, rs_size):
     rs_current_height = rs_image.shape[0]
     rs_current_width = rs_image.shape[1]
     rs_new_height = rs_size[0]
     rs_new_width = rs_size[1]
     if rs_current_width > rs_new_width or rs_current_height > rs_new_height:
-        timings_csv.log_point('Resize Frame')
+        profiler.point(RESIZE_FRAME)
         return cv2.resize(rs_image, rs_size, interpolation=cv2.INTER_AREA)
     elif rs_current_width < rs_new_width or rs_current_height < rs_new_height:
-        timings_csv.log_point('Resize Frame')
+        profiler.point(RESIZE_FRAME)
         return cv2.resize(rs_image, rs_size, interpolation=cv2.INTER_LINEAR)
     else:
         return rs_image
@@ -1187,7 +1229,7 @@ def resize_img(rs_image, rs_size):
 
 def get_exposure():
     # v3.10b report tuned exposure.
-    _metadata = picam2.capture_metadata()
+    _metadata = source.capture_metadata()
     _exposure_controls = {ec: _metadata[ec] for ec in ["ExposureTime", "AnalogueGain", "ColourGains"]}
     log.info(_exposure_controls)
     return _exposure_controls
@@ -1224,6 +1266,15 @@ if __name__ == "motion":
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--debug', action='store_true', help='Debug enabled')
     parser.add_argument('-s', '--signal', type=int, default=0, help='fire sigusr at frame number')
+    parser.add_argument('-r', '--replay', default=None,
+                        help='replay an mp4 file or a directory of images instead of using the camera')
+    parser.add_argument('--fast', action='store_true', help='replay frames as fast as possible')
+    parser.add_argument('--loop', action='store_true', help='restart the replay when it ends')
+    parser.add_argument('--frames', type=int, default=0, help='stop after this number of frames')
+    parser.add_argument('--stage-timings', default=None,
+                        help='write frames per second and per stage latencies to this json file on exit')
+    parser.add_argument('--movement-series', default=None,
+                        help='write the movement level of every frame to this file for triggerBacktest.py')
 
     args = parser.parse_args()
     # get an instance of the logger object this module will use
@@ -1254,10 +1305,14 @@ if __name__ == "motion":
     box_thickness = int(mini.get_parameter('BOX', 'box_thickness', '1'))
     camera_controls = mini.get_parameter('CAMERA', 'camera_controls', 'off')
     camera_tuning_file = mini.get_parameter('CAMERA', 'camera_tuning_file', 'off')
+    capture_slots = int(mini.get_parameter('CAMERA', 'capture_slots', '4'))
+    capture_thread = mini.get_parameter('CAMERA', 'capture_thread', 'on')
     command = mini.get_parameter('OUTPUT', 'command', 'None')
     csv_output = mini.get_parameter('OUTPUT', 'csv_output', 'off')
     csv_timings = mini.get_parameter('OUTPUT', 'csv_timings', 'off')
     csv_fps_monitor = mini.get_parameter('OUTPUT', 'csv_fps_monitor', 'off')
+    csv_flush_rows = int(mini.get_parameter('OUTPUT', 'csv_flush_rows', '500'))
+    csv_flush_seconds = float(mini.get_parameter('OUTPUT', 'csv_flush_seconds', '5'))
     csv_recording_log = mini.get_parameter('OUTPUT', 'csv_recording_log', 'off')
     csv_visits_log = mini.get_parameter('OUTPUT', 'csv_visits_log', 'off')
     date_font_scale = float(mini.get_parameter('DATE', 'date_font_scale', '0.7'))
@@ -1284,18 +1339,32 @@ if __name__ == "motion":
     image_vertical_flip = bool(mini.get_parameter('CAMERA', 'image_vertical_flip', 'off'))
     image_height = int(mini.get_parameter('OUTPUT', 'image_height', '135'))
     image_width = int(mini.get_parameter('CAMERA', 'image_width', '240'))
+    lores_stream = mini.get_parameter('CAMERA', 'lores_stream', 'off')
     lores_height = int(mini.get_parameter('CAMERA', 'lores_height', '270'))
     lores_width = int(mini.get_parameter('CAMERA', 'lores_width', '480'))
     main_height = int(mini.get_parameter('CAMERA', 'main_height', '540'))
     main_width = int(mini.get_parameter('CAMERA', 'main_width', '960'))
     mask_path = mini.get_parameter('ROI', 'mask_path', 'off')
+    mask_regions = mini.get_parameter('ROI', 'mask_regions', 'off')
+    mask_min_area = int(mini.get_parameter('ROI', 'mask_min_area', '16'))
+    movement_metric = mini.get_parameter('MOTION', 'movement_metric', 'blobs')
+    tracking = mini.get_parameter('MOTION', 'tracking', 'off')
     movement_window = int(mini.get_parameter('MOTION', 'movement_window', '0'))
     movement_window_age = int(mini.get_parameter('MOTION', 'movement_window_age', '0'))
 
     output_dir = mini.get_parameter('OUTPUT', 'output_dir', 'Motion')
+    post_workers = int(mini.get_parameter('OUTPUT', 'post_workers', '2'))
     post_frames = int(mini.get_parameter('OUTPUT', 'post_frames', '1'))
     pre_frames = int(mini.get_parameter('OUTPUT', 'pre_frames', '1'))
+    pre_roll = mini.get_parameter('OUTPUT', 'pre_roll', 'off')
+    pre_roll_mb = float(mini.get_parameter('OUTPUT', 'pre_roll_mb', '256'))
+    pre_roll_quality = int(mini.get_parameter('OUTPUT', 'pre_roll_quality', '90'))
     stabilise = int(mini.get_parameter('MP4', 'stabilise', '10'))
+    encoder_queue = int(mini.get_parameter('MP4', 'encoder_queue', '60'))
+    encoder = mini.get_parameter('MP4', 'encoder', 'opencv')
+    encoder_codec = mini.get_parameter('MP4', 'codec', None)
+    encoder_preset = mini.get_parameter('MP4', 'preset', 'veryfast')
+    encoder_crf = mini.get_parameter('MP4', 'crf', '23')
     statistics = mini.get_parameter('STATISTICS', 'statistics', 'off')
     statistics_font_scale = float(mini.get_parameter('STATISTICS', 'statistics_font_scale', '0.7'))
     statistics_font_thickness = int(mini.get_parameter('STATISTICS', 'statistics_font_thickness', '1'))
@@ -1318,10 +1387,28 @@ if __name__ == "motion":
     trigger_point_frames = int(mini.get_parameter('MOTION', 'trigger_point_frames', 1))
     yolo_detection = bool(mini.get_parameter('OUTPUT', 'yolo_detection', 'off'))
     yolo_output = bool(mini.get_parameter('OUTPUT', 'yolo_output', 'off'))
+    yolo_weights = mini.get_parameter('YOLO', 'weights', 'Motion/props/yolov3.weights')
+    yolo_cfg = mini.get_parameter('YOLO', 'cfg', 'Motion/props/yolov3.cfg')
+    yolo_names = mini.get_parameter('YOLO', 'names', 'Motion/props/coco.names')
+    yolo_confidence = float(mini.get_parameter('YOLO', 'confidence', '0.5'))
+    yolo_input_size = int(mini.get_parameter('YOLO', 'input_size', '416'))
+    yolo_queue_size = int(mini.get_parameter('YOLO', 'queue_size', '4'))
+    yolo_nms_threshold = float(mini.get_parameter('YOLO', 'nms_threshold', '0.4'))
+    yolo_draw_objects = mini.get_parameter('YOLO', 'draw_objects', 'off')
+    yolo_detector = mini.get_parameter('YOLO', 'detector', 'yolo')
+    yolo_cascade = mini.get_parameter('YOLO', 'cascade', 'Motion/props/haarcascade_frontalface_alt2.xml')
+    yolo_crop_to_motion = mini.get_parameter('YOLO', 'crop_to_motion', 'on')
+    yolo_crop_padding = float(mini.get_parameter('YOLO', 'crop_padding', '0.5'))
+    yolo_crop_min = int(mini.get_parameter('YOLO', 'crop_min', '128'))
+    # v3.51 Keep the peak main frame for the yolo jpg or for detection.
+    yolo_frames = yolo_output or yolo_detection
     zoom_factor = float(mini.get_parameter('CAMERA', 'zoom_factor', 0))
 
+    # v3.54 The csv logs are written by one shared sink.
+    telemetry = TelemetrySink(csv_flush_seconds, csv_flush_rows).start()
+
     # Instantiate movementCSV file writing.
-    movement_csv = MovementCSV()
+    movement_csv = MovementCSV(sink=telemetry)
     if csv_output:
         movement_csv.update_parameters(trigger_point, trigger_point_base, trigger_point_frames, subtraction_threshold,
                                        subtraction_history, movement_window, movement_window_age)
@@ -1330,23 +1417,32 @@ if __name__ == "motion":
     trigger_csv = TriggerCSV(trigger_point, trigger_point_base, trigger_point_csv_window, movement_window,
                              movement_window_age)
 
+    # v3.38 Instantiate the trigger engine which feeds the trigger CSV class.
+    trigger_engine = TriggerEngine(trigger_point, trigger_point_base, movement_window, movement_window_age,
+                                   trigger_csv)
+
     # Instantiate visits log.
     if csv_visits_log:
-        visits = VisitsCSV()
+        visits = VisitsCSV(sink=telemetry)
     else:
         visits = None
 
     # v3.20 Log recording times.
     if csv_recording_log:
-        cvs_recording_times = RecordingLogCSV()
+        cvs_recording_times = RecordingLogCSV(sink=telemetry)
 
     # Instantiate temperature data class.
-    temp_log = TempCSV()
+    temp_log = TempCSV(sink=telemetry)
 
     # Track the Frames Per Second.
-    fps_log = FPSLogCSV(image_record_fps)
+    fps_log = FPSLogCSV(image_record_fps, sink=telemetry)
     fps_log.delete()
 
+    # v3.48 Post event jobs.
+    jobs = JobQueue(post_workers, log=log, name='PostEvent')
+    if post_workers > 0:
+        jobs.start()
+
     # Read the version ini file.
     version_class = Version()
     version_num = version_class.get_version()
@@ -1358,12 +1454,31 @@ if __name__ == "motion":
     # fps = FPS()
 
     # Instantiate tracker.
-    tracker = MovementTracker()
+    tracker = MovementTracker() if tracking else None
+    event_start_frame = 0  # v3.45 First frame of the event including the pre frames.
+
+    # Instantiate the profiler, before the mask is loaded as resizing it logs a timing.
+    # v3.55 It is always on, SIGUSR2 dumps the timings.
+    profiler = StageProfiler()
+    loop_cnt = 0
+
+    # v3.39 Movement level series for back testing the trigger parameters.
+    movement_series = None
+    if args.movement_series:
+        movement_series = open(args.movement_series, 'w')
+        movement_series.write('Movement Level\n')
 
     # Get mask image.
     mask_img = False
+    mask_boxes = None  # v3.40 Bounding boxes of the mask, None without a mask.
     if mask_path and os.path.exists(mask_path):
-        mask_img = load_mask(mask_path)
+        mask_img, mask_boxes = load_mask(mask_path, mask_regions, mask_min_area)
+        log.info(f'Mask regions: {mask_boxes}')
+
+    # v3.41 Render the ROI overlay once.
+    roi_overlay = None
+    if mask_boxes is not None and (display_roi or display_roi_jpg):
+        roi_overlay = RoiOverlay(mask_img, display_roi_rgb, display_roi_thickness, display_roi_font_size)
 
     # Initialise Variables
     size = (lores_width, lores_height)
@@ -1375,15 +1490,25 @@ if __name__ == "motion":
     movement_peak = 0  # Monitor the highest level of movement.
     movement_peak_frame = 0  # Log the frame number where peak movement occurs.
     mean_average_movement = 0  # The average amount of movement than caused a trigger record.
-    object_detector = cv2.createBackgroundSubtractorMOG2(history=subtraction_history,
-                                                         varThreshold=subtraction_threshold,
-                                                         detectShadows=True)
+    movement_metrics = MovementMetrics(movement_metric)
+    # v3.40 One background subtractor for each mask region.
+    object_detectors = [create_object_detector() for _ in (mask_boxes or [None])]
     exposure_controls = None
     focus_controls = None
     consecutive_movement_frame_cnt = 0  # Used by motion detection.
     log.info('Initialise MP4 output')
 
-    if camera_tuning_file and not os.name == 'nt':
+    capture_stream = 'lores' if lores_stream else 'main'
+    capture_main = lores_stream and yolo_frames
+    captured_main = None
+    if args.replay:
+        # v3.36 Replay recorded footage in place of the camera.
+        log.info(f'Replaying {args.replay}')
+        picam2 = None
+        source = ReplaySource(args.replay, (main_width, main_height), (lores_width, lores_height),
+                              fps=image_record_fps, realtime=not args.fast, loop=args.loop,
+                              stream=capture_stream)
+    elif camera_tuning_file and not os.name == 'nt':
         log.info(f'Using tuning file {camera_tuning_file}')
         tuning = Picamera2.load_tuning_file(camera_tuning_file)
         algo = Picamera2.find_tuning_algo(tuning, "rpi.agc")
@@ -1405,62 +1530,106 @@ if __name__ == "motion":
         log.info('No tuning file specified in the motion.ini file.')
         picam2 = Picamera2()
 
-    video_config = picam2.create_video_configuration(
-        main={"size": (main_width, main_height), "format": "RGB888"})
+    if picam2:
+        # v3.35 Let the ISP scale the lores stream used for detection.
+        if lores_stream:
+            video_config = picam2.create_video_configuration(
+                main={"size": (main_width, main_height), "format": "RGB888"},
+                lores={"size": (lores_width, lores_height), "format": "YUV420"})
+        else:
+            video_config = picam2.create_video_configuration(
+                main={"size": (main_width, main_height), "format": "RGB888"})
 
-    picam2.configure(video_config)
-    picam2.set_controls({"FrameRate": image_record_fps})
-    log.info(f'Frame rate set to {image_record_fps}.scp')
+        picam2.configure(video_config)
+        picam2.set_controls({"FrameRate": image_record_fps})
+        log.info(f'Frame rate set to {image_record_fps}.scp')
+        source = CameraSource(picam2)
 
-    picam2.start()
-    time.sleep(2)
+    # Zoom in the ISP when using the lores stream otherwise zoom each frame.
+    software_zoom = not zoom_factor == 0
+    if lores_stream and software_zoom and set_scaler_crop(zoom_factor):
+        software_zoom = False
+        log.info(f'Zoom factor {zoom_factor} set using ScalerCrop.')
+
+    source.start()
+    if picam2:
+        time.sleep(2)
 
     # v3.10b report tuned exposure.
     exposure_controls = get_exposure()
 
+    # v3.34 Capture frames on their own thread.
+    if capture_thread:
+        frame_capture = FrameCapture(capture_frame, capture_slots,
+                                     drop=not (args.replay and args.fast)).start()
+        log.info(f'Capture thread started with {capture_slots} slots.')
+    else:
+        frame_capture = None
+
     # Initialise video buffer_frame.
+    # v3.49 With a compressed pre-roll the buffer delays the frames by one frame only so that the
+    # boxes can still be drawn ahead of writing, the frames leaving it are held by pre_roll_ring.
+    if pre_roll:
+        buffer_frames = 1
+        pre_roll_ring = PreRoll(pre_frames - buffer_frames, pre_roll_mb, pre_roll, pre_roll_quality).start()
+    else:
+        pre_roll_ring = None
+        buffer_frames = pre_frames
+    # Frames still to write once movement continues. The recording ends pre_frames less than
+    # post_frames after the movement as it always has with the buffer delaying pre_frames.
+    post_required = max(post_frames + 1 - pre_frames + buffer_frames, 1)
+    pre_roll_written = 0
     index = 0
-    buffer = np.zeros((pre_frames, lores_height, lores_width, 3), np.dtype('uint8'))
+    # v3.50 The buffer holds references to the frames rather than copies.
+    buffer = [np.zeros((lores_height, lores_width, 3), np.dtype('uint8')) for _ in range(buffer_frames)]
     buffered_frame = np.zeros((1, lores_height, lores_width, 3), np.dtype('uint8'))
-    buffered_bounding_rect = np.zeros((pre_frames, 4), np.dtype('uint16'))
-    buffered_movement = np.array([])
+    buffered_bounding_rect = np.zeros((buffer_frames, 4), np.dtype('uint16'))
     jpg_frame = np.zeros((1, lores_height, lores_width, 3), np.dtype('uint8'))
+    jpg_box = None  # Box and text drawn on the jpg when it is written.
     timelapse_frame = np.zeros((1, lores_height, lores_width, 3), np.dtype('uint8'))
     yolo_frame = np.zeros((1, main_height, main_width, 3), np.dtype('uint8'))
     yolo_peak_movement_frame = np.zeros((1, main_height, main_width, 3), np.dtype('uint8'))
+    yolo_peak_box = None  # Box around the movement of the yolo frame.
     log.info('Camera started')
 
     # Instantiate mp4 output.
-    mp4 = MP4(output_dir, size, image_playback_fps)
+    if not is_available(encoder):
+        log.warning(f'MP4 encoder {encoder} is not available, using opencv.')
+        encoder, encoder_codec = 'opencv', None
+    mp4 = MP4(output_dir, size, image_playback_fps, encoder_queue, encoder, encoder_codec, encoder_preset, encoder_crf)
 
+    # v3.51 The network is loaded by the worker process when the first frame arrives.
     if yolo_detection:
-        yolo = Yolo()
+        yolo = YoloWorker(yolo_weights, yolo_cfg, yolo_names, yolo_confidence, yolo_input_size, yolo_queue_size,
+                          os.path.join(output_dir, 'yolo'), yolo_nms_threshold, yolo_draw_objects,
+                          yolo_detector, yolo_cascade, yolo_crop_padding, yolo_crop_min).start()
+        log.info('YOLO worker started.')
+    else:
+        yolo = None
 
     log.info('PID: {}'.format(os.getpid()))
     # Read images and process them.
     jpg_contour = 0
     movement_level = 0  # Movement level.
     movement_flag = False  # Set to true is movement is detected.
-    movement_triggered = False  # Set only when processing the frame that triggered movement.
-    movement_ended = False  # Set when movement ends.
     movement_frame_cnt = 0  # Number of frames since movement was detected.
     movement_total = 0  # Total contour count for consecutive frames.
     recording_flag = False  # True when the Graph indicates recording is in progress.
     frames_required = 0
     contour = (0, 0, 0, 0)
-    contours = None
+    metrics = None
     resize = False
     stabilised = False
     signal_frame_cnt = 0
     average_window_cnt = 0  # Used to ensure all stored frame values are populated.
     date_size = None  # Stores the size of the data on the output.
     font = cv2.FONT_HERSHEY_SIMPLEX
+    text_sprites = TextSprites(font)  # v3.42 Rendered overlay text.
+    date_text = ''
+    date_second = None
     debug_gc_counter = 0
     movement_triggered_by_signal = False
 
-    # Instantiate timings.
-    timings_csv = TimingsCSV(enabled=csv_timings, grace=subtraction_history)
-
     # =========================================
     # Main loop.
     # =========================================
@@ -1471,22 +1640,56 @@ if __name__ == "motion":
             if debug_gc_counter < 1:
                 gc.set_debug(False)
 
-        # Read Images
-        timings_csv.log_point('Start Loop', start=True)
-        main_frame = picam2.capture_array()
-        timings_csv.log_point('Read Frame')
+        # v3.37 Stop after a set number of frames.
+        loop_cnt += 1
+        if 0 < args.frames < loop_cnt:
+            break
 
-        if not zoom_factor == 0:
-            main_frame = zoom_img(main_frame, zoom_factor)
-            timings_csv.log_point(f'Zoom factor {zoom_factor}')
+        # Read Images
+        profiler.point(START_LOOP)
+        if frame_capture:
+            try:
+                captured_frame = frame_capture.read()
+            except TimeoutError as e:
+                # v3.65 Keep waiting for the camera, a stop signal still closes down normally.
+                log.warning(f'Capture: {e} {frame_capture.get_stats()}')
+                continue
+            if captured_frame is None:
+                log.info('Capture thread has stopped.')
+                break
+        else:
+            captured_frame = capture_frame()
+            if captured_frame is None:
+                log.info('Frame source has finished.')
+                break
+        if capture_main:
+            captured_frame, captured_main = captured_frame
+        profiler.point(READ_FRAME)
+
+        if lores_stream:
+            # v3.58 The main frame, from the same request, is only zoomed when it is needed.
+            main_frame = None
+            frame, detect_frame = split_lores(captured_frame)
+            if software_zoom:
+                frame = resize_img(zoom_img(frame, zoom_factor), (lores_width, lores_height))
+                detect_frame = resize_img(zoom_img(detect_frame, zoom_factor), (lores_width, lores_height))
+                profiler.point(ZOOM_FRAME)
+            detect_frame = flip_image(detect_frame, image_horizontal_flip, image_vertical_flip)
+        else:
+            main_frame = captured_frame
+            if software_zoom:
+                main_frame = zoom_img(main_frame, zoom_factor)
+                profiler.point(ZOOM_FRAME)
 
-        # Resize the frame.
-        frame = resize_img(main_frame, (lores_width, lores_height))
-        # timings_csv.log_point('Resize Frame')
+            # Resize the frame.
+            frame = resize_img(main_frame, (lores_width, lores_height))
+            # profiler.point(RESIZE_FRAME)
 
         # Rotate the image if needed.
         frame = flip_image(frame, image_horizontal_flip, image_vertical_flip)
-        # timings_csv.log_point('Rotate Frame')
+        # profiler.point(ROTATE_FRAME)
+        if not lores_stream:
+            detect_frame = frame
 
         # Log Frames per second.
         # redundant now fps()
@@ -1496,57 +1699,54 @@ if __name__ == "motion":
             signal_frame_cnt += 1
             print(f'SigFrame: {signal_frame} Signal frame count: {signal_frame_cnt}')
 
-        # Apply the mask.
-        if mask_path:
-            roi = cv2.bitwise_and(frame, frame, mask=mask_img)
-            timings_csv.log_point('Apply Mask')
-        else:
-            roi = frame
-
-        # Detect movement.
-        contours = detect_movement(roi)
-        timings_csv.log_point('Detect movement')
+        # Apply the mask and detect movement.
+        metrics = detect_movement(detect_frame)
+        if tracker:
+            tracker.update(metrics.centroids, loop_cnt)
+        profiler.point(DETECT_MOVEMENT)
 
         # Add date.
         if date_position == 'top' or date_position == 'bottom':
             frame = put_date(frame)
-            timings_csv.log_point('Add date')
+            profiler.point(ADD_DATE)
 
         # Save the frame to the buffer_frame.
-        index = next_index(index, pre_frames)
-        buffered_frame = np.copy(buffer[index])
+        # v3.50 Swap references, the frame leaving the buffer is drawn on and written. The jpg
+        # frame is copied if it is the frame leaving so it does not pick up the mp4 overlays.
+        index = next_index(index, buffer_frames)
+        frame = keep_frame(frame)
+        buffered_frame = buffer[index]
         buffer[index] = frame
+        if buffered_frame is jpg_frame:
+            jpg_frame = np.copy(jpg_frame)
 
         # Stabilise the camera
         if not stabilised:
-            jpg_frame = np.copy(buffer[index])
-            yolo_peak_movement_frame = np.copy(main_frame)
+            jpg_frame = buffer[index]
+            jpg_box = None
+            if yolo_frames:
+                yolo_peak_movement_frame = keep_frame(get_main_frame(), buffer[index])
+                yolo_peak_box = None
             stabilisation_cnt += 1
             if stabilisation_cnt < stabilise + pre_frames:
                 continue
             else:
                 stabilised = True
+                # v3.55 Leave out the timings while the background model settles.
+                profiler.reset()
 
         # Monitor the fps.
         if csv_fps_monitor:
             fps_log.monitor_fps()
 
-        # find the biggest contour (c) by the area and save it.
-        if len(contours) > 1:
-            # Find the largest area of movement.
-            c = max(contours, key=cv2.contourArea)
-            x, y, w, h = cv2.boundingRect(c)
+        # v3.44 The movement level from the selected metric and the box around the largest blob.
+        movement_level = metrics.get_level()
+        if movement_level:
+            x, y, w, h = metrics.get_largest_box()
             buffered_bounding_rect[index] = (x, y, w, h)
-            # Append the values to the array then drop the obsolete values.
-            movement_level = len(contours)
-            buffered_movement = np.append(buffered_movement, movement_level)
         else:
-            buffered_movement = np.append(buffered_movement, 0)
             buffered_bounding_rect[index] = (0, 0, 0, 0)
-            c = x = y = w = h = None
-
-        # Trim the movement buffer.
-        buffered_movement = buffered_movement[((movement_window + movement_window_age) + 1) * -1::]
+            x = y = w = h = None
 
         # Display the live feed.
         if display:
@@ -1558,51 +1758,15 @@ if __name__ == "motion":
             display_frame = resize_img(buffer[index], (display_image_width, display_image_height))
             cv2.imshow('Live Data', display_frame)
 
-        # Check for movement. Compare the mean movement level with this movement level.
+        # Check for movement. Compare the mean movement level with the aged mean movement level.
         # Do this after the movement buffer is complete.
-        if movement_window_age > 0:
-            # Get the average movement over the movement window using movement_window_age.
-            mean_movement = round(np.mean(buffered_movement[:(movement_window + movement_window_age + 1)]))
-            mean_trigger_point = mean_movement + trigger_point
-            mean_trigger_point_base = mean_movement + trigger_point_base
-
-            # Ensure the buffered_movement buffer is fully populated.
-            if buffered_movement.size < movement_window + movement_window_age:
-                continue
+        if movement_series:
+            movement_series.write(f'{movement_level}\n')
+        if not trigger_engine.update(movement_level):
+            continue
+        movement_flag = trigger_engine.movement_flag
 
-            old_mean_movement = round(
-                np.mean(buffered_movement[-(movement_window + movement_window_age):-(movement_window_age - 1)]))
-            old_mean_trigger_point_base = old_mean_movement + trigger_point_base
-            old_mean_trigger_point = old_mean_movement + trigger_point
-
-            trigger_csv.log_movement(old_mean_trigger_point, old_mean_trigger_point_base, mean_movement)
-            if movement_flag:
-                movement_triggered = False
-                movement_ended = True
-                if mean_movement < old_mean_trigger_point_base:
-                    movement_flag = False
-                    movement_ended = True
-            else:
-                # When movement_flag is not set.
-                if mean_movement > old_mean_trigger_point:
-                    movement_flag = True
-                    movement_triggered = True
-                    trigger_csv.movement_triggered()
-        else:
-            trigger_csv.log_movement(trigger_point, trigger_point_base, movement_level)
-            if movement_flag:
-                movement_triggered = False
-                movement_ended = True
-                if movement_level < trigger_point_base:
-                    movement_flag = False
-                    movement_ended = True
-            else:
-                if movement_level > trigger_point:
-                    movement_flag = True
-                    movement_triggered = True
-                    trigger_csv.movement_triggered()
-
-        timings_csv.log_point('Check for movement complete')
+        profiler.point(CHECK_MOVEMENT)
 
         # Send the motion level to the CSV class.
         if csv_output:
@@ -1610,8 +1774,11 @@ if __name__ == "motion":
 
         # Stabilise the camera
         if not stabilised:
-            jpg_frame = np.copy(buffer[index])
-            yolo_peak_movement_frame = np.copy(main_frame)
+            jpg_frame = buffer[index]
+            jpg_box = None
+            if yolo_frames:
+                yolo_peak_movement_frame = keep_frame(get_main_frame(), buffer[index])
+                yolo_peak_box = None
             stabilisation_cnt += 1
             if stabilisation_cnt < stabilise + pre_frames:
                 continue
@@ -1623,15 +1790,15 @@ if __name__ == "motion":
         if motion.sig_usr1 or (0 < signal_frame == signal_frame_cnt):
             log.info('Manual SIGUSR1 detected.')
             signal_frame = 0
+            trigger_engine.trigger()
             movement_flag = True
-            movement_triggered = True
-            movement_trigger_csv = True
-            movement_trigger_csv_counter = movement_window_age
-            jpg_frame = np.copy(buffer[index])
-            yolo_peak_movement_frame = np.copy(main_frame)
+            jpg_frame = buffer[index]
+            jpg_box = None
+            if yolo_frames:
+                yolo_peak_movement_frame = keep_frame(get_main_frame(), buffer[index])
+                yolo_peak_box = None
             motion.sig_usr1 = False
             movement_triggered_by_signal = True
-            trigger_csv.movement_triggered()
 
             if csv_output:
                 movement_csv.motion_write(sighup=True)
@@ -1639,10 +1806,9 @@ if __name__ == "motion":
         # If SIGUSR2 trigger a timings output.
         if output.sig_usr2:
             log.info('Manual SIGUSR2 detected.')
-            # PMG timings_csv = timingsCSV(enabled=csv_timings)
-            timings_csv.delete()
-            timings_csv.enabled = True
-            timings_csv.record_cnt = 0
+            # v3.55 Dump the timings recorded so far.
+            profiler.dump('timings.csv')
+            Path('timings.sig').touch()
             output.sig_usr2 = False
             with open('memory.txt', 'a') as gc_file:
                 print(f'Memory Usage at {datetime.now()} is {report_process_mem()}', file=gc_file)
@@ -1653,13 +1819,21 @@ if __name__ == "motion":
 
         if movement_flag:
             if mp4.is_open():
-                frames_required = post_frames + 1
+                frames_required = post_required
             else:
                 # Update the version number
                 mp4.new_filename(version_num)
                 writer = mp4.open()
-                frames_required = pre_frames + post_frames + 1
+                frames_required = buffer_frames + post_frames + 1
+                event_start_frame = loop_cnt - pre_frames
                 log.info('Opening {name}...'.format(name=mp4.get_filename()))
+
+                # v3.49 Hand the compressed pre-roll to the encoder thread to decode.
+                if pre_roll_ring:
+                    log.info(f'Pre-roll: {pre_roll_ring.get_stats()} RSS: {report_process_mem():,.1f} MB')
+                    pre_roll_frames = pre_roll_ring.take()
+                    writer.write_encoded(pre_roll_frames)
+                    pre_roll_written = len(pre_roll_frames)
                 exposure_controls = get_exposure()
 
                 # v3.20 Log recording times.
@@ -1681,51 +1855,51 @@ if __name__ == "motion":
                 recording_flag = graph.put_stop_icon()
 
         if frames_required > 0:
-            if movement_peak < int(buffered_movement[-1::]):
-                movement_peak = int(buffered_movement[-1::])
-                movement_peak_frame = frames_written + pre_frames
-                jpg_frame = np.copy(buffer[index])
+            if movement_peak < trigger_engine.level:
+                movement_peak = trigger_engine.level
+                movement_peak_frame = frames_written + buffer_frames + pre_roll_written
+                jpg_frame = buffer[index]
+                jpg_box = None
                 # Save YOLO frame.
-                if yolo_output:
-                    yolo_peak_movement_frame = np.copy(main_frame)
+                if yolo_frames:
+                    yolo_peak_movement_frame = keep_frame(get_main_frame(), buffer[index])
+                    yolo_peak_box = metrics.get_largest_box()
 
-                # Draw a box around the area of movement of the JPG.
+                # Box around the area of movement of the JPG, drawn when the jpg is written.
                 if isinstance(box_jpg, str):
                     # if not box_jpg:
                     if movement_level:
-                        c = max(contours, key=cv2.contourArea)
-                        bounding_box = cv2.boundingRect(c)
-                        box_text = box_jpg.replace('<value>', str(movement_level))
-                        jpg_frame = add_box(jpg_frame, bounding_box, box_text, box_rgb, box_thickness, box_font_size)
-                        timings_csv.log_point('Draw Movement Box on JPG')
+                        jpg_box = (metrics.get_largest_box(), box_jpg.replace('<value>', str(movement_level)))
 
             # Write Graph.
-            graph.update_frame(int(buffered_movement[-1::]))
-            timings_csv.log_point('Update Graph Frame')
+            graph.update_frame(trigger_engine.level)
+            profiler.point(UPDATE_GRAPH)
 
             # Draw graph
             if draw_graph:
                 roi = graph.get_roi(buffered_frame)  # Gets the roi of the buffered frame.
-                roi[:] = graph.get_graph()  # Add the graph
+                graph.draw(roi)  # Add the graph
 
             # Display the frame count.
             if display_frame_cnt:
                 put_frame_cnt(buffered_frame, frames_written)
 
+            # v3.50 Keep the jpg frame clean of the mp4 roi and box.
+            if jpg_frame is buffer[index] and ((display_roi and roi_overlay) or isinstance(box, str)):
+                jpg_frame = np.copy(jpg_frame)
+
             # Draw roi on mp4 file.
-            if display_roi and mask_path:
-                buffer[index] = draw_roi(mask_img, buffer[index], display_roi_rgb,
-                                         display_roi_thickness, display_roi_font_size)
+            if display_roi and roi_overlay:
+                buffer[index] = roi_overlay.draw(buffer[index])
 
             # Draw a box around the area of movement on MP4.
-            if isinstance(box, str) and buffered_movement[-1::] > 1:
-                # if not box and buffered_movement[-1::] > 1:
-                if buffered_movement[-1::]:
+            if isinstance(box, str) and trigger_engine.level > 1:
+                if trigger_engine.level:
                     x, y, w, h = buffered_bounding_rect[index]
-                    box_text = box.replace('<value>', str(buffered_movement[-1::]))
+                    box_text = box.replace('<value>', str(trigger_engine.level))
                     buffer[index] = add_box(buffer[index], (x, y, w, h),
                                             box_text, box_rgb, box_thickness, box_font_size)
-                    timings_csv.log_point('Draw Movement Box on MP4')
+                    profiler.point(DRAW_BOX)
 
             if temp_position:
                 buffered_frame = put_temp(buffered_frame)
@@ -1733,7 +1907,7 @@ if __name__ == "motion":
             frames_required -= 1
             frames_written += 1
             writer.write(buffered_frame)
-            timings_csv.log_point('Write Video Frame')
+            profiler.point(WRITE_VIDEO)
 
             if display:
                 display_buffered_frame = resize_img(buffered_frame, (display_image_width, display_image_height))
@@ -1754,45 +1928,69 @@ if __name__ == "motion":
                                  subtraction_threshold=subtraction_threshold)
 
                 writer.write(buffered_frame)
-                mp4.close()
-                timings_csv.log_point('Close Video ')
+                # v3.46 The file is finalised on the encoder thread which then runs the command.
+                mp4.close(mp4_closed(mp4.get_filename()))
+                profiler.point(CLOSE_VIDEO)
 
-                write_jpg(jpg_frame)
-                timings_csv.log_point('Write JPEG')
+                write_jpg(jpg_frame, jpg_box)
+                profiler.point(WRITE_JPEG)
 
                 # csv_path = 'Motion/testTrigger.csv'
                 csv_path = mp4.get_pathname().replace('mp4', 'csv')
-                trigger_csv.write_csv(csv_path)
+                trigger_table = trigger_csv.take_table(csv_path)
+                if trigger_table is not None:
+                    jobs.submit('Write Trigger CSV', trigger_csv.write_table, csv_path, trigger_table)
 
-                # Update the version number ini file and get the next number.
-                version_num = version_class.write_version()
+                # v3.45 Write the tracks seen during the event.
+                if tracker:
+                    tracks = tracker.get_tracks(event_start_frame)
+                    jobs.submit('Write Tracks', tracker.write_csv, mp4.get_pathname().replace('.mp4', '-tracks.csv'),
+                                tracks)
+                    log.info(f'Tracks: {len(tracks)}')
+
+                # Get the next number and update the version number ini file.
+                version_num = version_class.get_version()
+                jobs.submit('Write Version', version_class.save_version, version_num)
 
                 # v3.20 Log recording times.
                 if csv_recording_log:
                     cvs_recording_times.end_recording()
 
-                # Run the command to copy over the mp4 file.
-                if not command == "None":
-                    cmd = command.replace('<MP4>', mp4.get_filename())
-                    log.info('Command after replace is:{}'.format(cmd))
-                    run_cmd(cmd)
-
                 # Update peak movement.
                 if csv_output:
                     movement_csv.motion_write()
 
                 # Save YOLO image.
-                if yolo_output:
+                if yolo_frames:
                     yolo_peak_movement_frame = flip_image(yolo_peak_movement_frame, image_horizontal_flip,
                                                           image_vertical_flip)
+                if yolo_output:
                     write_yolo_jpg(yolo_peak_movement_frame)
-                    timings_csv.log_point('Write YOLO')
+                    profiler.point(WRITE_YOLO)
+
+                # v3.51 Queue the peak frame for detection and log the events detected so far.
+                if yolo:
+                    # v3.53 Scale the box of movement up to the main frame.
+                    yolo_box = None
+                    if yolo_crop_to_motion and yolo_peak_box:
+                        scale_x = yolo_peak_movement_frame.shape[1] / lores_width
+                        scale_y = yolo_peak_movement_frame.shape[0] / lores_height
+                        yolo_box = (int(yolo_peak_box[0] * scale_x), int(yolo_peak_box[1] * scale_y),
+                                    int(yolo_peak_box[2] * scale_x), int(yolo_peak_box[3] * scale_y))
+                    if not yolo.submit(mp4.get_filename(), yolo_peak_movement_frame, yolo_box):
+                        log.warning(f'YOLO queue full, {mp4.get_filename()} not detected.')
+                    for yolo_result in yolo.get_results():
+                        log.info(f'YOLO: {yolo_result}')
 
                 movement_triggered_by_signal = False
 
+                if frame_capture:
+                    log.info(f'Capture: {frame_capture.get_stats()}')
+
                 # Reset flags.
                 movement_peak = 0
                 frames_written = 0
+                pre_roll_written = 0
                 movement_frame_cnt = 0
 
                 main_frame = None
@@ -1809,8 +2007,15 @@ if __name__ == "motion":
                 if display:
                     cv2.destroyWindow('Recorded Data')
 
+            elif pre_roll_ring:
+                # v3.49 Compress the frame leaving the buffer, v3.64 unless it closed the mp4.
+                pre_roll_ring.push(buffered_frame)
+
     # Closing down.
-    picam2.close()
+    if frame_capture:
+        frame_capture.stop()
+        log.info(f'Capture: {frame_capture.get_stats()}')
+    source.close()
     log.info('Closing camera...')
 
     # Close windows.
@@ -1819,7 +2024,46 @@ if __name__ == "motion":
 
     if mp4.is_open():
         log.info('Close open MP4 file.')
-        mp4.close()
+        mp4.close(mp4_closed(mp4.get_filename()))
+    mp4.stop()
+    if yolo:
+        yolo.stop()
+        for yolo_result in yolo.get_results():
+            log.info(f'YOLO: {yolo_result}')
+        log.info(f'YOLO: {yolo.get_stats()}')
+    if pre_roll_ring:
+        pre_roll_ring.stop()
+        log.info(f'Pre-roll: {pre_roll_ring.get_stats()}')
+
+    # v3.48 Finish the post event jobs, including the command queued as the last mp4 closed.
+    if not jobs.drain():
+        log.warning('Post event jobs did not finish.')
+    log.info(f'Post event jobs: {jobs.get_stats()}')
+
+    # v3.55 Write the timings of the run.
+    if csv_timings:
+        profiler.dump('timings.csv')
+        Path('timings.sig').touch()
+        log.info('Timings written to timings.csv')
+
+    # v3.54 Write the last of the csv rows.
+    telemetry.close()
+    log.info(f'Telemetry: {telemetry.get_stats()}')
+
+    # v3.37 Write the stage timings.
+    if args.stage_timings:
+        profiler.write_json(args.stage_timings, Version=__version__,
+                            Capture=frame_capture.get_stats() if frame_capture else None,
+                            Encoder=mp4.get_stats(),
+                            Jobs=jobs.get_stats(),
+                            Telemetry=telemetry.get_stats(),
+                            PreRoll=pre_roll_ring.get_stats() if pre_roll_ring else None,
+                            Yolo=yolo.get_stats() if yolo else None)
+        log.info(f'Stage timings written to {args.stage_timings}')
+
+    if movement_series:
+        movement_series.close()
+        log.info(f'Movement series written to {args.movement_series}')
 
     log.info('Exit Motion.')
     sys.exit(0)
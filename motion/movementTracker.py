@@ -0,0 +1,124 @@
+"""
+Multi object tracker for the blobs of movement.
+
+Each frame the centroids of the blobs are matched to the predicted positions
+of the live tracks with a distance matrix. A blob and a track are paired when
+each is the nearest of the other within the gate distance. Tracks survive
+short gaps of max_gap frames, the state of every track is held in fixed size
+arrays so noisy scenes with hundreds of blobs stay cheap.
+
+For each event the track ids, velocities in pixels per frame and dwell time
+in frames are reported.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  write_csv takes the tracks so it can run on a post event job.
+"""
+import collections
+import csv
+import numpy as np
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.1"
+
+
+class MovementTracker:
+    """
+    Track the centroids of the blobs of movement from frame to frame.
+    """
+
+    def __init__(self, gate=25, max_gap=5, min_hits=3, max_tracks=256, history=1000):
+        self.gate = gate  # Maximum distance in pixels between a track and its blob.
+        self.max_gap = max_gap  # Frames a track can be missed before it ends.
+        self.min_hits = min_hits  # Frames a track must be seen to be reported.
+        self.max_tracks = max_tracks
+        self.ids = np.zeros(max_tracks, np.dtype('int64'))
+        self.centres = np.zeros((max_tracks, 2), np.dtype('float64'))
+        self.velocities = np.zeros((max_tracks, 2), np.dtype('float64'))
+        self.origins = np.zeros((max_tracks, 2), np.dtype('float64'))  # First centre of each track.
+        self.first_frames = np.zeros(max_tracks, np.dtype('int64'))
+        self.last_frames = np.zeros(max_tracks, np.dtype('int64'))
+        self.hits = np.zeros(max_tracks, np.dtype('int64'))
+        self.active = np.zeros(max_tracks, np.dtype('bool'))
+        self.id_count = 0
+        self.finished = collections.deque(maxlen=history)  # Summaries of the tracks that have ended.
+
+    def update(self, centroids, frame_no):
+        """Match the blob centroids of a frame to the tracks, returns the track id of each blob or -1."""
+        blob_ids = np.full(len(centroids), -1, np.dtype('int64'))
+        live = np.flatnonzero(self.active)
+        matched_blobs = np.zeros(len(centroids), np.dtype('bool'))
+        if live.size and len(centroids):
+            predicted = self.centres[live] + self.velocities[live] * (frame_no - self.last_frames[live])[:, np.newaxis]
+            # Squared distances from every blob to every track as |c|^2 + |p|^2 - 2c.p
+            distances = centroids @ predicted.T
+            distances *= -2
+            distances += np.einsum('ij,ij->i', centroids, centroids)[:, np.newaxis]
+            distances += np.einsum('ij,ij->i', predicted, predicted)
+            nearest_track = distances.argmin(axis=1)
+            nearest_blob = distances.argmin(axis=0)
+            blobs = np.arange(len(centroids))
+            mutual = (nearest_blob[nearest_track] == blobs) & (distances[blobs, nearest_track] < self.gate ** 2)
+            blobs = blobs[mutual]
+            tracks = live[nearest_track[mutual]]
+            gaps = np.maximum(frame_no - self.last_frames[tracks], 1)[:, np.newaxis]
+            velocities = (centroids[blobs] - self.centres[tracks]) / gaps
+            # Smooth the velocity once the track has one.
+            smooth = self.hits[tracks] > 1
+            velocities[smooth] = (velocities[smooth] + self.velocities[tracks[smooth]]) / 2
+            self.velocities[tracks] = velocities
+            self.centres[tracks] = centroids[blobs]
+            self.last_frames[tracks] = frame_no
+            self.hits[tracks] += 1
+            blob_ids[blobs] = self.ids[tracks]
+            matched_blobs[blobs] = True
+
+        # End the tracks missed for too long.
+        expired = live[frame_no - self.last_frames[live] > self.max_gap]
+        for track in expired[self.hits[expired] >= self.min_hits]:
+            self.finished.append(self.summarise(track))
+        self.active[expired] = False
+
+        # Start tracks for the new blobs while there is room.
+        new_blobs = np.flatnonzero(~matched_blobs)
+        free = np.flatnonzero(~self.active)[:new_blobs.size]
+        new_blobs = new_blobs[:free.size]
+        if free.size:
+            self.ids[free] = np.arange(self.id_count, self.id_count + free.size)
+            self.id_count += free.size
+            self.centres[free] = centroids[new_blobs]
+            self.origins[free] = centroids[new_blobs]
+            self.velocities[free] = 0
+            self.first_frames[free] = frame_no
+            self.last_frames[free] = frame_no
+            self.hits[free] = 1
+            self.active[free] = True
+            blob_ids[new_blobs] = self.ids[free]
+        return blob_ids
+
+    def summarise(self, track):
+        dwell = int(self.last_frames[track] - self.first_frames[track] + 1)
+        velocity = (self.centres[track] - self.origins[track]) / max(dwell - 1, 1)
+        return {'Track': int(self.ids[track]),
+                'First Frame': int(self.first_frames[track]),
+                'Last Frame': int(self.last_frames[track]),
+                'Dwell Frames': dwell,
+                'Hits': int(self.hits[track]),
+                'Velocity X': round(float(velocity[0]), 2),
+                'Velocity Y': round(float(velocity[1]), 2)}
+
+    def get_tracks(self, from_frame):
+        """Return the summaries of the tracks seen since from_frame, ended or live."""
+        tracks = [summary for summary in self.finished if summary['Last Frame'] >= from_frame]
+        live = np.flatnonzero(self.active & (self.hits >= self.min_hits) & (self.last_frames >= from_frame))
+        tracks.extend(self.summarise(track) for track in live)
+        return tracks
+
+    @staticmethod
+    def write_csv(filename, tracks):
+        """Write the tracks from get_tracks() to a csv file."""
+        if tracks:
+            with open(filename, 'w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=list(tracks[0]))
+                writer.writeheader()
+                writer.writerows(tracks)
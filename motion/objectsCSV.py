@@ -2,23 +2,24 @@ import os
 import time
 from datetime import datetime
 import csv
+from telemetrySink import get_sink
 
 """
 MovementsCSV class.
 
 Writes a CSV file containing peak movements CSV file.
+The records are written through the shared telemetry sink.
 """
 
 class ObjectsCSV:
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, sink=None):
         self.debug = debug
         self.filename = None
         self.object = None
         self.now = datetime.now()
         self.csv_file = "objects.csv"
         self.columns = ['Timestamp', 'Filename', 'Object']
-        if not os.path.isfile(self.csv_file):
-            self.create()
+        self.telemetry = (sink or get_sink()).register(self.csv_file, self.columns)
 
     def create(self):
         if self.debug:
@@ -36,14 +37,10 @@ class ObjectsCSV:
     def write(self, filename, item):
         if self.debug:
             print('CSV:write')
-        if not os.path.isfile(self.csv_file):
-            self.create()
-        with open(self.csv_file, 'a', newline='') as file:
-            _writer = csv.DictWriter(file, fieldnames=self.columns)
-            timestamp = self.now.strftime("%Y-%m-%d %H:%M")
-            return _writer.writerow({"Timestamp": timestamp,
-                                     'Filename': filename,
-                                     'Object': item})
+        timestamp = self.now.strftime("%Y-%m-%d %H:%M")
+        self.telemetry.write({"Timestamp": timestamp,
+                              'Filename': filename,
+                              'Object': item})
 
 
 # if os.path.exists('objects.csv'):
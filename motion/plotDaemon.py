@@ -0,0 +1,247 @@
+"""
+Plot rendering daemon.
+
+Each plot script such as triggerPlot.py, visitsPlot.py or fpsLogPlot.py used
+to be started cold, by motion at the end of every event or by cron, paying for
+the interpreter and the pandas and matplotlib imports every time, several CPU
+seconds on a Pi just as the next event may start. The daemon imports them once,
+runs at a low priority and renders the plot jobs left in a spool directory,
+running each script in process as if it had been started from the command line.
+
+A job is a small json file of the script, its arguments and the directory to
+run it in. Jobs are rendered in the order they were first requested and
+identical jobs waiting together are rendered once, the data is read when the
+plot is drawn so nothing is lost. The job files are claimed before rendering,
+so a request made while its plot is being drawn is queued again. When the
+daemon is not running submit_plot starts the script as before.
+
+    python3 plotDaemon.py                                # Run the daemon.
+    python3 plotDaemon.py --submit visitsPlot.py --days 10  # Queue a job, from cron.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Claim the job files before rendering.
+v1.2    18/10/2026  Remove a stale pid file whose pid now belongs to another process.
+"""
+import argparse
+import hashlib
+import json
+import os
+import runpy
+import signal
+import subprocess
+import sys
+import time
+import psutil
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.2"
+
+SPOOL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plot-jobs')
+PID_FILE = 'plotDaemon.pid'
+CLAIMED = '.claimed'  # Added to the name of a job file being rendered.
+
+
+def get_key(script, script_args, cwd):
+    """Return the key shared by identical jobs."""
+    return hashlib.sha1(json.dumps([script, script_args, cwd]).encode()).hexdigest()[:12]
+
+
+def is_running(spool=SPOOL):
+    """
+    Return True if a daemon is serving the spool directory.
+    A pid file left by a daemon that was killed, or whose pid is now another process, is removed.
+    """
+    pid_file = os.path.join(spool, PID_FILE)
+    try:
+        with open(pid_file) as file:
+            pid = int(file.read())
+    except (OSError, ValueError):
+        return False
+    try:
+        if any(os.path.basename(arg) == 'plotDaemon.py' for arg in psutil.Process(pid).cmdline()):
+            return True
+    except psutil.Error:
+        # Gone, or another user's process, either way not our daemon.
+        pass
+    try:
+        os.remove(pid_file)
+    except OSError:
+        pass
+    return False
+
+
+def submit_plot(script, script_args=(), spool=SPOOL, cwd=None):
+    """
+    Queue a plot job for the daemon, or start the script when no daemon is running.
+    Returns False if an identical job is already waiting.
+    """
+    cwd = os.path.abspath(cwd or os.getcwd())
+    script_args = [str(arg) for arg in script_args]
+    if not is_running(spool):
+        subprocess.Popen([sys.executable, script] + script_args, cwd=cwd)
+        return True
+    key = get_key(script, script_args, cwd)
+    if any(name.endswith(f'-{key}.json') for name in os.listdir(spool)):
+        return False
+    job = {'Script': script, 'Args': script_args, 'Cwd': cwd, 'Submitted': time.time()}
+    filename = os.path.join(spool, f'{time.time_ns()}-{key}.json')
+    # Write then rename so the daemon never reads half a job.
+    with open(f'{filename}.tmp', 'w') as file:
+        json.dump(job, file)
+    os.replace(f'{filename}.tmp', filename)
+    return True
+
+
+class PlotDaemon:
+    """
+    Render the plot jobs of a spool directory in one long lived process.
+    """
+
+    def __init__(self, spool=SPOOL, interval=1.0, log=print):
+        self.spool = spool
+        self.interval = interval
+        self.log = log
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.job_cnt = 0  # Jobs rendered.
+        self.coalesced_cnt = 0  # Jobs dropped as an identical one was waiting.
+        self.failed_cnt = 0
+        self.render_s = 0.0
+        self.kill_now = False
+
+    def take_jobs(self):
+        """
+        Return the waiting jobs in the order first requested, one per key, with their files. The files
+        are claimed so an identical request made while rendering is not taken as a duplicate.
+        """
+        jobs = {}
+        for name in sorted(os.listdir(self.spool)):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-5].split('-', 1)[-1]
+            path = os.path.join(self.spool, name)
+            if key not in jobs:
+                try:
+                    with open(path) as file:
+                        jobs[key] = (json.load(file), [])
+                except (OSError, ValueError) as e:
+                    self.log(f'Plot job {name} could not be read: {e}')
+                    os.remove(path)
+                    continue
+            os.replace(path, path + CLAIMED)
+            jobs[key][1].append(path + CLAIMED)
+        return list(jobs.values())
+
+    def requeue_claimed(self):
+        """Queue again the jobs claimed by a daemon that stopped while rendering."""
+        for name in os.listdir(self.spool):
+            if name.endswith('.json' + CLAIMED):
+                path = os.path.join(self.spool, name)
+                os.replace(path, path[:-len(CLAIMED)])
+
+    def find_script(self, script, cwd):
+        for directory in (cwd, self.script_dir):
+            path = os.path.join(directory, script)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def render(self, job):
+        """Run a plot script in this process, returns True if it finished."""
+        import matplotlib
+        from matplotlib import pyplot as plt
+        script = self.find_script(job['Script'], job['Cwd'])
+        if script is None:
+            self.log(f'Plot script {job["Script"]} not found.')
+            return False
+        saved = (sys.argv, list(sys.path), os.getcwd())
+        sys.argv = [script] + job['Args']
+        sys.path.insert(0, os.path.dirname(script))
+        start = time.perf_counter()
+        try:
+            os.chdir(job['Cwd'])
+            # The scripts change the style, restore it for the next.
+            with matplotlib.rc_context():
+                runpy.run_path(script, run_name='__main__')
+            return True
+        except SystemExit as e:
+            return not e.code
+        except Exception as e:
+            self.log(f'Plot {job["Script"]} failed: {e}')
+            return False
+        finally:
+            plt.close('all')
+            sys.argv, sys.path[:] = saved[0], saved[1]
+            os.chdir(saved[2])
+            self.render_s += time.perf_counter() - start
+
+    def run_once(self):
+        """Render the waiting jobs, returns the number rendered."""
+        rendered = 0
+        for job, paths in self.take_jobs():
+            start = time.perf_counter()
+            if self.render(job):
+                rendered += 1
+                outcome = 'rendered'
+            else:
+                self.failed_cnt += 1
+                outcome = 'failed'
+            self.job_cnt += 1
+            self.coalesced_cnt += len(paths) - 1
+            for path in paths:
+                os.remove(path)
+            self.log(f'Plot {" ".join([job["Script"]] + job["Args"])} {outcome} in '
+                     f'{time.perf_counter() - start:.2f}s, waited {time.time() - job["Submitted"]:.2f}s')
+        return rendered
+
+    def exit_gracefully(self, *args):
+        self.kill_now = True
+
+    def run(self):
+        """Serve the spool directory until interrupted or terminated."""
+        signal.signal(signal.SIGTERM, self.exit_gracefully)
+        os.makedirs(self.spool, exist_ok=True)
+        self.requeue_claimed()
+        pid_file = os.path.join(self.spool, PID_FILE)
+        with open(pid_file, 'w') as file:
+            file.write(str(os.getpid()))
+        # Import the plotting libraries once, without a display.
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot
+        import pandas
+        self.log(f'Plot daemon serving {self.spool}')
+        try:
+            while not self.kill_now:
+                if not self.run_once():
+                    time.sleep(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(pid_file)
+            self.log(f'Plot daemon: {self.get_stats()}')
+
+    def get_stats(self):
+        return {'Jobs': self.job_cnt,
+                'Coalesced': self.coalesced_cnt,
+                'Failed': self.failed_cnt,
+                'Render Mean s': round(self.render_s / self.job_cnt, 3) if self.job_cnt else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render plots in a long lived low priority process")
+    parser.add_argument('--spool', default=SPOOL, help='Enter the job directory.')
+    parser.add_argument('--interval', type=float, default=1.0, help='Enter the seconds between checks for jobs.')
+    parser.add_argument('--nice', type=int, default=19, help='Enter the niceness of the daemon.')
+    parser.add_argument('--submit', default=None, help='Queue a job for the plot script and its arguments.')
+    args, script_args = parser.parse_known_args()
+    if args.submit:
+        submit_plot(args.submit, script_args, args.spool)
+        return
+    if hasattr(os, 'nice'):
+        os.nice(args.nice)
+    PlotDaemon(args.spool, args.interval).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Compressed pre-roll buffer.
+
+The frames before an event are normally held uncompressed, pre_frames of them,
+so the memory needed grows with the pre-roll length and the frame size. A
+second of 960x540 frames at 30 fps is 47 MB. The pre-roll keeps the frames
+compressed as jpg or png instead, encoded on a worker thread, in a ring limited
+to a budget of bytes as well as a number of frames. When an event starts the
+compressed frames are taken in one go and decoded by the video encoder thread.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+"""
+import collections
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.0"
+
+CODECS = ('jpg', 'png')
+
+
+class PreRoll:
+    """
+    Ring of compressed frames, the oldest are dropped once there are more than max_frames or their
+    size exceeds budget_mb. quality is the jpg quality, png frames are lossless.
+    """
+
+    def __init__(self, max_frames, budget_mb=256, codec='jpg', quality=90, queue_size=4, name='PreRoll'):
+        if codec not in CODECS:
+            raise ValueError(f'pre_roll must be one of off, {", ".join(CODECS)} not {codec}')
+        self.max_frames = max_frames
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.extension = f'.{codec}'
+        if codec == 'jpg':
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        else:
+            # png is lossless, the fastest level keeps up with the frame rate.
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+        self.name = name
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.frames = collections.deque()
+        self.bytes = 0  # Size of the frames held.
+        self.frame_cnt = 0  # Frames encoded.
+        self.dropped_cnt = 0  # Frames dropped because the queue was full.
+        self.evicted_cnt = 0  # Frames dropped to stay within the budget.
+        self.encode_ns = 0
+        self.frame_bytes = 0  # Size of a frame before compression.
+
+    def start(self):
+        """Start the worker thread."""
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            try:
+                if frame is None:
+                    break
+                self.encode(frame)
+            finally:
+                self.queue.task_done()
+
+    def encode(self, frame):
+        start = time.perf_counter_ns()
+        ok, data = cv2.imencode(self.extension, frame, self.params)
+        self.encode_ns += time.perf_counter_ns() - start
+        if not ok:
+            return
+        with self.lock:
+            self.frame_cnt += 1
+            self.frame_bytes = frame.nbytes
+            self.frames.append(data)
+            self.bytes += data.nbytes
+            while self.frames and (len(self.frames) > self.max_frames or self.bytes > self.budget):
+                self.bytes -= self.frames.popleft().nbytes
+                self.evicted_cnt += 1
+
+    def push(self, frame):
+        """Queue a copy of the frame to be compressed, returns False if it was dropped."""
+        if self.thread is None:
+            self.encode(frame)
+            return True
+        try:
+            self.queue.put_nowait(np.copy(frame))
+        except queue.Full:
+            self.dropped_cnt += 1
+            return False
+        return True
+
+    def take(self):
+        """Wait for the queued frames to be compressed then return them all, oldest first, and empty the ring."""
+        if self.thread:
+            self.queue.join()
+        with self.lock:
+            frames = list(self.frames)
+            self.frames.clear()
+            self.bytes = 0
+        return frames
+
+    def get_stats(self):
+        with self.lock:
+            return {'Frames': len(self.frames),
+                    'Bytes': self.bytes,
+                    'Budget': self.budget,
+                    'Encoded': self.frame_cnt,
+                    'Dropped': self.dropped_cnt,
+                    'Evicted': self.evicted_cnt,
+                    'Ratio': round(self.frame_bytes * len(self.frames) / self.bytes, 1) if self.bytes else 0.0,
+                    'Encode Mean ms': round(self.encode_ns / self.frame_cnt / 1e6, 3) if self.frame_cnt else 0.0}
+
@@ -3,10 +3,10 @@ import os
 import random
 import time
 # from datetime import datetime, time
-from os.path import exists
 from datetime import datetime, timedelta
-import csv
 from pathlib import Path
+import logStore
+from telemetrySink import get_sink
 
 """
 Logs recording times.
@@ -14,19 +14,24 @@ Logs recording times.
 Version Date        Description
 v1.1    01/04/2024  Initial version.
 v1.2    22/04/2024  Get recording status.
+v1.3    18/10/2026  Write the records through the shared telemetry sink.
+v1.4    18/10/2026  Write a daily file in logs/recording and only read the days needed.
+v1.5    18/10/2026  Flush the record before clearing the lock so the status never reads the previous one.
 
 __author__ = "Peter Goodgame"
 # __name__ = "RecordingLogCSV"
-__version__ = "v1.2"
+__version__ = "v1.5"
 """
 
 
 class RecordingLogCSV:
     """Store Recording times."""
 
-    def __init__(self):
+    def __init__(self, sink=None):
         self.columns = ["Timestamp", "Duration"]
-        self.filename = "recording.csv"
+        self.log_name = "recording"
+        self.filename = logStore.get_partition_dir(self.log_name)
+        self.telemetry = (sink or get_sink()).register(self.filename, self.columns, partitioned=True)
         self.lockfile = "recording.lock"
         self.clear_lock()
         self.start_time = None
@@ -35,7 +40,7 @@ class RecordingLogCSV:
         self.started = False
         self.duration = None
         self.data = None
-        self.exists = os.path.exists(self.filename)
+        self.exists = bool(logStore.list_partitions(self.log_name))
 
     def start_recording(self):
         """Start a recording session."""
@@ -51,6 +56,8 @@ class RecordingLogCSV:
             self.end_time = datetime.now().replace(microsecond=0)
             duration = self.end_time - self.start_time
             self.write(self.end_time, duration)
+            # The record must be on disk before the lock goes, get_status() reads it once unlocked.
+            self.telemetry.flush()
             self.clear_lock()
             print(f'Recording end time logged at {self.end_time}')
         self.start_time = None
@@ -71,12 +78,10 @@ class RecordingLogCSV:
             pass
 
     def get_last_record(self):
-        try:
-            with open(self.filename, 'r') as file:
-                last_line = file.readlines()[-1]
-            return last_line
-        except FileNotFoundError:
+        last_line = logStore.read_last_line(self.log_name)
+        if last_line is None:
             return "2024-04-01 12:00:00,0:00:01"
+        return last_line
 
     # def get_elapsed_time(self):
     #     pass
@@ -97,41 +102,24 @@ class RecordingLogCSV:
         return data
 
     def write(self, start_time, duration):
-        """Write a temperature record."""
-        if not exists(self.filename):
-            self.create()
-
-        with open(self.filename, 'a', newline='') as file:
-            # creating a csv dict writer object
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            timestamp = start_time.strftime("%Y-%m-%d %H:%M:%S")
-            writer.writerow({"Timestamp": timestamp,
-                             "Duration": duration})
-
-    def create(self):
-        """Create a temperature csv file with a header row,"""
-        # writing to csv file
-        with open(self.filename, 'w', newline='') as file:
-            # creating a csv dict writer object
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            # writing headers (field names)
-            writer.writeheader()
+        """Write a recording record."""
+        timestamp = start_time.strftime("%Y-%m-%d %H:%M:%S")
+        self.telemetry.write({"Timestamp": timestamp,
+                              "Duration": duration})
 
     def get_duration(self, start_date=datetime.now() - timedelta(hours=12)):
         """Return the duration since start date which defaults to 12 hours ago."""
         total_duration = timedelta()
-        with open(self.filename, 'r', newline='') as file:
-            csv_reader = csv.reader(file)
-            # Iterate over each row in the CSV file
-            for row in csv_reader:
-                try:
-                    dt = datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S')
-                    if dt > start_date:
-                        (h, m, s) = row[2].split(":")
-                        duration = timedelta(hours=int(h), minutes=int(m), seconds=int(s))
-                        total_duration += duration
-                except ValueError:
-                    continue
+        # Only the days from start_date are read.
+        for row in logStore.iter_rows(self.log_name, start_date):
+            try:
+                dt = datetime.strptime(row['Timestamp'], '%Y-%m-%d %H:%M:%S')
+                if dt > start_date:
+                    (h, m, s) = row['Duration'].split(":")
+                    duration = timedelta(hours=int(h), minutes=int(m), seconds=int(s))
+                    total_duration += duration
+            except ValueError:
+                continue
         return total_duration
 
 
@@ -1,9 +1,9 @@
 import argparse
 import os
 import matplotlib.pyplot as plt
-import pandas as pd
 from datetime import datetime, timedelta
 from matplotlib.ticker import FuncFormatter
+from logStore import read_window
 
 
 # Function to convert HH:MM:SS to seconds
@@ -37,18 +37,8 @@ MINUTES = args.minutes
 TITLE = args.title
 FILENAME = args.filename
 
-# Load Data
-df = pd.read_csv('recording.csv')
-
-# Convert Timestamps to datetime
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-
-df.sort_values('Timestamp', inplace=True)
-
-# Filter data
-end_date = df['Timestamp'].max()
-start_date = end_date - pd.Timedelta(days=DAYS, hours=HOURS, minutes=MINUTES)
-df = df[(df['Timestamp'] >= start_date) & (df['Timestamp'] <= end_date)]
+# Load the period reported up to the latest recording.
+df = read_window('recording', days=DAYS, hours=HOURS, minutes=MINUTES)
 
 # Add hour to the data frame.
 df['Hour'] = df['Timestamp'].dt.hour
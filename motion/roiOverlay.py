@@ -0,0 +1,60 @@
+"""
+Region of interest overlay.
+
+The outline of the mask and its ROI label are rendered once into a layer with
+a copy mask, held as the coordinates of the pixels it covers. Drawing the
+overlay on a frame is then a single masked copy rather than running Canny,
+findContours and moments on the static mask for every frame.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+"""
+import cv2
+import numpy as np
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.0"
+
+
+def get_centre(gc_contours):
+    """Return the centre of the last contour with an area."""
+    cx = cy = None
+    for i in gc_contours:
+        gc_moment = cv2.moments(i)
+        if gc_moment['m00'] != 0:
+            cx = int(gc_moment['m10'] / gc_moment['m00'])
+            cy = int(gc_moment['m01'] / gc_moment['m00'])
+    return cx, cy
+
+
+class RoiOverlay:
+    """
+    Pre-rendered outline of the mask. Call load() again if the mask changes.
+    """
+
+    def __init__(self, mask, rgb, thickness, font_size):
+        self.rgb = rgb
+        self.thickness = thickness
+        self.font_size = font_size
+        self.where = None  # Row and column indices of the overlay pixels.
+        self.layer = None  # Colour of each overlay pixel.
+        self.load(mask)
+
+    def load(self, mask):
+        """Render the outline and label of the mask."""
+        edges = cv2.Canny(mask, 10, 100)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        cx, cy = get_centre(contours)
+        alpha = np.zeros(mask.shape[:2], np.dtype('uint8'))
+        if cx is not None:
+            cv2.putText(alpha, 'ROI', (cx, cy), cv2.FONT_HERSHEY_SIMPLEX, self.font_size, 255, self.thickness,
+                        cv2.LINE_AA)
+        cv2.drawContours(alpha, contours, -1, 255, self.thickness)
+        # Anti aliased edges of the label are drawn when they are at least half covered.
+        self.where = np.nonzero(alpha >= 128)
+        self.layer = np.full((self.where[0].size, 3), self.rgb, np.dtype('uint8'))
+
+    def draw(self, image):
+        """Draw the overlay on the image."""
+        image[self.where] = self.layer
+        return image
@@ -0,0 +1,249 @@
+"""
+Always on profiler of the points in the main loop.
+
+Each point records the nanoseconds since the previous point in a fixed size
+histogram for that point, so it costs about a microsecond and runs for the
+life of the process in about 40 KB. The buckets are log spaced with 8
+per power of two, so a percentile is accurate to within 6%. The points are
+registered up front and passed by id, no strings are looked up per frame.
+
+A dump writes the count, mean, percentiles and maximum of each point in
+milliseconds to timings.csv and the histograms to timings-histogram.csv, which
+timingsPlot.py plots. motion dumps on SIGUSR2, which this module sends when run
+as a command, and on exit when csv_timings is on. With --stage-timings motion
+writes the frames per second, the percentiles and the peak resident memory as
+json for benchmark.py.
+
+    python3 stageProfiler.py --dump
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Add the subtraction and measure points and write_json, replacing StageTimer.
+"""
+import argparse
+import csv
+import json
+import os
+import signal
+import time
+from time import perf_counter_ns
+import numpy as np
+import psutil
+
+try:
+    import resource
+except ModuleNotFoundError:
+    resource = None
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.1"
+
+# Point ids.
+START_LOOP = 0
+READ_FRAME = 1
+ZOOM_FRAME = 2
+RESIZE_FRAME = 3
+ROTATE_FRAME = 4
+APPLY_MASK = 5
+DETECT_MOVEMENT = 6
+ADD_DATE = 7
+CHECK_MOVEMENT = 8
+UPDATE_GRAPH = 9
+DRAW_BOX = 10
+WRITE_VIDEO = 11
+CLOSE_VIDEO = 12
+WRITE_JPEG = 13
+WRITE_YOLO = 14
+SUBTRACT_BACKGROUND = 15
+MEASURE_MOVEMENT = 16
+POINTS = ['Start Loop', 'Read Frame', 'Zoom Frame', 'Resize Frame', 'Rotate Frame', 'Apply Mask',
+          'Detect Movement', 'Add Date', 'Check For Movement', 'Update Graph Frame', 'Draw Movement Box',
+          'Write Video Frame', 'Close Video', 'Write JPEG', 'Write YOLO', 'Subtract Background',
+          'Measure Movement']
+
+SUB_BITS = 3  # 8 buckets per power of two.
+BUCKETS = (40 - 4) * 8 + 16  # Up to 2**40 ns, about 18 minutes.
+PERCENTILES = (50, 90, 99)
+
+
+def get_peak_rss():
+    """Return the peak resident memory of this process in MB."""
+    if resource is None:
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bucket_bounds():
+    """Return the lower and upper bounds in nanoseconds of every bucket."""
+    buckets = np.arange(BUCKETS)
+    shift = np.maximum(buckets // 8 - 1, 0)
+    lower = np.where(buckets < 8, buckets, (buckets % 8 + 8) << shift)
+    upper = np.where(buckets < 8, buckets + 1, (buckets % 8 + 9) << shift)
+    return lower, upper
+
+
+class StageProfiler:
+    """
+    Histograms of the time between points, point(id) adds the time since the previous point to id.
+    """
+
+    def __init__(self, points=POINTS, enabled=True):
+        self.points = list(points)
+        self.enabled = enabled
+        # Flat lists sized up front, indexing a list is quicker than an array.array or numpy array.
+        self.counts = [0] * (len(self.points) * BUCKETS)
+        self.totals = [0] * len(self.points)
+        self.maxima = [0] * len(self.points)
+        self.last_ns = perf_counter_ns()
+        self.start_ns = self.last_ns  # Start of the timings, for the frames per second.
+
+    def point(self, sp_point):
+        if not self.enabled:
+            return
+        now = perf_counter_ns()
+        elapsed = now - self.last_ns
+        self.last_ns = now
+        bits = elapsed.bit_length()
+        if bits > SUB_BITS:
+            shift = bits - SUB_BITS - 1
+            bucket = (shift << SUB_BITS) + (elapsed >> shift)
+            if bucket >= BUCKETS:
+                bucket = BUCKETS - 1
+        else:
+            bucket = elapsed
+        self.counts[sp_point * BUCKETS + bucket] += 1
+        self.totals[sp_point] += elapsed
+        if elapsed > self.maxima[sp_point]:
+            self.maxima[sp_point] = elapsed
+
+    def mark(self):
+        """Start timing from now, the time since the previous point is not recorded."""
+        self.last_ns = perf_counter_ns()
+
+    def reset(self):
+        """Clear the histograms, such as once the background model has settled."""
+        self.counts = [0] * (len(self.points) * BUCKETS)
+        self.totals = [0] * len(self.points)
+        self.maxima = [0] * len(self.points)
+        self.start_ns = perf_counter_ns()
+
+    def get_histograms(self):
+        """Return the bucket counts as an array of points by buckets."""
+        return np.array(self.counts, np.dtype('int64')).reshape(len(self.points), BUCKETS)
+
+    def summary(self):
+        """Return the count, mean, percentiles and maximum in milliseconds of each point that was recorded."""
+        histograms = self.get_histograms()
+        lower, upper = bucket_bounds()
+        middle = (lower + upper) / 2
+        rows = []
+        for sp_point, name in enumerate(self.points):
+            counts = histograms[sp_point]
+            count = int(counts.sum())
+            if count == 0:
+                continue
+            maximum = self.maxima[sp_point]
+            cumulative = np.cumsum(counts)
+            row = {'Point': name,
+                   'Count': count,
+                   'Mean ms': round(self.totals[sp_point] / count / 1e6, 4)}
+            for percentile in PERCENTILES:
+                bucket = int(np.searchsorted(cumulative, count * percentile / 100))
+                row[f'P{percentile} ms'] = round(min(middle[bucket], maximum) / 1e6, 4)
+            row['Max ms'] = round(maximum / 1e6, 4)
+            rows.append(row)
+        return rows
+
+    def dump(self, filename='timings.csv'):
+        """Write the summary to filename and the histograms alongside it, returns the summary."""
+        rows = self.summary()
+        columns = ['Point', 'Count', 'Mean ms'] + [f'P{percentile} ms' for percentile in PERCENTILES] + ['Max ms']
+        with open(filename, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        histograms = self.get_histograms()
+        lower, _ = bucket_bounds()
+        with open(get_histogram_filename(filename), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Point', 'Milliseconds', 'Count'])
+            for sp_point, name in enumerate(self.points):
+                for bucket in np.flatnonzero(histograms[sp_point]):
+                    writer.writerow([name, lower[bucket] / 1e6, histograms[sp_point, bucket]])
+        return rows
+
+    def write_json(self, filename, frame_point=READ_FRAME, **extra):
+        """
+        Write the frames per second, counted at frame_point, the percentiles of each point in milliseconds,
+        the peak resident memory and any extra values to a json file for benchmark.py.
+        """
+        frames = sum(self.counts[frame_point * BUCKETS:(frame_point + 1) * BUCKETS])
+        elapsed = (self.last_ns - self.start_ns) / 1e9
+        stages = {}
+        for row in self.summary():
+            stages[row['Point']] = {'Count': row['Count'], 'Mean': row['Mean ms']}
+            for percentile in PERCENTILES:
+                stages[row['Point']][f'P{percentile}'] = row[f'P{percentile} ms']
+            stages[row['Point']]['Max'] = row['Max ms']
+        data = {'Frames': frames,
+                'Seconds': round(elapsed, 3),
+                'FPS': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+                'Peak RSS MB': round(get_peak_rss(), 2),
+                'Stages': stages}
+        data.update(extra)
+        with open(filename, 'w') as file:
+            json.dump(data, file, indent=2)
+        return filename
+
+
+def get_histogram_filename(filename):
+    root, extension = os.path.splitext(filename)
+    return f'{root}-histogram{extension}'
+
+
+def find_motion():
+    """Return the python processes running motion.py, not wrappers such as timeout or sudo."""
+    processes = []
+    for process in psutil.process_iter(['pid', 'cmdline']):
+        cmdline = process.info['cmdline'] or []
+        if (process.info['pid'] != os.getpid() and len(cmdline) > 1
+                and os.path.basename(cmdline[0]).startswith('python')
+                and any(arg.endswith('motion.py') for arg in cmdline[1:])):
+            processes.append(process)
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dump the timings of a running motion.py")
+    parser.add_argument('--dump', action='store_true', help='Send SIGUSR2 and print the timings.')
+    parser.add_argument('--pid', type=int, default=None, help='Enter the process id, the default finds motion.py.')
+    parser.add_argument('--signal_file', default='timings.sig', help='Enter the file touched after a dump.')
+    parser.add_argument('--timings', default='timings.csv', help='Enter the timings file.')
+    args = parser.parse_args()
+    if not args.dump:
+        parser.print_help()
+        return
+    pids = [args.pid] if args.pid else [process.pid for process in find_motion()]
+    if not pids:
+        print('motion.py is not running.')
+        return
+    before = os.path.getmtime(args.signal_file) if os.path.exists(args.signal_file) else 0
+    for pid in pids:
+        os.kill(pid, signal.SIGUSR2)
+    # The dump is written by the main loop at the next frame.
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if os.path.exists(args.signal_file) and os.path.getmtime(args.signal_file) > before:
+            break
+        time.sleep(0.1)
+    else:
+        print(f'No dump written to {args.timings}.')
+        return
+    with open(args.timings, newline='') as file:
+        for row in csv.DictReader(file):
+            print(', '.join(f'{key}: {value}' for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
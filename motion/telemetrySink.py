@@ -0,0 +1,230 @@
+"""
+Shared buffered sink for the csv logs.
+
+The csv logger classes used to open their file, build a csv writer, write one
+row and close the file again for every record, often checking the file exists
+first. Some of them log every frame, so the main loop made several system calls
+a frame and the SD card saw a small write for every row. The loggers now
+register their file with a sink instead. The sink keeps the files open, holds
+the rows in memory and writes them from a background thread every interval
+seconds, or sooner once max_rows are waiting, and on close. A file deleted
+while it is open is created again, with its header, on the next flush.
+
+The sink lock only guards the queued rows, so adding a row never waits on a
+write to the card. Each file has its own lock held while it is written, taken
+before the sink lock when both are needed.
+
+A partitioned file is a directory of daily files named by the date of the
+Timestamp column of each row, see logStore.py.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Write partitioned files as one file per day.
+v1.2    18/10/2026  Write the files outside the sink lock.
+"""
+import atexit
+import csv
+import os
+import threading
+from itertools import groupby
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.2"
+
+
+class TelemetryFile:
+    """
+    A csv file registered with a TelemetrySink. on_flush is called after rows have been written to it.
+    When partitioned filename is a directory and each row is written to the file of its day.
+    """
+
+    def __init__(self, sink, filename, columns, on_flush=None, partitioned=False):
+        self.sink = sink
+        self.filename = filename
+        self.columns = columns
+        self.on_flush = on_flush
+        self.partitioned = partitioned
+        self.rows = []  # Rows waiting to be written.
+        self.io_lock = threading.Lock()  # Held while the file is written, opened or closed.
+        self.path = None  # File open, the day's file when partitioned.
+        self.file = None
+        self.writer = None
+
+    def write(self, row):
+        """Queue a row, a dict keyed by the columns."""
+        self.sink.add(self, row)
+
+    def flush(self):
+        """Write the queued rows now."""
+        self.sink.flush(self)
+
+    def delete(self):
+        """Drop the queued rows and remove the file, or every daily file, it is created again by the next row."""
+        with self.io_lock:
+            with self.sink.lock:
+                self.sink.pending -= len(self.rows)
+                self.rows = []
+            self.close()
+            if self.partitioned:
+                if os.path.isdir(self.filename):
+                    for name in os.listdir(self.filename):
+                        if name.endswith('.csv'):
+                            os.remove(os.path.join(self.filename, name))
+            elif os.path.exists(self.filename):
+                os.remove(self.filename)
+
+    def get_path(self, row):
+        """Return the file of a row."""
+        if self.partitioned:
+            return os.path.join(self.filename, f"{row['Timestamp'][:10]}.csv")
+        return self.filename
+
+    def open(self, path):
+        if self.partitioned:
+            os.makedirs(self.filename, exist_ok=True)
+        self.path = path
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.columns)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+            self.writer = None
+            self.path = None
+
+    def write_rows(self, rows):
+        # The rows arrive in time order so a partitioned file changes file at most once a day.
+        for path, path_rows in groupby(rows, key=self.get_path):
+            # The file may have been deleted or rotated since it was opened.
+            if self.file and (path != self.path or not os.path.exists(path)):
+                self.close()
+            if self.file is None:
+                self.open(path)
+            self.writer.writerows(path_rows)
+            self.file.flush()
+
+
+class TelemetrySink:
+    """
+    Write the rows of the registered csv files from a background thread, every interval seconds or
+    once max_rows are waiting. Without the thread rows are written as they arrive.
+    """
+
+    def __init__(self, interval=5.0, max_rows=500, name='Telemetry'):
+        self.interval = interval
+        self.max_rows = max(max_rows, 1)
+        self.name = name
+        self.files = {}
+        self.lock = threading.RLock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.running = False
+        self.pending = 0  # Rows waiting across all the files.
+        self.row_cnt = 0  # Rows written.
+        self.flush_cnt = 0  # Writes to the files.
+        self.pending_peak = 0
+        self.error_cnt = 0
+        self.last_error = None
+
+    def start(self):
+        """Start the flush thread."""
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+        return self
+
+    def close(self):
+        """Stop the thread, write the queued rows and close the files."""
+        if self.thread:
+            self.running = False
+            self.wake.set()
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        with self.lock:
+            files = list(self.files.values())
+        for file in files:
+            with file.io_lock:
+                file.close()
+
+    def register(self, filename, columns, on_flush=None, partitioned=False):
+        """Return the TelemetryFile for filename, registering it the first time."""
+        with self.lock:
+            file = self.files.get(filename)
+            if file is None:
+                file = TelemetryFile(self, filename, columns, on_flush, partitioned)
+                self.files[filename] = file
+            return file
+
+    def add(self, file, row):
+        with self.lock:
+            file.rows.append(row)
+            self.pending += 1
+            if self.pending > self.pending_peak:
+                self.pending_peak = self.pending
+            flush_now = self.thread is None
+            if not flush_now and self.pending >= self.max_rows:
+                self.wake.set()
+        if flush_now:
+            self.flush(file)
+
+    def run(self):
+        while self.running:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self, file=None):
+        """Write the queued rows of a file, or of every file. The rows are taken under the sink lock and
+        written under the file's lock only."""
+        with self.lock:
+            flush_files = [file] if file else list(self.files.values())
+        for flush_file in flush_files:
+            # Take the rows under the file's lock too so two flushes never write a file out of order.
+            with flush_file.io_lock:
+                with self.lock:
+                    if not flush_file.rows:
+                        continue
+                    rows, flush_file.rows = flush_file.rows, []
+                    self.pending -= len(rows)
+                try:
+                    flush_file.write_rows(rows)
+                    if flush_file.on_flush:
+                        flush_file.on_flush()
+                except OSError as e:
+                    # Drop the rows rather than let them build up while the card is full or missing.
+                    flush_file.close()
+                    with self.lock:
+                        self.error_cnt += 1
+                        self.last_error = f'{flush_file.filename}: {e}'
+                    continue
+            with self.lock:
+                self.row_cnt += len(rows)
+                self.flush_cnt += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {'Files': len(self.files),
+                    'Rows': self.row_cnt,
+                    'Flushes': self.flush_cnt,
+                    'Rows per Flush': round(self.row_cnt / self.flush_cnt, 1) if self.flush_cnt else 0.0,
+                    'Pending': self.pending,
+                    'Pending Peak': self.pending_peak,
+                    'Errors': self.error_cnt,
+                    'Last Error': self.last_error}
+
+
+default_sink = None
+
+
+def get_sink():
+    """Return the sink shared by the loggers of this process, started on first use and closed at exit."""
+    global default_sink
+    if default_sink is None:
+        default_sink = TelemetrySink().start()
+        atexit.register(default_sink.close)
+    return default_sink
@@ -1,68 +1,46 @@
 import os
-from os.path import exists
 from datetime import datetime, timedelta
-import csv
+import logStore
+from telemetrySink import get_sink
 
 __author__ = "Peter Goodgame"
 __name__ = "TempCSV"
-__version__ = "v2.1"
+__version__ = "v2.3"
 
 
 class TempCSV:
     """Store Temperature readings over time."""
 
-    def __init__(self):
+    def __init__(self, sink=None):
         self.data = None
         self.columns = ["Timestamp", "Centigrade", "Fahrenheit", "Humidity"]
-        self.filename = "temperatures.csv"
+        # v2.3 A daily file in logs/temperatures.
+        self.log_name = "temperatures"
+        self.filename = logStore.get_partition_dir(self.log_name)
+        self.telemetry = (sink or get_sink()).register(self.filename, self.columns, partitioned=True)
         self.refresh_time = datetime.now()
         self.now = datetime.now()
         self.refresh_seconds = 60 * 15
         self.temp_c = None
         self.temp_f = None
         self.humidity = None
-        self.exists = os.path.exists(self.filename)
+        self.exists = bool(logStore.list_partitions(self.log_name))
         self.refresh_data(initialise=True)
 
     def write(self, centigrade, fahrenheit, humidity):
         """Write a temperature record."""
-        # writing to csv file
-        if not exists(self.filename):
-            self.create()
-
-        with open(self.filename, 'a', newline='') as file:
-            # creating a csv dict writer object
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            now = datetime.now()
-            timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
-            writer.writerow({"Timestamp": timestamp,
-                             "Centigrade": round(centigrade, 1),
-                             "Fahrenheit": round(fahrenheit, 1),
-                             "Humidity": round(humidity, 1)})
-
-    def create(self):
-        """Create a temperature csv file with a header row,"""
-        # writing to csv file
-        with open(self.filename, 'w', newline='') as file:
-            # creating a csv dict writer object
-            writer = csv.DictWriter(file, fieldnames=self.columns)
-            # writing headers (field names)
-            writer.writeheader()
+        # v2.2 Queue the row on the shared sink which creates the file.
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        self.telemetry.write({"Timestamp": timestamp,
+                              "Centigrade": round(centigrade, 1),
+                              "Fahrenheit": round(fahrenheit, 1),
+                              "Humidity": round(humidity, 1)})
 
     def read_last_line(self, n=1):
-        """Returns the nth before last line of a file (n=1 gives last line)"""
+        """Returns the nth before last line of the latest daily file (n=1 gives last line)"""
         if self.exists:
-            num_newlines = 0
-            with open(self.filename, 'rb') as f:
-                try:
-                    f.seek(-2, os.SEEK_END)
-                    while num_newlines < n:
-                        f.seek(-2, os.SEEK_CUR)
-                        if f.read(1) == b'\n':
-                            num_newlines += 1
-                except OSError:
-                    f.seek(0)
-                self.data = f.readline().decode()
+            self.data = logStore.read_last_line(self.log_name, n)
 
     def refresh_data(self, initialise=False, debug=False):
         if self.exists:
@@ -1,10 +1,10 @@
 import argparse
 import socket
 
-import pandas as pd
 from matplotlib import pyplot as plt
 from matplotlib import dates as mpl_dates
 import os
+from logStore import read_window
 
 parser = argparse.ArgumentParser(description="Report Temperatures")
 parser.add_argument('--days', type=int, default=0, help="Enter the number of days to report.")
@@ -29,15 +29,8 @@ def get_host_name():
     return socket.gethostname().split('.')[0].capitalize()
 
 
-data = pd.read_csv('./temperatures.csv')
-
-
-data['Timestamp'] = pd.to_datetime(data['Timestamp'])
-# Limit the data reported.
-end_date = data['Timestamp'].max()
-start_date = end_date - pd.Timedelta(days=DAYS, hours=HOURS)
-data = data[(data['Timestamp'] >= start_date) & (data['Timestamp'] <= end_date)]
-data.sort_values('Timestamp', inplace=True)
+# Read only the data reported.
+data = read_window('temperatures', days=DAYS, hours=HOURS)
 time = data['Timestamp']
 plt.gcf().autofmt_xdate()
 date_format = mpl_dates.DateFormatter('%a %H:%M')
@@ -0,0 +1,118 @@
+"""
+Cached text rendering for the frame overlays.
+
+cv2.putText with anti aliasing is expensive on the Pi and most overlay text,
+such as the date, only changes once a second while frames arrive 30 times a
+second. Each distinct string is rendered once into a sprite holding the
+coverage of its pixels, then blended onto each frame at the given position.
+The least recently used sprites are dropped once the cache is full.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Text with no pixels, such as a space, gives a sprite that draws nothing.
+"""
+import collections
+import functools
+import cv2
+import numpy as np
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.1"
+
+
+@functools.lru_cache(maxsize=256)
+def get_text_size(text, font, scale, thickness):
+    """Cached cv2.getTextSize."""
+    return cv2.getTextSize(text, font, scale, thickness)
+
+
+class TextSprite:
+    """
+    A string rendered over the bounding box of its pixels, with the coverage of each pixel and
+    the colour premultiplied by the coverage so that blitting is one multiply and one add.
+    """
+
+    def __init__(self, text, font, scale, rgb, thickness):
+        self.size, self.baseline = get_text_size(text, font, scale, thickness)
+        pad = thickness + 2
+        width, height = self.size
+        coverage = np.zeros((height + self.baseline + pad * 2, width + pad * 2), np.dtype('uint8'))
+        cv2.putText(coverage, text, (pad, pad + height), font, scale, 255, thickness, cv2.LINE_AA)
+        x, y, w, h = cv2.boundingRect(coverage)
+        if w and h:
+            coverage = cv2.merge([coverage[y:y + h, x:x + w]] * 3)
+        else:
+            # Nothing to draw, such as a space, blit skips an empty sprite.
+            x, y = pad, pad + height
+            coverage = np.zeros((0, 0, 3), np.dtype('uint8'))
+        # Offset of the sprite from the text origin.
+        self.offset = (x - pad, y - pad - height)
+        self.inverse = 255 - coverage
+        self.colour = (np.array(rgb, np.dtype('float32')) * (coverage / 255) + 0.5).astype(np.uint8)
+
+    def blit(self, image, org):
+        """Blend the text onto the image with org as the bottom left corner as for cv2.putText."""
+        x = org[0] + self.offset[0]
+        y = org[1] + self.offset[1]
+        h, w = self.inverse.shape[:2]
+        # Clip the sprite to the image.
+        left, top = max(-x, 0), max(-y, 0)
+        right, bottom = min(w, image.shape[1] - x), min(h, image.shape[0] - y)
+        if right <= left or bottom <= top:
+            return image
+        roi = image[y + top:y + bottom, x + left:x + right]
+        roi[:] = cv2.add(cv2.multiply(roi, self.inverse[top:bottom, left:right], scale=1 / 255),
+                         self.colour[top:bottom, left:right])
+        return image
+
+
+class TextSprites:
+    """
+    Least recently used cache of text sprites.
+    """
+
+    def __init__(self, font=cv2.FONT_HERSHEY_SIMPLEX, max_sprites=128):
+        self.font = font
+        self.max_sprites = max_sprites
+        self.sprites = collections.OrderedDict()
+        self.hit_cnt = 0
+        self.miss_cnt = 0
+
+    def get_sprite(self, text, scale, rgb, thickness):
+        key = (text, scale, tuple(rgb), thickness)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            self.miss_cnt += 1
+            sprite = TextSprite(text, self.font, scale, rgb, thickness)
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.max_sprites:
+                self.sprites.popitem(last=False)
+        else:
+            self.hit_cnt += 1
+            self.sprites.move_to_end(key)
+        return sprite
+
+    def get_text_size(self, text, scale, thickness):
+        """Return the size of the text, as cv2.getTextSize without the baseline."""
+        return get_text_size(text, self.font, scale, thickness)[0]
+
+    def put_text(self, image, text, org, scale, rgb, thickness):
+        """Draw the text as cv2.putText with cv2.LINE_AA."""
+        return self.get_sprite(text, scale, rgb, thickness).blit(image, org)
+
+    def put_chars(self, image, text, org, scale, rgb, thickness):
+        """
+        Draw the text a character at a time for text that changes on every frame such as a counter,
+        so only the characters are cached.
+        """
+        x, y = org
+        for char in text:
+            sprite = self.get_sprite(char, scale, rgb, thickness)
+            sprite.blit(image, (x, y))
+            x += sprite.size[0]
+        return image
+
+    def get_stats(self):
+        return {'Sprites': len(self.sprites),
+                'Hits': self.hit_cnt,
+                'Misses': self.miss_cnt}
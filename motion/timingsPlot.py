@@ -3,24 +3,43 @@ import os
 import pandas as pd
 from matplotlib import pyplot as plt
 
-plt.style.use("seaborn-v0_8-whitegrid")
+"""
+Plot the timings dumped by the stage profiler of motion.
+
+timings.csv has the count, mean, percentiles and maximum in milliseconds of
+each point, timings-histogram.csv has the bucket counts of each point.
+
+Version Date        Description
+v1.1    18/10/2026  Plot the percentiles and histograms of the stage profiler.
+"""
 
-data = pd.read_csv('timings.csv')
+__author__ = "Peter Goodgame"
+__version__ = "v1.1"
 
-data.groupby('Point')['Milliseconds'].mean().plot(kind='barh')
-averages = data.groupby('Point')['Milliseconds'].mean().astype(int)
-averages.to_csv("timing_summary.csv", index=True)
+plt.style.use("seaborn-v0_8-whitegrid")
 
-plt.yticks(rotation = 70)
+data = pd.read_csv('timings.csv').set_index('Point')
 
+data[['P50 ms', 'P90 ms', 'P99 ms']].plot(kind='barh', title='Timings')
+data['Mean ms'].to_csv("timing_summary.csv", index=True)
 
+plt.xlabel('Milliseconds')
+plt.tight_layout()
 plt.savefig('timings.png')
 
+if os.path.exists('timings-histogram.csv'):
+    histogram = pd.read_csv('timings-histogram.csv')
+    plt.figure()
+    for point, counts in histogram.groupby('Point'):
+        # The buckets are log spaced so plot the share of each point on a log axis.
+        plt.step(counts['Milliseconds'], counts['Count'] / counts['Count'].sum(), where='post', label=point)
+    plt.xscale('log')
+    plt.xlabel('Milliseconds')
+    plt.ylabel('Fraction')
+    plt.title('Timing Histograms')
+    plt.legend(fontsize='small')
+    plt.tight_layout()
+    plt.savefig('timings-histogram.png')
+
 if os.name == 'nt':
     plt.show()
-
-# Plot a bar chart
-# data.plot.barh(x='Point', y='Milliseconds',
-#              title='Timings', color='green')
-#
-# plt.show()
@@ -4,6 +4,7 @@ from matplotlib import pyplot as plt
 import numpy as np
 import os
 import socket
+from logStore import read_window
 
 parser = argparse.ArgumentParser(description="Report Movement")
 parser.add_argument('--days', type=int, default=0, help="Enter the number of days to report.")
@@ -26,12 +27,8 @@ def get_host_name():
     return socket.gethostname().split('.')[0].capitalize()
 
 
-data = pd.read_csv('peakMovement.csv')
-data['Timestamp'] = pd.to_datetime(data['Timestamp'])
-
-end_date = data['Timestamp'].max()
-start_date = end_date - pd.Timedelta(days=DAYS, hours=HOURS, minutes=MINUTES)
-data = data[(data['Timestamp'] >= start_date) & (data['Timestamp'] <= end_date)]
+# Read the period reported up to the latest movement.
+data = read_window('peakMovement', days=DAYS, hours=HOURS, minutes=MINUTES)
 
 data['Timestamp_idx'] = pd.to_datetime(data['Timestamp'])
 data.set_index("Timestamp_idx", inplace=True)
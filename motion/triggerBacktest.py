@@ -0,0 +1,159 @@
+"""
+Back test the trigger parameters against a recorded movement level series.
+
+The series is written by motion.py --movement-series, usually while replaying
+recorded footage, and holds the movement level of every frame that reached the
+trigger engine. A grid of trigger_point, trigger_point_base, movement_window and
+movement_window_age values is evaluated in a process pool with the vectorised
+trigger logic from triggerEngine.py. For each parameter set the number of
+events, the frames that would be recorded and the onset latency are written to
+a csv file.
+
+The onset of an event is the first frame of the run of non zero movement
+levels that led to the trigger, the latency is the number of frames from the
+onset to the trigger.
+
+Example:
+    python3 triggerBacktest.py movement.csv --trigger-point 5:100:5 --trigger-point-base 0:50:5 \\
+        --movement-window 0:20:2 --movement-window-age 0:10
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from triggerEngine import window_means, movement_flags
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.0"
+
+COLUMNS = ['Trigger Point',
+           'Trigger Point Base',
+           'Movement Window',
+           'Movement Window Age',
+           'Events',
+           'Recorded Frames',
+           'Recorded Seconds',
+           'Mean Onset Latency',
+           'Max Onset Latency']
+
+# Set in each worker process by set_levels.
+levels = None
+last_quiet = None
+
+
+def load_levels(filename):
+    """Read a movement level series, either a csv with a Movement Level column or one level per line."""
+    with open(filename) as file:
+        header = file.readline()
+    if 'Movement Level' in header:
+        return pd.read_csv(filename)['Movement Level'].to_numpy(np.dtype('int64'))
+    return np.loadtxt(filename, np.dtype('int64'), ndmin=1)
+
+
+def parse_grid(value):
+    """Parse a grid of values given as start:stop[:step] with stop included or as a comma separated list."""
+    if ':' in value:
+        parts = [int(part) for part in value.split(':')]
+        step = parts[2] if len(parts) > 2 else 1
+        return list(range(parts[0], parts[1] + 1, step))
+    return [int(part) for part in value.split(',')]
+
+
+def set_levels(sl_levels):
+    """Process pool initialiser, the series is sent once to each worker rather than with each task."""
+    global levels, last_quiet
+    levels = sl_levels
+    # Index of the most recent frame without movement, -1 before the first one.
+    last_quiet = np.maximum.accumulate(np.where(levels == 0, np.arange(levels.size), -1))
+
+
+def recordings(flags, pre_frames, post_frames):
+    """
+    Return the first frame and the number of frames written for each recording.
+    As in motion.py a recording runs pre_frames + post_frames frames past a single frame of movement,
+    otherwise post_frames past the last movement, and one more frame is written as it closes.
+    """
+    edges = np.diff(flags.astype(np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    first = []
+    frames = []
+    last = -2
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if start <= last + 1:
+            last = end + post_frames
+        else:
+            if first:
+                frames.append(last - first[-1] + 2)
+            first.append(start)
+            last = start + pre_frames + post_frames if end == start else end + post_frames
+    if first:
+        frames.append(min(last + 2, flags.size) - first[-1])
+    return np.array(first, np.dtype('int64')), np.array(frames, np.dtype('int64'))
+
+
+def evaluate(re_window, re_age, re_points, re_pre_frames, re_post_frames, re_fps):
+    """Evaluate every trigger point pair for one movement window and age."""
+    mean, old_mean, ready = window_means(levels, re_window, re_age)
+    rows = []
+    for trigger_point, trigger_point_base in re_points:
+        flags = movement_flags(mean, old_mean, ready, trigger_point, trigger_point_base)
+        first, frames = recordings(flags, re_pre_frames, re_post_frames)
+        latency = first - last_quiet[first] - 1
+        recorded = int(frames.sum())
+        rows.append([trigger_point, trigger_point_base, re_window, re_age,
+                     first.size,
+                     recorded,
+                     round(recorded / re_fps, 1),
+                     round(float(latency.mean()), 1) if latency.size else 0.0,
+                     int(latency.max()) if latency.size else 0])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back test the trigger parameters")
+    parser.add_argument('series', help="Enter the movement level series written by motion.py --movement-series.")
+    parser.add_argument('--trigger-point', default='5:100:5', help="Enter the trigger_point grid.")
+    parser.add_argument('--trigger-point-base', default='0:50:5', help="Enter the trigger_point_base grid.")
+    parser.add_argument('--movement-window', default='0:20:2', help="Enter the movement_window grid.")
+    parser.add_argument('--movement-window-age', default='0:10', help="Enter the movement_window_age grid.")
+    parser.add_argument('--pre-frames', type=int, default=20, help="Enter pre_frames.")
+    parser.add_argument('--post-frames', type=int, default=80, help="Enter post_frames.")
+    parser.add_argument('--fps', type=float, default=30, help="Enter the frame rate of the series.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Enter the number of processes.")
+    parser.add_argument('--sort', default='Recorded Frames', help=f"Enter the column to sort by, {', '.join(COLUMNS)}.")
+    parser.add_argument('--top', type=int, default=10, help="Enter the number of results to print.")
+    parser.add_argument('--output', default='triggerBacktest.csv', help="Enter the csv output filename.")
+    args = parser.parse_args()
+
+    series = load_levels(args.series)
+    # The flag logic needs trigger_point_base to be no higher than trigger_point.
+    points = [(tp, tpb) for tp, tpb in itertools.product(parse_grid(args.trigger_point),
+                                                         parse_grid(args.trigger_point_base)) if tpb <= tp]
+    windows = list(itertools.product(parse_grid(args.movement_window), parse_grid(args.movement_window_age)))
+    print(f'{series.size} frames, {len(points) * len(windows)} parameter sets')
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=set_levels, initargs=(series,)) as executor:
+        futures = [executor.submit(evaluate, window, age, points, args.pre_frames, args.post_frames, args.fps)
+                   for window, age in windows]
+        for future in futures:
+            rows.extend(future.result())
+    print(f'Evaluated in {time.perf_counter() - start:.2f} seconds')
+
+    results = pd.DataFrame(rows, columns=COLUMNS)
+    results.to_csv(args.output, index=False)
+    triggered = results[results['Events'] > 0]
+    print(triggered.sort_values([args.sort, 'Events']).head(args.top).to_string(index=False))
+    print(f'Results written to {args.output}')
+
+
+if __name__ == "__main__":
+    main()
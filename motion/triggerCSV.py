@@ -1,10 +1,34 @@
+"""
+Trigger analysis csv file.
+
+The movement levels and trigger points of the last trigger_point_csv_window
+frames are held in a preallocated structured array used as a ring, one row a
+frame, so logging a frame is a single row assignment. When movement triggers
+the row is flagged and half a window more frames are logged, then the table is
+taken in frame order and written with the csv module.
+
+Version Date        Description
+v1.3    18/10/2026  Split write_csv into take_table and write_table for the post event jobs.
+v1.4    18/10/2026  Hold the rows in a preallocated structured ring and write without pandas.
+v1.5    18/10/2026  Queue the plot for the plot daemon.
+"""
+import csv
 import numpy as np
-import pandas as pd
-import subprocess
+from plotDaemon import submit_plot
 
 __author__ = "Peter Goodgame"
 __name__ = "triggerCSV"
-__version__ = "v1.2"
+__version__ = "v1.5"
+
+COLUMNS = ['Trigger Point',
+           'Trigger Point Base',
+           'Movement Window',
+           'Movement Window Age',
+           'Event Trigger Point',
+           'Event Trigger Point Base',
+           'Movement Level',
+           'Trigger']
+ROW_DTYPE = np.dtype([(column, np.dtype('int64')) for column in COLUMNS])
 
 
 class TriggerCSV:
@@ -14,43 +38,32 @@ class TriggerCSV:
     def __init__(self, trigger_point, trigger_point_base, trigger_point_csv_window, window_size, window_size_age):
         self.frames_required = None
         self.finalise = None
-        # self.post_movement_frames = None
         self.table = None
         self.trigger_point_csv_window = trigger_point_csv_window
         self.trigger_point = trigger_point
         self.trigger_point_base = trigger_point_base
         self.window_size = window_size
         self.window_size_age = window_size_age
-        # self.post_movement_frames_cnt = None
         self.filename = None
-        self.data = np.array([],dtype=np.int16)
-        self.columns = [
-            'Trigger Point',
-            'Trigger Point Base',
-            'Movement Window',
-            'Movement Window Age',
-            'Event Trigger Point',
-            'Event Trigger Point Base',
-            'Movement Level',
-            'Trigger']
+        self.columns = COLUMNS
+        # v1.4 Ring of the last trigger_point_csv_window rows, cursor is the next row written.
+        self.data = np.zeros(max(trigger_point_csv_window, 0), ROW_DTYPE)
+        self.cursor = 0
+        self.row_cnt = 0  # Rows held, up to the size of the ring.
 
     def add_row(self,
                 event_trigger_point,
                 event_trigger_point_base,
                 movement_level):
         if self.trigger_point_csv_window > 0:
-            self.data = np.append(self.data, self.trigger_point)
-            self.data = np.append(self.data, self.trigger_point_base)
-            self.data = np.append(self.data, self.window_size)
-            self.data = np.append(self.data, self.window_size_age)
-            self.data = np.append(self.data, event_trigger_point)
-            self.data = np.append(self.data, event_trigger_point_base)
-            self.data = np.append(self.data, movement_level)
-            self.data = np.append(self.data, False)
-            # Trim buffer
-            self.data = self.data[(self.trigger_point_csv_window * 8) * -1::]
-            # print(self.data.size)
-
+            self.data[self.cursor] = (self.trigger_point, self.trigger_point_base, self.window_size,
+                                      self.window_size_age, event_trigger_point, event_trigger_point_base,
+                                      movement_level, False)
+            self.cursor += 1
+            if self.cursor == self.data.size:
+                self.cursor = 0
+            if self.row_cnt < self.data.size:
+                self.row_cnt += 1
 
     def log_movement(self,
                      event_trigger_point,
@@ -70,8 +83,6 @@ class TriggerCSV:
                          event_trigger_point_base,
                          movement_level)
 
-            # def log_movement(self,
-
     def movement_triggered(self):
         """
         Once movement is triggered set the save post frames and then stop storing data.
@@ -80,19 +91,39 @@ class TriggerCSV:
             if not self.finalise:
                 self.finalise = True
                 self.frames_required = round(self.trigger_point_csv_window / 2)
-                self.data[-1] = True
+                # Flag the latest row, there is none when triggered manually before the first frame.
+                if self.row_cnt:
+                    self.data[self.cursor - 1]['Trigger'] = True
+
+    def get_rows(self):
+        """Return a copy of the rows held, oldest first."""
+        if self.row_cnt < self.data.size:
+            return self.data[:self.row_cnt].copy()
+        return np.concatenate((self.data[self.cursor:], self.data[:self.cursor]))
 
     def write_csv(self, filename='Motion/trigger.csv'):
+        table = self.take_table(filename)
+        if table is not None:
+            self.write_table(filename, table)
+
+    def take_table(self, filename='Motion/trigger.csv'):
+        """
+        Return a copy of the table and start collecting data again, the table can then be written by
+        write_table() on another thread. Returns None when the csv is not enabled.
+        """
         if self.trigger_point_csv_window:
             self.filename = filename
-            # Reshape into a 5 column table
-            self.table = np.reshape(self.data, (-1, 8))
-            df = pd.DataFrame(data=self.table, columns=self.columns)
-            df.index.name = 'Frame'
-            df.to_csv(self.filename)
+            self.table = self.get_rows()
+            # As the data has been taken start collecting data again.
+            self.finalise = False
+            return self.table
+        return None
 
-            # Create plot.
-            subprocess.Popen(['python3', 'triggerPlot.py', '--filename', self.filename])
+    def write_table(self, filename, table):
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(['Frame'] + self.columns)
+            writer.writerows([frame, *row] for frame, row in enumerate(table.tolist()))
 
-            # As the file has been written start collecting data again.
-            self.finalise = False
+        # Create plot, the plot daemon renders it when running.
+        submit_plot('triggerPlot.py', ['--filename', filename])
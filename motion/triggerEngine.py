@@ -0,0 +1,138 @@
+"""
+Motion trigger engine.
+
+Decides when movement starts and ends from the movement level of each frame.
+With a movement_window_age the mean movement over the whole window is
+compared against the mean of an aged window offset by the trigger points,
+this stops a gradual rise in movement such as rain from triggering.
+
+The movement levels are held in a preallocated circular buffer with running
+totals for the current and aged windows so each update takes constant time.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Add vectorised versions of the trigger logic for back testing.
+"""
+import numpy as np
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.1"
+
+
+class TriggerEngine:
+    """
+    The current window holds the last movement_window + movement_window_age + 1 levels.
+    The aged window holds movement_window + 1 levels starting movement_window_age - 1 frames ago.
+    """
+
+    def __init__(self, trigger_point, trigger_point_base, movement_window=0, movement_window_age=0,
+                 trigger_csv=None):
+        self.trigger_point = trigger_point
+        self.trigger_point_base = trigger_point_base
+        self.movement_window = movement_window
+        self.movement_window_age = movement_window_age
+        self.trigger_csv = trigger_csv
+        self.size = movement_window + movement_window_age + 1
+        self.levels = [0] * self.size  # Circular buffer of movement levels.
+        self.head = -1  # Index of the latest level.
+        self.count = 0  # Number of levels received.
+        self.total = 0  # Total of the current window.
+        self.aged_total = 0  # Total of the aged window.
+        self.aged_size = movement_window + 1
+        self.level = 0  # Latest movement level.
+        self.mean_movement = 0
+        self.old_mean_movement = 0
+        self.event_trigger_point = trigger_point
+        self.event_trigger_point_base = trigger_point_base
+        self.movement_flag = False  # True while movement is detected.
+        self.movement_triggered = False  # True only on the frame that triggered movement.
+
+    def push(self, level):
+        """Add a level to the buffer updating the window totals."""
+        self.head += 1
+        if self.head == self.size:
+            self.head = 0
+        self.total += level - self.levels[self.head]
+        self.levels[self.head] = level
+        self.count += 1
+        self.level = level
+        if self.movement_window_age > 0:
+            # The level movement_window_age - 1 frames old joins the aged window and the oldest leaves.
+            joining = self.head - self.movement_window_age + 1
+            leaving = self.head + 1
+            self.aged_total += self.levels[joining] - self.levels[leaving if leaving < self.size else 0]
+
+    def is_ready(self):
+        """The aged window is only complete once enough levels have been received."""
+        return self.count >= self.movement_window + self.movement_window_age
+
+    def update(self, level):
+        """
+        Run this for every frame. Returns False until the movement buffer is fully populated.
+        """
+        self.push(level)
+        if self.movement_window_age > 0:
+            self.mean_movement = round(self.total / min(self.count, self.size))
+            if not self.is_ready():
+                return False
+            self.old_mean_movement = round(self.aged_total / self.aged_size)
+            self.event_trigger_point = self.old_mean_movement + self.trigger_point
+            self.event_trigger_point_base = self.old_mean_movement + self.trigger_point_base
+            movement = self.mean_movement
+        else:
+            movement = level
+
+        if self.trigger_csv:
+            self.trigger_csv.log_movement(self.event_trigger_point, self.event_trigger_point_base, movement)
+
+        if self.movement_flag:
+            self.movement_triggered = False
+            if movement < self.event_trigger_point_base:
+                self.movement_flag = False
+        elif movement > self.event_trigger_point:
+            self.trigger()
+        return True
+
+    def trigger(self):
+        """Start movement, also used to trigger movement manually."""
+        self.movement_flag = True
+        self.movement_triggered = True
+        if self.trigger_csv:
+            self.trigger_csv.movement_triggered()
+
+
+def window_means(levels, movement_window, movement_window_age):
+    """
+    Vectorised equivalent of the windows in TriggerEngine.update for a whole series of levels.
+    Returns the mean movement, the aged mean movement and a mask of the frames where the
+    engine is ready. Without a movement_window_age the levels are returned with an aged mean of 0.
+    """
+    levels = np.asarray(levels, np.dtype('int64'))
+    if movement_window_age == 0:
+        return levels, np.zeros_like(levels), np.ones(levels.size, np.dtype('bool'))
+    totals = np.concatenate(([0], np.cumsum(levels)))
+    frame = np.arange(levels.size)
+    size = movement_window + movement_window_age + 1
+    first = np.maximum(frame + 1 - size, 0)
+    mean = np.round((totals[frame + 1] - totals[first]) / np.minimum(frame + 1, size)).astype(np.int64)
+    ready = frame + 1 >= movement_window + movement_window_age
+    # The aged window holds the levels from movement_window_age - 1 to
+    # movement_window_age + movement_window - 1 frames old.
+    first = np.clip(frame - movement_window_age - movement_window + 1, 0, None)
+    last = np.clip(frame - movement_window_age + 2, 0, None)
+    old_mean = np.round((totals[last] - totals[first]) / (movement_window + 1)).astype(np.int64)
+    return mean, old_mean, ready
+
+
+def movement_flags(movement, old_mean, ready, trigger_point, trigger_point_base):
+    """
+    Vectorised equivalent of the movement flag in TriggerEngine.update.
+    Movement starts above old_mean + trigger_point and ends below old_mean + trigger_point_base,
+    trigger_point_base must not be above trigger_point.
+    """
+    on = ready & (movement > old_mean + trigger_point)
+    off = ready & (movement < old_mean + trigger_point_base)
+    decisive = on | off
+    # Carry the last decision forward, the flag starts cleared.
+    last = np.maximum.accumulate(np.where(decisive, np.arange(1, movement.size + 1), 0))
+    return np.concatenate(([False], on))[last]
@@ -0,0 +1,264 @@
+"""
+Threaded video encoder.
+
+Frames are handed to a worker thread through a bounded queue so that encoding
+and finalising an mp4 file do not add to the time taken by each frame of the
+main loop. OpenCV releases the GIL while it encodes so the worker runs in
+parallel with capture and detection on a multi core Pi. When the worker falls
+behind and the queue is full new frames are dropped and counted rather than
+stalling capture. An error writing a file is logged and counted, the rest of
+that file is dropped and the next file is written as normal.
+
+The writer is chosen by the encoder backend, opencv uses cv2.VideoWriter and
+ffmpeg pipes raw frames to an ffmpeg process for each file which can use
+codecs such as libx264 with a preset and crf for much smaller files.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Add the opencv and ffmpeg encoder backends.
+v1.2    18/10/2026  Add write_encoded() to decode and write the frames of a compressed pre-roll.
+v1.3    18/10/2026  Log and count writer errors, dropping the file's frames, rather than raising them later.
+v1.4    18/10/2026  Raise an IOError when ffmpeg exits early or with an error so the file is failed.
+"""
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import cv2
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.4"
+
+ENCODERS = ('opencv', 'ffmpeg')
+DEFAULT_CODECS = {'opencv': 'mp4v', 'ffmpeg': 'libx264'}
+
+# Queue commands.
+OPEN = 0
+FRAME = 1
+CLOSE = 2
+STOP = 3
+ENCODED = 4
+
+
+class VideoEncoder:
+    """
+    Encode frames on a worker thread.
+
+    open_writer is called on the worker with a filename and returns a writer with write(frame) and
+    release() methods, such as a cv2.VideoWriter. A frame passed to write() must not be changed
+    afterwards. With a queue_size of 0 frames are encoded in the calling thread.
+    When opening, writing or closing a file fails the file's remaining frames are dropped and
+    on_closed is not called, the next open() starts again.
+    """
+
+    def __init__(self, open_writer, queue_size=60, name='Encoder', log=None):
+        self.open_writer = open_writer
+        self.queue_size = queue_size
+        self.name = name
+        self.log = log
+        self.queue = queue.Queue(maxsize=queue_size) if queue_size > 0 else None
+        self.thread = None
+        self.writer = None
+        self.filename = None
+        self.failed = False  # The current file has failed, its frames are dropped.
+        self.error_cnt = 0
+        self.failed_cnt = 0  # Files that failed.
+        self.last_error = None
+        self.frame_cnt = 0  # Frames encoded.
+        self.dropped_cnt = 0  # Frames dropped because the queue was full.
+        self.failed_frame_cnt = 0  # Frames dropped because the file failed.
+        self.queue_peak = 0  # Highest number of queued items.
+        self.encode_ns = 0  # Total time spent encoding frames.
+        self.encode_max_ns = 0  # Longest time to encode a frame.
+        self.close_ns = 0  # Time taken to finalise the last file.
+
+    def start(self):
+        """Start the worker thread."""
+        if self.queue is not None:
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=30.0):
+        """Finish encoding the queued frames and stop the worker thread."""
+        if self.thread:
+            self.queue.put((STOP, None))
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self):
+        while True:
+            command, value = self.queue.get()
+            if command == STOP:
+                break
+            self.handle(command, value)
+
+    def handle(self, command, value):
+        """Run a command, a failure is logged and the rest of the file dropped."""
+        try:
+            self.process(command, value)
+        except Exception as e:
+            self.fail(e)
+
+    def fail(self, error):
+        self.error_cnt += 1
+        self.last_error = f'{self.filename}: {error}'
+        if not self.failed:
+            self.failed = True
+            self.failed_cnt += 1
+            if self.log:
+                self.log.warning(f'Video {self.filename} failed, dropping its frames: {error}')
+        if self.writer:
+            try:
+                self.writer.release()
+            except Exception:
+                pass
+            self.writer = None
+
+    def process(self, command, value):
+        if command == FRAME:
+            if self.failed:
+                self.failed_frame_cnt += 1
+            elif self.writer:
+                start = time.perf_counter_ns()
+                self.writer.write(value)
+                elapsed = time.perf_counter_ns() - start
+                self.frame_cnt += 1
+                self.encode_ns += elapsed
+                if elapsed > self.encode_max_ns:
+                    self.encode_max_ns = elapsed
+        elif command == ENCODED:
+            for data in value:
+                self.process(FRAME, cv2.imdecode(data, cv2.IMREAD_COLOR))
+        elif command == OPEN:
+            self.filename = value
+            self.failed = False
+            self.writer = self.open_writer(value)
+        elif command == CLOSE:
+            if self.failed:
+                # The file is incomplete so on_closed is not called.
+                return
+            start = time.perf_counter_ns()
+            if self.writer:
+                writer, self.writer = self.writer, None
+                writer.release()
+            self.close_ns = time.perf_counter_ns() - start
+            if value:
+                value()
+
+    def put(self, command, value, block=True):
+        """Queue a command, or run it straight away without a worker thread."""
+        if self.queue is None:
+            self.handle(command, value)
+            return True
+        try:
+            self.queue.put((command, value), block=block)
+        except queue.Full:
+            return False
+        depth = self.queue.qsize()
+        if depth > self.queue_peak:
+            self.queue_peak = depth
+        return True
+
+    def open(self, filename):
+        """Start a new file."""
+        self.put(OPEN, filename)
+
+    def write(self, frame):
+        """Queue a frame to be encoded, returns False if it was dropped."""
+        if self.put(FRAME, frame, block=False):
+            return True
+        self.dropped_cnt += 1
+        return False
+
+    def write_encoded(self, frames):
+        """Queue a list of jpg or png encoded frames to be decoded and encoded on the worker."""
+        self.put(ENCODED, frames)
+
+    def close(self, on_closed=None):
+        """Finalise the file on the worker, on_closed is called once the file is complete."""
+        self.put(CLOSE, on_closed)
+
+    def get_depth(self):
+        """Return the number of items waiting in the queue."""
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def get_stats(self):
+        return {'Frames': self.frame_cnt,
+                'Dropped': self.dropped_cnt,
+                'Queue Depth': self.get_depth(),
+                'Queue Peak': self.queue_peak,
+                'Encode Mean ms': round(self.encode_ns / self.frame_cnt / 1e6, 3) if self.frame_cnt else 0.0,
+                'Encode Max ms': round(self.encode_max_ns / 1e6, 3),
+                'Close ms': round(self.close_ns / 1e6, 3),
+                'Errors': self.error_cnt,
+                'Failed Files': self.failed_cnt,
+                'Failed Frames': self.failed_frame_cnt,
+                'Last Error': self.last_error}
+
+
+class OpenCVWriter:
+    """Write an mp4 file with cv2.VideoWriter, codec is a fourcc such as mp4v."""
+
+    def __init__(self, filename, frame_rate, size, codec='mp4v'):
+        self.writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*codec), frame_rate, size)
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+class FFmpegWriter:
+    """
+    Write an mp4 file by piping raw BGR frames to ffmpeg.
+    codec is an ffmpeg encoder such as libx264, libx265 or h264_v4l2m2m, preset and crf are
+    only passed to ffmpeg when set. write() and release() raise IOError when ffmpeg has failed.
+    """
+
+    def __init__(self, filename, frame_rate, size, codec='libx264', preset='veryfast', crf=23, ffmpeg='ffmpeg'):
+        command = [ffmpeg, '-loglevel', 'error', '-y',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{size[0]}x{size[1]}', '-r', str(frame_rate),
+                   '-i', '-',
+                   '-c:v', codec]
+        if preset not in (None, False, ''):
+            command += ['-preset', str(preset)]
+        if crf not in (None, False, ''):
+            command += ['-crf', str(crf)]
+        command += ['-pix_fmt', 'yuv420p', '-movflags', '+faststart', filename]
+        self.filename = filename
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(frame.data if frame.flags.c_contiguous else frame.tobytes())
+        except BrokenPipeError:
+            raise IOError(f'ffmpeg exited with code {self.process.wait()} writing {self.filename}')
+
+    def release(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        if returncode:
+            raise IOError(f'ffmpeg exited with code {returncode} encoding {self.filename}')
+
+
+def is_available(encoder):
+    """Return True if the encoder backend can be used on this host."""
+    if encoder == 'ffmpeg':
+        return shutil.which('ffmpeg') is not None
+    return encoder in ENCODERS
+
+
+def get_writer_factory(encoder, frame_rate, size, codec=None, preset=None, crf=None):
+    """Return a function that opens a writer for a filename with the encoder backend."""
+    if encoder not in ENCODERS:
+        raise ValueError(f'encoder must be one of {", ".join(ENCODERS)} not {encoder}')
+    codec = codec or DEFAULT_CODECS[encoder]
+    if encoder == 'ffmpeg':
+        return lambda filename: FFmpegWriter(filename, frame_rate, size, codec, preset, crf)
+    return lambda filename: OpenCVWriter(filename, frame_rate, size, codec)
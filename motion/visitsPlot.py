@@ -3,17 +3,18 @@ Plot shows the number of daily visits.
 The yaxis is limited to the average plus 20%.
 v1.2 03/05/2023 Add average limit to the y-axis.
 v1.3 07/05/2024 Add selection.
+v1.4 18/10/2026 Read only the days reported from the daily log files.
 """
 import argparse
 import socket
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import os
+from logStore import read_window
 
 __author__ = "Peter Goodgame"
 __name__ = "visitsPlot"
-__version__ = "v1.3"
+__version__ = "v1.4"
 
 # Print Version data.
 print(f'Program name: {__name__} version {__version__} ')
@@ -34,15 +35,8 @@ def get_host_name():
     return socket.gethostname().split('.')[0].capitalize()
 
 
-# Read and prepare the data.
-df = pd.read_csv('visits.csv')
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-df.sort_values('Timestamp', inplace=True)
-
-# Filter data
-end_date = df['Timestamp'].max()
-start_date = end_date - pd.Timedelta(days=DAYS)
-df = df[(df['Timestamp'] >= start_date) & (df['Timestamp'] <= end_date)]
+# Read the days reported up to the latest visit.
+df = read_window('visits', days=DAYS)
 
 # Add a visit column.
 df['Visit'] = 1
@@ -0,0 +1,441 @@
+"""
+YOLO object detection in a separate process.
+
+Loading the yolov3 network takes seconds and a forward pass takes far longer
+than a frame on a Pi, so neither can run in the camera loop. The peak movement
+frame of each event is queued for a worker process which loads the network the
+first time it is needed. For each frame the classes, confidences and boxes of
+the objects found are written to Motion/yolo/<mp4 name>.json, a row for each
+object is added to objects.csv and the result is handed back to motion to log.
+
+Frames are sent down a pipe by a sender thread and results are read back by a
+receiver thread, so submit() never waits. When the queue is full the frame is
+dropped and counted.
+
+A smaller network such as yolov3-tiny is used by pointing weights and cfg at
+its files in the [YOLO] section of motion.ini. The detector can instead be the
+OpenCV HOG people detector or a Haar cascade.
+
+When the frame comes with the bounding box of the movement only that region,
+padded and letterboxed to a square of the input size, is passed to the
+detector. A small animal far from the camera then fills far more of the
+network input than when the whole frame is shrunk, and the HOG and Haar
+detectors scan a fraction of the pixels. The boxes found are mapped back to
+the whole frame.
+
+YoloWorker runs this file as the worker process, the frames and results are
+pickled over its stdin and stdout.
+
+The network outputs are decoded as whole arrays, overlapping boxes of the same
+object are removed with non maximum suppression and the objects are held in a
+structured array, OBJECT_DTYPE, which can be drawn onto the frame.
+
+Version Date        Description
+v1.0    18/10/2026  Initial version.
+v1.1    18/10/2026  Vectorise the decoding, add non maximum suppression and draw the objects.
+v1.2    18/10/2026  Add the HOG and Haar detectors and detect within the region of movement.
+"""
+import argparse
+import collections
+import json
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+from objectsCSV import ObjectsCSV
+
+__author__ = "Peter Goodgame"
+__version__ = "v1.2"
+
+DETECTORS = ('yolo', 'hog', 'haar')
+
+OBJECT_DTYPE = np.dtype([('class_id', np.int32), ('confidence', np.float32),
+                         ('x', np.int32), ('y', np.int32), ('w', np.int32), ('h', np.int32)])
+
+
+def letterbox(image, box, padding=0.5, size=416, min_crop=128):
+    """
+    Crop the box from the image with padding times its longest side around it and at least
+    min_crop pixels square, then scale it to fit a size square padded with grey.
+    Returns the square, the top left corner of the crop and the scale and offset of the crop
+    within the square.
+    """
+    height, width = image.shape[:2]
+    x, y, w, h = box
+    side = max(max(w, h) * (1 + 2 * padding), min_crop)
+    centre_x, centre_y = x + w / 2, y + h / 2
+    x0, y0 = max(int(centre_x - side / 2), 0), max(int(centre_y - side / 2), 0)
+    x1, y1 = min(int(centre_x + side / 2), width), min(int(centre_y + side / 2), height)
+    crop = image[y0:y1, x0:x1]
+    scale = size / max(x1 - x0, y1 - y0)
+    crop_w, crop_h = max(round((x1 - x0) * scale), 1), max(round((y1 - y0) * scale), 1)
+    crop = cv2.resize(crop, (crop_w, crop_h), interpolation=cv2.INTER_LINEAR if scale > 1 else cv2.INTER_AREA)
+    square = np.full((size, size) + image.shape[2:], 114, image.dtype)
+    offset_x, offset_y = (size - crop_w) // 2, (size - crop_h) // 2
+    square[offset_y:offset_y + crop_h, offset_x:offset_x + crop_w] = crop
+    return square, (x0, y0), scale, (offset_x, offset_y)
+
+
+class Detector:
+    """
+    Base class of the detectors, detect() returns the objects in an image as an OBJECT_DTYPE array.
+    """
+
+    def __init__(self, size=416):
+        self.size = size  # Side of the square the region of movement is scaled to.
+        self.classes = []
+        self.loaded = False
+        self.load_ms = 0.0
+        self.decode_ms = 0.0  # Time taken to decode the last frame.
+
+    def load(self):
+        self.loaded = True
+
+    def detect(self, image):
+        raise NotImplementedError
+
+    def detect_region(self, image, box=None, padding=0.5, min_crop=128):
+        """Detect the objects within the box of the image, or the whole image without a box."""
+        if box is None:
+            return self.detect(image)
+        square, (x0, y0), scale, (offset_x, offset_y) = letterbox(image, box, padding, self.size, min_crop)
+        objects = self.detect(square)
+        # Map the boxes back to the image.
+        objects['x'] = (objects['x'] - offset_x) / scale + x0
+        objects['y'] = (objects['y'] - offset_y) / scale + y0
+        objects['w'] = objects['w'] / scale
+        objects['h'] = objects['h'] / scale
+        return objects
+
+    def get_class(self, class_id):
+        return self.classes[class_id] if class_id < len(self.classes) else str(class_id)
+
+    def to_dicts(self, objects):
+        """Return the objects as a list of dicts for the json file."""
+        return [{'Class': self.get_class(int(o['class_id'])),
+                 'Confidence': round(float(o['confidence']), 3),
+                 'X': int(o['x']), 'Y': int(o['y']), 'W': int(o['w']), 'H': int(o['h'])} for o in objects]
+
+    def draw(self, image, objects, rgb=(0, 255, 0), thickness=1, font_size=0.5):
+        """Draw a box and label for each object onto the image."""
+        for o in objects:
+            x, y, w, h = int(o['x']), int(o['y']), int(o['w']), int(o['h'])
+            cv2.rectangle(image, (x, y), (x + w, y + h), rgb, thickness)
+            cv2.putText(image, f'{self.get_class(int(o["class_id"]))} {o["confidence"]:.2f}', (x, max(y - 5, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_size, rgb, thickness)
+        return image
+
+
+def to_objects(rects, confidences, class_id=0):
+    """Return the x, y, w, h rectangles and their confidences as an OBJECT_DTYPE array."""
+    rects = np.asarray(rects, np.dtype('int32')).reshape(-1, 4)
+    objects = np.empty(len(rects), OBJECT_DTYPE)
+    objects['class_id'] = class_id
+    objects['confidence'] = np.asarray(confidences, np.dtype('float32')).reshape(-1)
+    for i, name in enumerate(('x', 'y', 'w', 'h')):
+        objects[name] = rects[:, i]
+    return objects
+
+
+class HogDetector(Detector):
+    """
+    The OpenCV HOG people detector, the confidence is the SVM weight of each window.
+    """
+
+    def load(self):
+        start = time.perf_counter()
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        self.classes = ['person']
+        self.loaded = True
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def detect(self, image):
+        if not self.loaded:
+            self.load()
+        rects, weights = self.hog.detectMultiScale(image, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        return to_objects(rects, weights)
+
+
+class HaarDetector(Detector):
+    """
+    A Haar cascade such as haarcascade_frontalface_alt2.xml, the class is named after the cascade file.
+    """
+
+    def __init__(self, cascade, size=416, scale_factor=1.1, min_neighbours=4):
+        super().__init__(size)
+        self.cascade_path = cascade
+        self.scale_factor = scale_factor
+        self.min_neighbours = min_neighbours
+        self.cascade = None
+
+    def load(self):
+        start = time.perf_counter()
+        self.cascade = cv2.CascadeClassifier(self.cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f'Unable to load the cascade {self.cascade_path}')
+        self.classes = [os.path.splitext(os.path.basename(self.cascade_path))[0].replace('haarcascade_', '')]
+        self.loaded = True
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def detect(self, image):
+        if not self.loaded:
+            self.load()
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        rects = self.cascade.detectMultiScale(grey, self.scale_factor, self.min_neighbours)
+        return to_objects(rects, np.ones(len(rects)))
+
+
+class YoloDetector(Detector):
+    """
+    The YOLO network, loaded when the first frame is detected.
+    """
+
+    def __init__(self, weights, cfg, names, confidence=0.5, size=416, nms_threshold=0.4):
+        super().__init__(size)
+        self.weights = weights
+        self.cfg = cfg
+        self.names = names
+        self.confidence = confidence
+        self.nms_threshold = nms_threshold
+        self.net = None
+        self.output_layers = []
+
+    def load(self):
+        start = time.perf_counter()
+        self.net = cv2.dnn.readNet(self.weights, self.cfg)
+        with open(self.names, "r") as f:
+            self.classes = [line.strip() for line in f.readlines()]
+        layer_names = self.net.getLayerNames()
+        self.output_layers = [layer_names[i - 1] for i in self.net.getUnconnectedOutLayers()]
+        self.loaded = True
+        self.load_ms = (time.perf_counter() - start) * 1000
+
+    def detect(self, image):
+        """Return the objects found in the image as an OBJECT_DTYPE array."""
+        if not self.loaded:
+            self.load()
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(image, 0.00392, (self.size, self.size), (0, 0, 0), True, crop=False)
+        self.net.setInput(blob)
+        outs = self.net.forward(self.output_layers)
+        start = time.perf_counter()
+        objects = self.decode(outs, width, height)
+        self.decode_ms = (time.perf_counter() - start) * 1000
+        return objects
+
+    def decode(self, outs, width, height):
+        """
+        Decode the rows of the output layers, centre x, centre y, width, height, objectness then
+        the class scores, scaled to 0 to 1. Boxes scoring below confidence are dropped then non
+        maximum suppression keeps the best of the boxes overlapping by more than nms_threshold.
+        """
+        rows = outs[0] if len(outs) == 1 else np.concatenate(outs)
+        scores = rows[:, 5:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(rows)), class_ids]
+        found = confidences > self.confidence
+        rows, class_ids, confidences = rows[found], class_ids[found], confidences[found]
+        # Centre, width and height in pixels then the top left corner.
+        boxes = (rows[:, :4] * np.array([width, height, width, height], np.dtype('float32'))).astype(np.int32)
+        boxes[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+        if len(boxes):
+            keep = np.asarray(cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), self.confidence,
+                                               self.nms_threshold), np.dtype('int64')).reshape(-1)
+        else:
+            keep = np.zeros(0, np.dtype('int64'))
+        objects = np.empty(len(keep), OBJECT_DTYPE)
+        objects['class_id'] = class_ids[keep]
+        objects['confidence'] = confidences[keep]
+        for i, name in enumerate(('x', 'y', 'w', 'h')):
+            objects[name] = boxes[keep, i]
+        return objects
+
+
+class YoloWorker:
+    """
+    Runs a detector in a worker process, frames are submitted with the name of their event.
+    detector is yolo, hog or haar, cascade is the Haar cascade file.
+    """
+
+    def __init__(self, weights, cfg, names, confidence=0.5, size=416, queue_size=4, output_dir='Motion/yolo',
+                 nms_threshold=0.4, draw=False, detector='yolo', cascade='', padding=0.5, min_crop=128):
+        if detector not in DETECTORS:
+            raise ValueError(f'detector must be one of {", ".join(DETECTORS)} not {detector}')
+        self.command = [sys.executable, os.path.abspath(__file__),
+                        '--detector', detector, '--cascade', cascade,
+                        '--weights', weights, '--cfg', cfg, '--names', names,
+                        '--confidence', str(confidence), '--size', str(size), '--output_dir', output_dir,
+                        '--nms_threshold', str(nms_threshold), '--padding', str(padding), '--min_crop', str(min_crop)]
+        if draw:
+            self.command.append('--draw')
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.results = collections.deque()
+        self.process = None
+        self.sender = None
+        self.receiver = None
+        self.submitted_cnt = 0
+        self.dropped_cnt = 0
+        self.detected_cnt = 0
+        self.failed_cnt = 0
+        self.detect_ms = 0.0
+        self.detect_max_ms = 0.0
+        self.decode_ms = 0.0
+        self.load_ms = 0.0
+
+    def start(self):
+        """Start the worker process, the network is not loaded until the first frame arrives."""
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.sender = threading.Thread(target=self.send, name='YoloSender', daemon=True)
+        self.sender.start()
+        self.receiver = threading.Thread(target=self.receive, name='YoloReceiver', daemon=True)
+        self.receiver.start()
+        return self
+
+    def stop(self, timeout=60.0):
+        """Finish the queued frames and stop the worker process."""
+        if self.process is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.sender.join(timeout)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.receiver.join(timeout)
+        self.process = None
+
+    def submit(self, name, frame, box=None):
+        """
+        Queue a frame for detection within the x, y, w, h box of movement or the whole frame without a box.
+        Returns False if it was dropped. The frame must not be changed afterwards.
+        """
+        try:
+            self.queue.put_nowait((name, frame, box))
+        except queue.Full:
+            self.dropped_cnt += 1
+            return False
+        self.submitted_cnt += 1
+        return True
+
+    def send(self):
+        try:
+            while True:
+                job = self.queue.get()
+                if job is None:
+                    break
+                pickle.dump(job, self.process.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+                self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+    def receive(self):
+        while True:
+            try:
+                result = pickle.load(self.process.stdout)
+            except (EOFError, OSError, pickle.UnpicklingError):
+                break
+            if 'Error' in result:
+                self.failed_cnt += 1
+            else:
+                self.detected_cnt += 1
+                self.detect_ms += result['Detect ms']
+                self.detect_max_ms = max(self.detect_max_ms, result['Detect ms'])
+                self.decode_ms += result['Decode ms']
+                self.load_ms += result['Load ms']
+            self.results.append(result)
+
+    def get_results(self):
+        """Return the results received since the last call."""
+        results = []
+        while self.results:
+            results.append(self.results.popleft())
+        return results
+
+    def get_stats(self):
+        return {'Submitted': self.submitted_cnt,
+                'Dropped': self.dropped_cnt,
+                'Detected': self.detected_cnt,
+                'Failed': self.failed_cnt,
+                'Queue Depth': self.queue.qsize(),
+                'Load ms': round(self.load_ms, 3),
+                'Detect Mean ms': round(self.detect_ms / self.detected_cnt, 3) if self.detected_cnt else 0.0,
+                'Detect Max ms': round(self.detect_max_ms, 3),
+                'Decode Mean ms': round(self.decode_ms / self.detected_cnt, 3) if self.detected_cnt else 0.0}
+
+
+def write_objects(wo_output_dir, wo_name, wo_objects):
+    """Write the objects to a json file and add them to objects.csv."""
+    if not os.path.isdir(wo_output_dir):
+        os.makedirs(wo_output_dir, exist_ok=True)
+    with open(os.path.join(wo_output_dir, os.path.splitext(wo_name)[0] + '.json'), 'w') as file:
+        json.dump({'Filename': wo_name, 'Objects': wo_objects}, file, indent=2)
+    objects_csv = ObjectsCSV()
+    for wo_object in wo_objects:
+        objects_csv.write(wo_name, wo_object['Class'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect objects in the frames sent by motion")
+    parser.add_argument('--detector', default='yolo', choices=DETECTORS, help='Enter the detector.')
+    parser.add_argument('--cascade', default='', help='Enter the Haar cascade file.')
+    parser.add_argument('--weights', default='Motion/props/yolov3.weights', help='Enter the weights file.')
+    parser.add_argument('--cfg', default='Motion/props/yolov3.cfg', help='Enter the network cfg file.')
+    parser.add_argument('--names', default='Motion/props/coco.names', help='Enter the class names file.')
+    parser.add_argument('--confidence', type=float, default=0.5, help='Enter the minimum confidence.')
+    parser.add_argument('--size', type=int, default=416, help='Enter the network input size.')
+    parser.add_argument('--output_dir', default='Motion/yolo', help='Enter the directory for the json files.')
+    parser.add_argument('--nms_threshold', type=float, default=0.4, help='Enter the overlap for suppressing boxes.')
+    parser.add_argument('--draw', action='store_true', help='Write a jpg with the objects drawn.')
+    parser.add_argument('--padding', type=float, default=0.5, help='Enter the padding around the movement.')
+    parser.add_argument('--min_crop', type=int, default=128, help='Enter the smallest crop around the movement.')
+    args = parser.parse_args()
+
+    if args.detector == 'hog':
+        detector = HogDetector(args.size)
+    elif args.detector == 'haar':
+        detector = HaarDetector(args.cascade, args.size)
+    else:
+        detector = YoloDetector(args.weights, args.cfg, args.names, args.confidence, args.size, args.nms_threshold)
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    while True:
+        try:
+            name, frame, box = pickle.load(stdin)
+        except EOFError:
+            break
+        try:
+            load_ms = 0.0
+            if not detector.loaded:
+                detector.load()
+                load_ms = detector.load_ms
+            start = time.perf_counter()
+            objects = detector.detect_region(frame, box, args.padding, args.min_crop)
+            detect_ms = (time.perf_counter() - start) * 1000
+            object_dicts = detector.to_dicts(objects)
+            write_objects(args.output_dir, name, object_dicts)
+            if args.draw:
+                cv2.imwrite(os.path.join(args.output_dir, os.path.splitext(name)[0] + '-objects.jpg'),
+                            detector.draw(frame, objects))
+            result = {'Filename': name, 'Box': box, 'Objects': object_dicts, 'Load ms': load_ms, 'Detect ms': detect_ms,
+                      'Decode ms': detector.decode_ms}
+        except Exception as e:
+            result = {'Filename': name, 'Error': str(e)}
+        pickle.dump(result, stdout, protocol=pickle.HIGHEST_PROTOCOL)
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    main()